@@ -22,7 +22,12 @@ from koi_core.caching_persistence import (
     setCachingPersistence,
 )
 from koi_core.api import API, OfflineAPI
-from koi_core.caching_strategy import LocalOnlyCachingStrategy
+from koi_core.caching_strategy import (  # noqa: F401
+    CachePolicy,
+    ExpireCachingStrategy,
+    LocalOnlyCachingStrategy,
+    PolicyTable,
+)
 from koi_core.resources.model import LocalCode
 from koi_core.resources.instance import Instance
 from koi_core.resources.pool import APIObjectPool, LocalOnlyObjectPool
@@ -53,11 +58,18 @@ def deinit():
 
 
 def create_api_object_pool(
-    host: str, username: str, password: str, persistance_file: Union[IOBase, str] = None
+    host: str,
+    username: str,
+    password: str,
+    persistance_file: Union[IOBase, str] = None,
+    caching_policies: PolicyTable = None,
 ):
+    """caching_policies override rows of the caching policy table, see ExpireCachingStrategy"""
     if persistance_file:
         setCachingPersistence(CachingPersistence(persistance_file))
     api = API(host, username, password)
+    if caching_policies is not None:
+        return APIObjectPool(api, ExpireCachingStrategy(caching_policies))
     return APIObjectPool(api)
 
 
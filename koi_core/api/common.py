@@ -17,9 +17,6 @@ from multiprocessing import Lock
 from koi_core.exceptions import KoiApiOfflineException
 from requests.auth import AuthBase
 from koi_core.resources.ids import (
-    GeneralAccessId,
-    ModelAccessId,
-    InstanceAccessId,
     InstanceId,
     ModelId,
     SampleDatumId,
@@ -27,9 +24,6 @@ from koi_core.resources.ids import (
     SampleLableId,
     DescriptorId,
     UserId,
-    GeneralRoleId,
-    ModelRoleId,
-    InstanceRoleId,
 )
 from koi_core.caching import CachingMeta
 import requests
@@ -102,6 +96,9 @@ def common_authenticated(self: "BaseAPI", request_func, *args, **kwargs):
             raise LookupError()
         elif response.status_code == 401:
             authenticate_locked(self, True)
+            if hasattr(kwargs.get("data"), "seek"):
+                # a streamed body has to be sent again from the start
+                kwargs["data"].seek(0)
             response = request_func(
                 self, *args, auth=BearerAuth(self._token), **kwargs
             )
@@ -175,6 +172,9 @@ class BaseAPI:
     def authenticate(self):
         raise KoiApiOfflineException()
 
+    def set_connection_pool_size(self, size: int):
+        pass
+
     def _HEAD(self, path: str, auth: AuthBase) -> CachingMeta:
         raise KoiApiOfflineException()
 
@@ -222,35 +222,10 @@ class BaseAPI:
             DescriptorId,
         ] = None,
     ):
-        path = "/api"
-        if isinstance(id, GeneralAccessId):
-            path = path + f"/access/{id.access_uuid.hex}"
-        if isinstance(id, GeneralRoleId):
-            path = path + f"/userroles/general/{id.role_uuid.hex}"
-        if isinstance(id, ModelRoleId):
-            path = path + f"/userroles/model/{id.role_uuid.hex}"
-        if isinstance(id, InstanceRoleId):
-            path = path + f"/userroles/instance/{id.role_uuid.hex}"
-        if isinstance(id, UserId):
-            path = path + f"/user/{id.user_uuid.hex}"
-        if isinstance(id, ModelId):
-            path = path + f"/model/{id.model_uuid.hex}"
-        if isinstance(id, ModelAccessId):
-            path = path + f"/access/{id.access_uuid.hex}"
-        if isinstance(id, InstanceId):
-            path = path + f"/instance/{id.instance_uuid.hex}"
-        if isinstance(id, InstanceAccessId):
-            path = path + f"/access/{id.access_uuid.hex}"
-        if isinstance(id, DescriptorId):
-            path = path + f"/descriptor/{id.descriptor_uuid.hex}"
-        if isinstance(id, SampleId):
-            path = path + f"/sample/{id.sample_uuid.hex}"
-        if isinstance(id, SampleDatumId):
-            path = path + f"/data/{id.sample_datum_uuid.hex}"
-        if isinstance(id, SampleLableId):
-            path = path + f"/label/{id.sample_label_uuid.hex}"
-
-        return path
+        # the ids build and cache their own path
+        if id is None:
+            return "/api"
+        return id.path
 
 
 class RequestsAPI(BaseAPI):
@@ -260,8 +235,35 @@ class RequestsAPI(BaseAPI):
         self._user = username
         self._password = password
         self._session = requests.Session()
+        self._pool_size = None
         self.online = True
 
+    def __getstate__(self):
+        # locks and sessions can not be sent to another process, the receiving process
+        # creates its own ones
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_session"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+        self._session = requests.Session()
+        if self.__dict__.get("_pool_size") is not None:
+            self._mount(self._pool_size)
+
+    def _mount(self, size: int):
+        adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def set_connection_pool_size(self, size: int):
+        """Keep up to size connections open, e.g. for as many threads using the api"""
+        if self._pool_size is None or size > self._pool_size:
+            self._pool_size = size
+            self._mount(size)
+
     def reconnect(self):
         self.online = True
         self.authenticate()
@@ -86,15 +86,23 @@ class APIInstances:
         path = self.base._build_path(id) + "/inference"
         return self.base.GET_RAW(path, meta)
 
-    def set_instance_inference_data(self, id: InstanceId, data: bytes):
-        self.base._POST_raw(self.base._build_path(id) + "/inference", data=data)
+    def get_instance_inference_data_meta(self, id: InstanceId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/inference")
+
+    def set_instance_inference_data(self, id: InstanceId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/inference", data=data)
+        return meta
 
     def get_instance_training_data(self, id: InstanceId, meta: CachingMeta):
         path = self.base._build_path(id) + "/training"
         return self.base.GET_RAW(path, meta)
 
-    def set_instance_training_data(self, id: InstanceId, data: bytes):
-        self.base._POST_raw(self.base._build_path(id) + "/training", data=data)
+    def get_instance_training_data_meta(self, id: InstanceId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/training")
+
+    def set_instance_training_data(self, id: InstanceId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/training", data=data)
+        return meta
 
     # endregion
 
@@ -136,8 +144,12 @@ class APIInstances:
         path = self.base._build_path(id) + "/file"
         return self.base.GET_RAW(path, meta)
 
-    def set_descriptor_data(self, id: DescriptorId, data: bytes):
-        self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+    def get_descriptor_data_meta(self, id: DescriptorId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/file")
+
+    def set_descriptor_data(self, id: DescriptorId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+        return meta
 
     def get_parameters(self, id: InstanceId, meta: CachingMeta = None):
         path = self.base._build_path(id) + "/parameter"
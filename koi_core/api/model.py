@@ -13,7 +13,7 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 from uuid import UUID
-from typing import Tuple
+from typing import IO, Tuple, Union
 
 from koi_core.api.common import BaseAPI, _parse, _encode
 from koi_core.caching import CachingMeta
@@ -67,22 +67,34 @@ class APIModels:
         path = self.base._build_path(id) + "/code"
         return self.base.GET_RAW(path, meta)
 
-    def set_model_code(self, id: ModelId, data: bytes) -> None:
-        self.base._POST_raw(self.base._build_path(id) + "/code", data=data)
+    def get_model_code_meta(self, id: ModelId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/code")
+
+    def set_model_code(self, id: ModelId, data: Union[bytes, IO[bytes]]) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/code", data=data)
+        return meta
 
     def get_model_visual_plugin(self, id: ModelId, meta: CachingMeta = None):
         path = self.base._build_path(id) + "/visualplugin"
         return self.base.GET_RAW(path, meta)
 
-    def set_model_visual_plugin(self, id: ModelId, data: bytes) -> None:
-        self.base._POST_raw(self.base._build_path(id) + "/visualplugin", data=data)
+    def get_model_visual_plugin_meta(self, id: ModelId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/visualplugin")
+
+    def set_model_visual_plugin(self, id: ModelId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/visualplugin", data=data)
+        return meta
 
     def get_model_request_plugin(self, id: ModelId, meta: CachingMeta = None):
         path = self.base._build_path(id) + "/requestplugin"
         return self.base.GET_RAW(path, meta)
 
-    def set_model_request_plugin(self, id: ModelId, data: bytes) -> None:
-        self.base._POST_raw(self.base._build_path(id) + "/requestplugin", data=data)
+    def get_model_request_plugin_meta(self, id: ModelId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/requestplugin")
+
+    def set_model_request_plugin(self, id: ModelId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/requestplugin", data=data)
+        return meta
 
     def get_model_parameters(self, id: ModelId, meta: CachingMeta):
         path = self.base._build_path(id) + "/parameter"
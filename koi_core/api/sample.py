@@ -21,6 +21,7 @@ from koi_core.caching import CachingMeta
 from koi_core.resources.ids import InstanceId, SampleId, SampleDatumId, SampleLableId
 
 from koi_core.resources.sample import SampleBasicFields, SampleDatumBasicFields
+from koi_core.resources.sample_bulk import run_bulk
 
 
 _sample_mapping = {
@@ -130,9 +131,43 @@ class APISamples:
             ],
         )
 
+    def add_tags(self, id: SampleId, items):
+        self.base._PUT(
+            self.base._build_path(id) + "/tags",
+            data=[{"name": x} for x in items],
+        )
+
     def remove_tag(self, id: SampleId, item: str):
         self.base._DELETE(self.base._build_path(id) + "/tags/" + item)
 
+    def change_tags(self, id: SampleId, add=(), remove=()) -> int:
+        """Add and remove tags of a sample, all added tags are sent with one request. Returns the number of requests."""
+        add = [x for x in add if x not in remove]
+        if add:
+            self.add_tags(id, add)
+        for item in remove:
+            self.remove_tag(id, item)
+        return (1 if add else 0) + len(remove)
+
+    def update_samples(self, updates, concurrency: int = 8, progress=None):
+        """
+        Write the fields of many samples concurrently. updates is an iterable of
+        (SampleId, SampleBasicFields), see koi_core.resources.sample_bulk.run_bulk for the result.
+        """
+        self.base.set_connection_pool_size(concurrency)
+
+        def update(item):
+            self.update_sample(*item)
+            return True
+
+        return run_bulk(updates, update, concurrency, progress)
+
+    def tag_samples(self, ids, add=(), remove=(), concurrency: int = 8, progress=None):
+        """Add and remove tags of many samples concurrently, see change_tags"""
+        self.base.set_connection_pool_size(concurrency)
+        add, remove = list(add), list(remove)
+        return run_bulk(ids, lambda id: self.change_tags(id, add, remove) > 0, concurrency, progress)
+
     def request_label(self, id: SampleId):
         self.base._POST(
             self.base._build_path(id.InstanceId) + "/label_request",
@@ -187,8 +222,12 @@ class APISamples:
             else:
                 return None, new_meta
 
-    def set_sample_datum_file(self, id: SampleDatumId, data: bytes):
-        self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+    def get_sample_datum_file_meta(self, id: SampleDatumId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/file")
+
+    def set_sample_datum_file(self, id: SampleDatumId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+        return meta
 
     # endregion
 
@@ -235,5 +274,9 @@ class APISamples:
             else:
                 return None, new_meta
 
-    def set_sample_label_file(self, id: SampleLableId, data: bytes):
-        self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+    def get_sample_label_file_meta(self, id: SampleLableId) -> CachingMeta:
+        return self.base._HEAD(self.base._build_path(id) + "/file")
+
+    def set_sample_label_file(self, id: SampleLableId, data: bytes) -> CachingMeta:
+        _, meta = self.base._POST_raw(self.base._build_path(id) + "/file", data=data)
+        return meta
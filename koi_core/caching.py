@@ -15,6 +15,7 @@
 
 from datetime import datetime
 from functools import wraps
+from time import monotonic
 from koi_core.api.common import KoiApiOfflineException
 from koi_core.caching_strategy import CachingStrategy
 from koi_core.caching_persistence import getCachingPersistence
@@ -52,6 +53,7 @@ def setCache(self: CachingObject, key: str, value: T) -> T:
     if not hasattr(self, "_cache"):
         self._cache = getCachingPersistence().getCache(self)
     self._cache[key] = value  # type: ignore
+    _dropDeadline(self, key)
     return value
 
 
@@ -64,6 +66,62 @@ def setIndexedCache(self, key: str, index, value: T) -> T:
     return value
 
 
+def invalidateCache(self: CachingObject, key: str) -> None:
+    if hasattr(self, "_cache"):
+        self._cache.pop(key, None)
+    _dropDeadline(self, key)
+
+
+def _dropDeadline(self: CachingObject, key: str) -> None:
+    deadlines = getattr(self, "__dict__", {}).get("_deadlines")
+    if deadlines is not None:
+        deadlines.pop(key, None)
+
+
+def _setDeadline(self: CachingObject, key: str, meta: CachingMeta) -> None:
+    """
+    Remember until when the entry is valid, so the fast paths (see cache and basicFields) can
+    skip the caching strategy until then
+    """
+    validUntil = getattr(getattr(self, "cachingStrategy", None), "validUntil", None)
+    if validUntil is None or not hasattr(self, "__dict__"):
+        return
+    if "_deadlines" not in self.__dict__:
+        self._deadlines = dict()
+    self._deadlines[key] = validUntil(type(self), key, meta)
+
+
+def _shouldKeep(self: CachingObject, key: str, value) -> bool:
+    shouldKeep = getattr(getattr(self, "cachingStrategy", None), "shouldKeep", None)
+    return shouldKeep is None or shouldKeep(type(self), key, value)
+
+
+def cachedUntilDeadline(self: CachingObject, key: str):
+    """The cached value if it is known to be valid without asking the caching strategy, else raises KeyError"""
+    d = self.__dict__
+    if monotonic() < d["_deadlines"][key]:
+        return d["_cache"][key][0][0]
+    raise KeyError(key)
+
+
+def writeThrough(self: CachingObject, key: str, value: T, meta: CachingMeta, head=None) -> T:
+    """
+    Cache a value that was just written to the server, so it is not downloaded again. meta
+    is the one of the response; if it has neither etag nor modification time, head() is
+    asked for it. Without usable meta the entry is dropped instead.
+    """
+    if (meta is None or (meta.etag is None and meta.last_modified is None)) and head is not None:
+        try:
+            meta = head()
+        except (KoiApiOfflineException, LookupError):
+            meta = None
+    if meta is None:
+        invalidateCache(self, key)
+    else:
+        setCache(self, key, {0: (value, meta)})
+    return value
+
+
 def offlineFeature(func: T) -> T:
     func._offline_feature_ = True
     return func
@@ -74,6 +132,11 @@ def cache(func: T) -> T:
 
     @wraps(func)
     def wrapper(self):
+        try:
+            return cachedUntilDeadline(self, key)
+        except (KeyError, AttributeError):
+            pass
+
         if not hasattr(self, "_cache"):
             self._cache = getCachingPersistence().getCache(self)
         if key not in self._cache:
@@ -89,7 +152,13 @@ def cache(func: T) -> T:
                     self._cache[key][0] = (self._cache[key][0][0], new_meta)  # type: ignore
                 else:
                     self._cache[key][0] = (obj, new_meta)  # type: ignore
-            return self._cache[key][0][0]
+            value, meta = self._cache[key][0]
+            if not _shouldKeep(self, key, value):
+                self._cache.pop(key, None)
+                _dropDeadline(self, key)
+                return value
+            _setDeadline(self, key, meta)
+            return value
         except KoiApiOfflineException:
             if hasattr(func, "_offline_feature_"):
                 if 0 not in self._cache[key]:
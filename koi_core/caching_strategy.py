@@ -14,81 +14,199 @@
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
 from datetime import datetime
+from math import inf
+from time import monotonic
+from typing import Dict, Iterable, Optional, Tuple
 
 
 class CachingStrategy:
     def isValid(self, proxy_cls, key, meta):
         ...
 
+    def validUntil(self, proxy_cls, key, meta) -> float:
+        """
+        Optional: the time.monotonic() until which an entry is valid. Entries are not checked
+        again before, a strategy without it is asked on every access.
+        """
+        ...
+
     def shouldPersist(self, proxy_cls, key, meta):
         ...
 
+    def isEvictable(self, proxy_cls, key) -> bool:
+        """Optional: whether APIObjectPool.evict() may drop the entry"""
+        ...
 
-class ExpireCachingStrategy:
-    def isValid(self, proxy_cls, key, meta):
-        now = datetime.utcnow()
+    def shouldKeep(self, proxy_cls, key, value) -> bool:
+        """Optional: whether a fetched value is kept in the cache at all"""
+        ...
 
-        # Cache all PoolObjects
-        t = proxy_cls.__name__
-        if t in ["LocalOnlyObjectPool", "APIObjectPool"]:
-            if key in ["_get_models"]:
-                return False
-            else:
-                return True
 
-        if meta is None or now >= meta.expires:
-            return False
-        else:
+REVALIDATE_EXPIRES = "expires"
+REVALIDATE_ALWAYS = "always"
+REVALIDATE_NEVER = "never"
+
+
+class CachePolicy:
+    """
+    How the entries of a key of a proxy class are cached:
+
+    ttl: seconds an entry is valid after it was fetched or checked; None uses the expiry
+        time sent by the server
+    persist: the entry is written to the caching persistence file
+    evictable: APIObjectPool.evict() may drop the entry
+    byte_budget: values with more bytes are not kept in memory (None: no limit)
+    revalidate: REVALIDATE_EXPIRES checks the entry with the server when it expired,
+        REVALIDATE_ALWAYS on every access and REVALIDATE_NEVER never
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        persist: bool = False,
+        evictable: bool = True,
+        byte_budget: Optional[int] = None,
+        revalidate: str = REVALIDATE_EXPIRES,
+    ) -> None:
+        if revalidate not in [REVALIDATE_EXPIRES, REVALIDATE_ALWAYS, REVALIDATE_NEVER]:
+            raise ValueError(f"unknown revalidate mode: {revalidate}")
+        self.ttl = ttl
+        self.persist = persist
+        self.evictable = evictable
+        self.byte_budget = byte_budget
+        self.revalidate = revalidate
+
+    def fits(self, value) -> bool:
+        if self.byte_budget is None or not isinstance(value, (bytes, bytearray, memoryview, str)):
             return True
+        return len(value) <= self.byte_budget
 
-    def shouldPersist(self, proxy_cls, key, meta):
-        t = proxy_cls.__name__
-
-        if t == "ModelProxy":
-            if key in [
-                "_basic_fields",
-                "_code",
-                "request_plugin",
-                "visual_plugin",
-                "_instance_ids",
-                "parameters",
-            ]:
-                return True
-            return False
-        if t == "InstanceProxy":
-            if key in [
-                "_basic_fields",
-                "training_data",
-                "inference_data",
-                "_samples",
-                "_get_parameter_values",
-                "__get_descriptors",
-                "_get_available_parameters",
-            ]:
-                return True
-            return False
-        if t == "DescriptorProxy":
-            if key in ["_basic_fields", "raw"]:
-                return True
-            return False
-        if t == "SampleProxy":
-            if key in ["_basic_fields", "__get_data", "__get_labels"]:
-                return True
-            return False
-        if t in ["SampleDatumProxy", "SampleLabelProxy"]:
-            if key in ["_basic_fields", "raw"]:
-                return True
+
+# (proxy class name, key) -> CachePolicy, the key None is the default of the class. The
+# rows of a class apply to its subclasses as well.
+PolicyTable = Dict[Tuple[str, Optional[str]], CachePolicy]
+
+
+def _persisted(cls: str, *keys: str) -> PolicyTable:
+    return {(cls, key): CachePolicy(persist=True) for key in keys}
+
+
+DEFAULT_POLICIES: PolicyTable = {
+    # the pools keep their proxies, only the list of models is checked on every access
+    ("LocalOnlyObjectPool", None): CachePolicy(revalidate=REVALIDATE_NEVER, evictable=False),
+    ("APIObjectPool", None): CachePolicy(revalidate=REVALIDATE_NEVER, evictable=False),
+    ("LocalOnlyObjectPool", "_get_models"): CachePolicy(revalidate=REVALIDATE_ALWAYS, persist=True),
+    ("APIObjectPool", "_get_models"): CachePolicy(revalidate=REVALIDATE_ALWAYS, persist=True),
+    **_persisted(
+        "ModelProxy",
+        "_basic_fields",
+        "_code",
+        "request_plugin",
+        "visual_plugin",
+        "_instance_ids",
+        "parameters",
+    ),
+    **_persisted(
+        "InstanceProxy",
+        "_basic_fields",
+        "training_data",
+        "inference_data",
+        "_samples",
+        "_get_parameter_values",
+        "__get_descriptors",
+        "_get_available_parameters",
+    ),
+    **_persisted("DescriptorProxy", "_basic_fields", "raw"),
+    **_persisted("SampleProxy", "_basic_fields", "__get_data", "__get_labels"),
+    **_persisted("SampleDatumProxy", "_basic_fields", "raw"),
+    **_persisted("SampleLabelProxy", "_basic_fields", "raw"),
+}
+
+_DEFAULT_POLICY = CachePolicy()
+
+
+class ExpireCachingStrategy:
+    """
+    Caches the entries as the policy table says (see DEFAULT_POLICIES). policies are
+    rows that replace or extend the default table, e.g. to keep the raw data of samples
+    for ten minutes without asking the server:
+
+        ExpireCachingStrategy({("SampleDatumProxy", "raw"): CachePolicy(ttl=600, persist=True)})
+
+    The table is compiled to a dict by (class, key) when it is first used for a class;
+    compile(classes) does it ahead of time.
+    """
+
+    def __init__(self, policies: PolicyTable = None) -> None:
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies is not None:
+            self.policies.update(policies)
+        self._compiled: Dict[Tuple[type, str], CachePolicy] = {}
+
+    def _resolve(self, proxy_cls: type, key: str) -> CachePolicy:
+        names = [c.__name__ for c in proxy_cls.__mro__]
+        for name in names:
+            if (name, key) in self.policies:
+                return self.policies[(name, key)]
+        for name in names:
+            if (name, None) in self.policies:
+                return self.policies[(name, None)]
+        return _DEFAULT_POLICY
+
+    def compile(self, classes: Iterable[type]) -> None:
+        for cls in classes:
+            names = {c.__name__ for c in cls.__mro__}
+            for name, key in self.policies:
+                if name in names and key is not None:
+                    self.policy(cls, key)
+
+    def policy(self, proxy_cls: type, key: str) -> CachePolicy:
+        try:
+            return self._compiled[(proxy_cls, key)]
+        except KeyError:
+            policy = self._compiled[(proxy_cls, key)] = self._resolve(proxy_cls, key)
+            return policy
+
+    def isValid(self, proxy_cls, key, meta):
+        policy = self.policy(proxy_cls, key)
+        if policy.revalidate == REVALIDATE_NEVER:
+            return True
+        if policy.revalidate == REVALIDATE_ALWAYS or policy.ttl is not None:
+            # the age of an entry is only known by its deadline (see validUntil), this is
+            # asked once it passed
             return False
-        if t in ["LocalOnlyObjectPool", "APIObjectPool"]:
-            if key in ["_get_models"]:
-                return True
+        if meta is None or meta.expires is None:
             return False
-        return False
+        return datetime.utcnow() < meta.expires
+
+    def validUntil(self, proxy_cls, key, meta) -> float:
+        policy = self.policy(proxy_cls, key)
+        if policy.revalidate == REVALIDATE_NEVER:
+            return inf
+        if policy.revalidate == REVALIDATE_ALWAYS:
+            return 0.0
+        if policy.ttl is not None:
+            return monotonic() + policy.ttl
+        if meta is None or meta.expires is None:
+            return 0.0
+        return monotonic() + (meta.expires - datetime.utcnow()).total_seconds()
+
+    def shouldPersist(self, proxy_cls, key, meta):
+        return self.policy(proxy_cls, key).persist
+
+    def isEvictable(self, proxy_cls, key):
+        return self.policy(proxy_cls, key).evictable
+
+    def shouldKeep(self, proxy_cls, key, value):
+        return self.policy(proxy_cls, key).fits(value)
 
 
 class LocalOnlyCachingStrategy:
     def isValid(self, proxy_cls, key, meta):
         return True
 
+    def validUntil(self, proxy_cls, key, meta) -> float:
+        return inf
+
     def shouldPersist(self, proxy_cls, key, meta):
         return False
@@ -0,0 +1,172 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import hashlib
+import marshal
+import os
+import shutil
+import stat
+import tempfile
+import types
+import zipfile
+from importlib.util import MAGIC_NUMBER
+from typing import IO, Callable, Iterable, Optional, Tuple
+
+
+def get_cache_dir() -> str:
+    """
+    The directory for caches that are shared by all processes of a node. It is set with the
+    environment variable KOI_CORE_CACHE_DIR and defaults to ~/.cache/koi_core.
+    """
+    path = os.environ.get("KOI_CORE_CACHE_DIR")
+    if not path:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "koi_core")
+    return path
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write the file so concurrent readers see either nothing or the complete content"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def bytecode_key(digest: str, path: str) -> str:
+    """The key of a module compiled from path of the code with the given digest"""
+    h = hashlib.sha256()
+    h.update(digest.encode())
+    h.update(path.encode())
+    h.update(MAGIC_NUMBER)
+    return h.hexdigest()
+
+
+def _bytecode_path(key: str) -> str:
+    return os.path.join(get_cache_dir(), "bytecode", key[:2], key + ".bin")
+
+
+def load_bytecode(key: str) -> Optional[types.CodeType]:
+    try:
+        with open(_bytecode_path(key), "rb") as f:
+            return marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        # missing or unreadable entries are compiled again
+        return None
+
+
+def store_bytecode(key: str, code: types.CodeType) -> None:
+    try:
+        atomic_write(_bytecode_path(key), marshal.dumps(code))
+    except OSError:
+        # the cache is optional, e.g. on a read only file system
+        pass
+
+
+def _set_read_only(path: str) -> None:
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            os.chmod(os.path.join(root, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    for root, dirs, files in os.walk(path, topdown=False):
+        os.chmod(root, stat.S_IRUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+
+
+def _remove_tree(path: str) -> None:
+    for root, dirs, files in os.walk(path):
+        os.chmod(root, stat.S_IRWXU)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def extract_assets(digest: str, names: Iterable[str], open_member: Callable[[str], IO[bytes]]) -> str:
+    """
+    Extract the files of the code with the given digest once per node and return the
+    directory. open_member(name) opens a file for reading, it is streamed to the disk.
+    The directory is populated in a temporary location and renamed when complete, so
+    concurrent loads either see all files or extract them themselves. It is read only.
+    """
+    base = os.path.join(get_cache_dir(), "assets")
+    target = os.path.join(base, digest)
+    if os.path.isdir(target):
+        return target
+
+    os.makedirs(base, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix=digest + ".", dir=base)
+    try:
+        for name in names:
+            path = os.path.join(temp_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open_member(name) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 2**20)
+        _set_read_only(temp_dir)
+        os.rename(temp_dir, target)
+    except Exception as e:
+        _remove_tree(temp_dir)
+        if not (isinstance(e, OSError) and os.path.isdir(target)):
+            raise
+        # another process was faster
+    return target
+
+
+def _bundle_path(digest: str) -> str:
+    return os.path.join(get_cache_dir(), "bundles", digest + ".zip")
+
+
+def build_bundle(digest: str, files: Iterable[Tuple[str, str]]) -> str:
+    """
+    Return the path of the zip file with the given digest, it is built from the (name, path)
+    pairs of files if it is not cached yet. The zip is deterministic: the members are sorted
+    and have a fixed date and mode, so the same files always give the same bundle.
+    """
+    target = _bundle_path(digest)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for name, path in sorted(files):
+                info = zipfile.ZipInfo(name.replace(os.sep, "/"), date_time=(1980, 1, 1, 0, 0, 0))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with open(path, "rb") as src, zipf.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst, 2**20)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return target
+
+
+def _upload_path(digest: str, target: str) -> str:
+    return os.path.join(get_cache_dir(), "bundles", f"{digest}.{target}.etag")
+
+
+def load_upload_etag(digest: str, target: str) -> Optional[str]:
+    """The ETag the server reported after the bundle was uploaded to target, if any"""
+    try:
+        with open(_upload_path(digest, target), "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def store_upload_etag(digest: str, target: str, etag: str) -> None:
+    try:
+        atomic_write(_upload_path(digest, target), etag.encode())
+    except OSError:
+        pass
@@ -13,56 +13,162 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Dict, Union
+import hashlib
+import marshal
+import sys
 import zipfile
 import io
 from os import makedirs
-from os.path import sep, dirname
+from os.path import sep, dirname, isabs
+from shutil import copyfileobj
 from importlib.abc import MetaPathFinder, Loader
 from importlib.machinery import ModuleSpec
+from threading import RLock
 from importlib import import_module
+from importlib.util import MAGIC_NUMBER
+from koi_core.code_cache import bytecode_key, extract_assets, load_bytecode, store_bytecode
 
 if TYPE_CHECKING:
     from koi_core.resources.model import Code
 
 
-class KoiCodeLoader(Loader, MetaPathFinder):
-    _modules = dict()
-    _prefix = 'user_code'
-    _param_module = _prefix + '.__param__'
+USER_CODE = 'user_code'
+
+# the loaders of all loaded user code by their module prefix
+_loaders: Dict[str, 'KoiCodeLoader'] = dict()
+# the prefix the "user_code" modules are an alias for
+_alias_prefix: str = None
+_load_lock = RLock()
+
+
+def module_prefix(digest: str, params) -> str:
+    """The name of the package for the code with the given digest and parameters"""
+    h = hashlib.sha256(digest.encode())
+    h.update(repr(sorted((str(k), repr(params[k])) for k in params.keys())).encode())
+    return f'{USER_CODE}_{h.hexdigest()[:16]}'
+
+
+def _is_in_package(fullname: str, package: str) -> bool:
+    return fullname == package or fullname.startswith(package + '.')
+
+
+class _AliasLoader(Loader):
+    """Makes a "user_code" module an alias of the module of the current user code"""
+
+    def __init__(self, target: str):
+        self._target = target
+
+    def create_module(self, spec):
+        return import_module(self._target)
+
+    def exec_module(self, module):
+        pass
+
+
+def _set_alias(prefix: str):
+    global _alias_prefix
+    for name in [n for n in sys.modules if _is_in_package(n, USER_CODE)]:
+        del sys.modules[name]
+    _alias_prefix = prefix
+
 
-    def __init__(self, code: Union['Code', str, bytes], param_dict, temp_dir=None):
+def load_user_code(code: Union['Code', str, bytes], params, prefix: str, temp_dir=None):
+    """
+    Load the user code as a package of its own, named prefix (see module_prefix). The same
+    prefix is loaded once per process. Afterwards "user_code" is an alias for this package,
+    as long as no other code is loaded. If the module has set_asset_dir, it is called with
+    the directory of the non-code files.
+    """
+    with _load_lock:
+        loader = _loaders.get(prefix)
+        if loader is None:
+            loader = KoiCodeLoader(code, params, temp_dir, prefix)
+            sys.meta_path.insert(0, loader)
+            _loaders[prefix] = loader
+        elif temp_dir is not None:
+            loader._temp_dir = temp_dir
+            loader._extract_noncode()
+
+        _set_alias(prefix)
+        module = import_module(prefix)
+        sys.modules[USER_CODE] = module
+
+        if hasattr(module, "set_asset_dir"):
+            module.set_asset_dir(loader.asset_dir)
+        return module
+
+
+def unload_user_code(prefix: str):
+    """Remove the loader and the modules of the user code loaded with prefix"""
+    global _alias_prefix
+    with _load_lock:
+        loader = _loaders.pop(prefix, None)
+        if loader is not None:
+            sys.meta_path.remove(loader)
+        for name in [n for n in sys.modules if _is_in_package(n, prefix)]:
+            del sys.modules[name]
+        if _alias_prefix == prefix:
+            _set_alias(None)
+
+
+class KoiCodeLoader(Loader, MetaPathFinder):
+    def __init__(self, code: Union['Code', str, bytes], param_dict, temp_dir=None, prefix: str = USER_CODE):
+        self._prefix = prefix
+        self._param_module = prefix + '.__param__'
         self._code = code
 
         if type(self._code) in [bytes, str]:
+            # a zip file given by its path may change, only bytes have a digest
+            self._digest = None
             if type(self._code) == bytes:
+                self._digest = hashlib.sha256(self._code).hexdigest()
                 self._code = io.BytesIO(self._code)
             self._archive = zipfile.ZipFile(self._code, mode="r")
             self._namelist = self._archive.namelist()
         else:
             self._archive = None
             self._namelist = list(self._code.gen_namelist())
+            self._digest = self._code.digest()
 
         self._params = param_dict
         self._temp_dir = temp_dir
         self._extract_noncode()
 
+    def _noncode_names(self):
+        for f in self._namelist:
+            if f.endswith("/") or f.endswith(".py") or f.endswith(".pyc"):
+                continue
+            if isabs(f) or ".." in f.replace("\\", "/").split("/"):
+                # never write outside of the asset directory
+                continue
+            yield f
+
+    def _open(self, path):
+        if self._archive is None:
+            return self._code.open(path)
+        return self._archive.open(path)
+
     def _extract_noncode(self):
-        if self._temp_dir is not None:
-            for f in self._namelist:
-                if not f.endswith(".py") and not f.endswith(".pyc"):
-                    if self._archive is None:
-                        data_raw = self._code.read(f)
-                    else:
-                        data_raw = self._archive.read(f)
+        """
+        Provide the non-code files in a directory, the asset_dir. Code with a digest is
+        extracted once per node into a shared, read only cache directory. Other code
+        (e.g. local files that may change) is copied to the temporary directory.
+        """
+        self.asset_dir = self._temp_dir
+        if self._temp_dir is None:
+            return
+        if self._digest is not None:
+            self.asset_dir = extract_assets(self._digest, self._noncode_names(), self._open)
+            return
 
-                    # make sub dirs if they dont exist
-                    makedirs(dirname(self._temp_dir + sep + f), exist_ok=True)
+        for f in self._noncode_names():
+            # make sub dirs if they dont exist
+            makedirs(dirname(self._temp_dir + sep + f), exist_ok=True)
 
-                    # write file to temp directory
-                    data_file = open(self._temp_dir + sep + f, 'wb')
-                    data_file.write(data_raw)
-                    data_file.close()
+            # stream the file to the temp directory
+            with self._open(f) as src, open(self._temp_dir + sep + f, 'wb') as dst:
+                copyfileobj(src, dst, 2**20)
 
     def exec_module(self, module):
         fullname = module.__name__
@@ -75,6 +181,9 @@ class KoiCodeLoader(Loader, MetaPathFinder):
             exec(code, module.__dict__)
 
     def find_spec(self, fullname, paths=None, target=None):
+        if self._prefix != USER_CODE and self._prefix == _alias_prefix and _is_in_package(fullname, USER_CODE):
+            target = self._prefix + fullname[len(USER_CODE):]
+            return ModuleSpec(fullname, _AliasLoader(target))
         try:
             path, is_package = self._find_module(fullname)
         except KeyError:
@@ -113,16 +222,37 @@ class KoiCodeLoader(Loader, MetaPathFinder):
 
         raise KeyError()
 
+    def _read(self, path):
+        if self._archive is None:
+            return self._code.read(path)
+        return self._archive.read(path)
+
     def _get_module_code(self, path):
+        # check that we are not using a local zip
+        filename = path if self._archive is None else 'ZipFile:' + path
+
         if path[-3:] == '.py':
-            # check that we are not using a local zip
-            if self._archive is None:
-                code = self._code.read(path)
-                return compile(code, path, 'exec', dont_inherit=True)
-            else:
-                code = self._archive.read(path)
-                return compile(code, 'ZipFile:'+path, 'exec', dont_inherit=True)
+            # the compiled modules are cached on disk, keyed by the code (or the source if
+            # the code has no digest), the path and the magic number of the interpreter
+            source = None
+            digest = self._digest
+            if digest is None:
+                source = self._read(path)
+                digest = hashlib.sha256(source).hexdigest()
+            key = bytecode_key(digest, filename)
+
+            code = load_bytecode(key)
+            if code is None:
+                if source is None:
+                    source = self._read(path)
+                code = compile(source, filename, 'exec', dont_inherit=True)
+                store_bytecode(key, code)
+            return code
         elif path[-4:] == '.pyc':
-            raise NotImplementedError('Can not load bytecode')
+            data = self._read(path)
+            if data[:4] != MAGIC_NUMBER:
+                raise ImportError(f'bad magic number in {filename}', path=filename)
+            # skip the header: magic number, flags and the source's mtime/size or hash
+            return marshal.loads(data[16:])
         else:
             raise NotImplementedError('Unknown fileextension')
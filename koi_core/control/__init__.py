@@ -14,3 +14,4 @@
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
 from .control import train, infer, terminate  # noqa: F401
+from .runable_instance import configure  # noqa: F401
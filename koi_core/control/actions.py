@@ -13,32 +13,66 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from koi_core.data.simple_batch_generator import SimpleBatchGenerator
+from time import monotonic
+from koi_core.data.prefetching_batch_generator import PrefetchingBatchGenerator
+from koi_core.control.progress import ProgressReporter, PHASE_TRAIN, PHASE_SAVE, PHASE_DONE
 
 
-def train(model, instance, batch_iterable):
+def train(model, instance, batch_iterable, progress=None, uploader=None):
+    """
+    Train the model with the given batches. progress is an optional callback that
+    receives a TrainingProgress during the training. If a CheckpointUploader is given,
+    the training and inference data are uploaded by it and the futures of the uploads
+    are returned, otherwise they are uploaded before returning.
+    """
+    reporter = ProgressReporter(progress)
+    reporter.report(force=True)
+
     if batch_iterable is None:
         if "batch_generator" in model.__dict__:
             batch_iterable = model.batch_generator(instance)
         else:
-            batch_iterable = SimpleBatchGenerator(instance)
+            batch_iterable = PrefetchingBatchGenerator(instance)
             batch_iterable.batchSize = 25
 
+    start = monotonic()
     if instance.training_data is None:
         # if no training_data is available
         model.initialize_training()
     else:
         model.load_training_data(instance.training_data)
+    reporter.progress.load_time = monotonic() - start
+    reporter.report(PHASE_TRAIN)
 
-    for batch in batch_iterable:
+    batches = iter(batch_iterable)
+    while True:
+        start = monotonic()
+        try:
+            batch = next(batches)
+        except StopIteration:
+            break
+        fetched = monotonic()
         model.train(batch)
+        reporter.add_batch(batch, fetched - start, monotonic() - fetched)
+
+    reporter.report(PHASE_SAVE)
+    start = monotonic()
+    futures = []
+
+    def upload(key, data):
+        if uploader is None:
+            setattr(instance, key, data)
+        else:
+            futures.append(uploader.submit(setattr, instance, key, data))
 
     if model.should_create_training_data():
-        instance.training_data = model.save_training_data()
+        upload("training_data", model.save_training_data())
     if model.should_create_inference_data():
-        instance.inference_data = model.save_inference_data()
+        upload("inference_data", model.save_inference_data())
+    reporter.progress.save_time = monotonic() - start
+    reporter.report(PHASE_DONE)
 
-    return
+    return futures
 
 
 def infer(model, instance, batch_iterable):
@@ -15,62 +15,127 @@
 
 from typing import Any, Dict, List
 from tempfile import TemporaryDirectory
+from threading import RLock
 from koi_core.control import actions
 from koi_core.resources.instance import Instance
-from .runable_instance import RunableInstance
+from .runable_instance import RunableInstance, shutdown_idle_processes
+from .replicated_instance import ReplicatedRunableInstance, DISPATCH_ROUND_ROBIN, check_replication
 from time import time
 
 
 _runable_instance: RunableInstance = None
 _active_instances: Dict[Instance, List] = {}
+_lock = RLock()
 
 
-def _set_instance(instance: Instance, max_instances: int = 1):
-    global _runable_instance
-    global _active_instances
-
-    if _runable_instance is not None and _runable_instance.instance == instance:
-        # instance is already avaiable as runable_instance - return
-        return
+def _create_runable_instance(instance: Instance, replicas: int, dispatch: str):
+    check_replication(replicas, dispatch)
+    if replicas > 1:
+        return ReplicatedRunableInstance(instance, replicas, dispatch)
+    return RunableInstance(instance)
 
-    if max_instances > 0 and len(_active_instances) > max_instances:
-        # we have too many instances...
-        sorted_instances = sorted(_active_instances.items(), key=lambda x: x[1][1], reverse=True)
-        sorted_instances = sorted_instances[-(len(sorted_instances)-max_instances):]
 
-        # remove the unused instances
-        for elem in sorted_instances:
-            elem[1][0].terminate()
-            del _active_instances[elem[0]]
+def _matches(runable_instance, replicas: int, dispatch: str) -> bool:
+    return (
+        runable_instance.is_alive()
+        and runable_instance.replicas == replicas
+        and (replicas == 1 or runable_instance.dispatch == dispatch)
+    )
 
-    if instance in _active_instances and _active_instances[instance][0].is_alive():
-        _runable_instance = _active_instances[instance][0]
-        _active_instances[instance][1] = time()
-        return
-    else:
-        # replace the oldest instance if the number is exhausted
-        if max_instances > 0 and len(_active_instances) == max_instances:
-            elem = sorted(_active_instances.items(), key=lambda x: x[1][1], reverse=True)[-1]
-            elem[1][0].terminate()
-            del _active_instances[elem[0]]
-
-        # create a new runable instance and add it to the dictionary
-        _runable_instance = RunableInstance(instance)
-        _active_instances[instance] = [_runable_instance, time()]
 
+def _set_instance(
+    instance: Instance, max_instances: int = 1, replicas: int = 1, dispatch: str = DISPATCH_ROUND_ROBIN
+) -> RunableInstance:
+    global _runable_instance
+    global _active_instances
 
-def train(instance: Instance, batch_iterable=None, dev=False, max_instances=1):
+    with _lock:
+        if (
+            _runable_instance is not None
+            and _runable_instance.instance == instance
+            and _matches(_runable_instance, replicas, dispatch)
+        ):
+            # instance is already avaiable as runable_instance - return
+            return _runable_instance
+
+        if max_instances > 0 and len(_active_instances) > max_instances:
+            # we have too many instances...
+            sorted_instances = sorted(_active_instances.items(), key=lambda x: x[1][1], reverse=True)
+            sorted_instances = sorted_instances[-(len(sorted_instances)-max_instances):]
+
+            # remove the unused instances
+            for elem in sorted_instances:
+                elem[1][0].terminate()
+                del _active_instances[elem[0]]
+
+        if (
+            instance in _active_instances
+            and _matches(_active_instances[instance][0], replicas, dispatch)
+        ):
+            _runable_instance = _active_instances[instance][0]
+            _active_instances[instance][1] = time()
+            return _runable_instance
+        else:
+            if instance in _active_instances:
+                # a process died or the replication changed
+                _active_instances[instance][0].terminate()
+                del _active_instances[instance]
+
+            # replace the oldest instance if the number is exhausted
+            if max_instances > 0 and len(_active_instances) == max_instances:
+                elem = sorted(_active_instances.items(), key=lambda x: x[1][1], reverse=True)[-1]
+                elem[1][0].terminate()
+                del _active_instances[elem[0]]
+
+            # create a new runable instance and add it to the dictionary
+            _runable_instance = _create_runable_instance(instance, replicas, dispatch)
+            _active_instances[instance] = [_runable_instance, time()]
+            return _runable_instance
+
+
+def train(
+    instance: Instance,
+    batch_iterable=None,
+    dev=False,
+    max_instances=1,
+    replicas=1,
+    dispatch=DISPATCH_ROUND_ROBIN,
+    progress=None,
+    upload_async=False,
+):
+    """
+    Train the instance. progress is an optional callback, it receives a TrainingProgress
+    (batches, samples/s, time spent fetching batches vs. computing, memory usage, ...)
+    about once a second and at the start and end of every phase of the training.
+
+    With upload_async the instance process uploads the training and inference data in the
+    background and train returns right after the training. The uploads are finished before
+    the process runs its next command or exits; a failed upload is raised by that command.
+    """
     if dev:
         temp_dir = TemporaryDirectory()
         model = instance.load_code(temp_dir.name)
-        actions.train(model, instance, batch_iterable)
+        actions.train(model, instance, batch_iterable, progress)
         temp_dir.cleanup()
     else:
-        _set_instance(instance, max_instances)
-        _runable_instance.train(batch_iterable)
-
-
-def infer(instance: Instance, data, dev=False, model=None, max_instances=1) -> List[Any]:
+        runable_instance = _set_instance(instance, max_instances, replicas, dispatch)
+        runable_instance.train(batch_iterable, progress, upload_async)
+
+
+def infer(
+    instance: Instance,
+    data,
+    dev=False,
+    model=None,
+    max_instances=1,
+    replicas=1,
+    dispatch=DISPATCH_ROUND_ROBIN,
+) -> List[Any]:
+    """
+    Run an inference with the given instance. Passing replicas > 1 serves the instance with
+    several processes; concurrent calls from different threads are then dispatched to the
+    replicas either round robin or to the least loaded one (dispatch="least_loaded").
+    """
     if dev:
         temp_dir = None
 
@@ -85,10 +150,16 @@ def infer(instance: Instance, data, dev=False, model=None, max_instances=1) -> L
         return ret
 
     else:
-        _set_instance(instance, max_instances)
-        return _runable_instance.infer(data)
+        runable_instance = _set_instance(instance, max_instances, replicas, dispatch)
+        return runable_instance.infer(data)
 
 
 def terminate():
-    for elem in _active_instances.values():
-        elem[0].terminate()
+    global _runable_instance
+
+    with _lock:
+        for elem in _active_instances.values():
+            elem[0].terminate()
+        _active_instances.clear()
+        _runable_instance = None
+    shutdown_idle_processes()
@@ -0,0 +1,105 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import os
+from copy import copy
+from time import monotonic
+from typing import Callable, Optional
+
+
+PHASE_LOAD = "load"
+PHASE_TRAIN = "train"
+PHASE_SAVE = "save"
+PHASE_DONE = "done"
+
+
+def _rss() -> Optional[int]:
+    """The resident set size of this process in bytes, None if it is unknown"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # this is the peak, ru_maxrss is given in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+class TrainingProgress():
+    """
+    A snapshot of a running training. The times are given in seconds. fetch_time is spent
+    waiting for the next batch (i.e. loading samples), compute_time is spent in model.train.
+    """
+
+    phase: str = PHASE_LOAD
+    batches: int = 0
+    samples: int = 0
+    elapsed: float = 0.0
+    fetch_time: float = 0.0
+    compute_time: float = 0.0
+    load_time: float = 0.0
+    save_time: float = 0.0
+    rss: Optional[int] = None
+
+    @property
+    def samples_per_second(self) -> float:
+        train_time = self.fetch_time + self.compute_time
+        return self.samples / train_time if train_time > 0 else 0.0
+
+    def __str__(self):
+        rss = f"{self.rss / 2**20:.0f}MiB" if self.rss is not None else "unknown"
+        return (
+            f"{self.phase}: {self.batches} batches, {self.samples} samples, "
+            f"{self.samples_per_second:.1f} samples/s, fetch {self.fetch_time:.1f}s, "
+            f"compute {self.compute_time:.1f}s, load {self.load_time:.1f}s, "
+            f"save {self.save_time:.1f}s, rss {rss}"
+        )
+
+
+class ProgressReporter():
+    """Collects the timings of a training and reports them at most every interval seconds"""
+
+    def __init__(self, callback: Callable[[TrainingProgress], None] = None, interval: float = 1.0):
+        self._callback = callback
+        self._interval = interval
+        self._start = monotonic()
+        self._last_report = self._start
+        self.progress = TrainingProgress()
+
+    def report(self, phase: str = None, force: bool = False):
+        if self._callback is None:
+            return
+        now = monotonic()
+        if phase is not None:
+            self.progress.phase = phase
+        elif not force and now - self._last_report < self._interval:
+            return
+        self._last_report = now
+        self.progress.elapsed = now - self._start
+        self.progress.rss = _rss()
+        self._callback(copy(self.progress))
+
+    def add_batch(self, batch, fetch_time: float, compute_time: float):
+        self.progress.batches += 1
+        try:
+            self.progress.samples += len(batch)
+        except TypeError:
+            pass
+        self.progress.fetch_time += fetch_time
+        self.progress.compute_time += compute_time
+        self.report()
@@ -0,0 +1,141 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import os
+from tempfile import TemporaryDirectory
+from threading import Lock
+from koi_core.caching import invalidateCache
+from koi_core.resources.handle import InstanceHandle
+from koi_core.resources.instance import Instance
+from .runable_instance import RunableInstance
+
+
+DISPATCH_ROUND_ROBIN = "round_robin"
+DISPATCH_LEAST_LOADED = "least_loaded"
+
+
+def check_replication(replicas: int, dispatch: str):
+    if replicas < 1:
+        raise ValueError("at least one replica is needed")
+    if dispatch not in [DISPATCH_ROUND_ROBIN, DISPATCH_LEAST_LOADED]:
+        raise ValueError(f"unknown dispatch mode: {dispatch}")
+
+
+def _warm_up(instance: Instance):
+    """
+    Fetch the code, parameters and inference data of the instance once in the calling process.
+    The replicas are handed a snapshot of these cache entries (see InstanceHandle), so
+    adding a replica does not download anything again.
+    """
+    instance.model._code
+    instance.parameter.keys()
+    instance.inference_data
+
+
+class ReplicatedRunableInstance():
+    """
+    Serves one instance with several RunableInstances. Every call to infer is dispatched
+    to one of the replicas, so concurrent callers can use more than a single core.
+    """
+
+    def __init__(self, instance: Instance, replicas: int, dispatch: str = DISPATCH_ROUND_ROBIN):
+        check_replication(replicas, dispatch)
+
+        self.instance = instance
+        self._dispatch = dispatch
+        self._lock = Lock()
+        self._next = 0
+
+        self._snapshot_dir = TemporaryDirectory()
+        handle = self._create_handle()
+        self._replicas = [RunableInstance(instance, handle) for _ in range(replicas)]
+        self._replica_locks = [Lock() for _ in range(replicas)]
+        self._load = [0 for _ in range(replicas)]
+
+    @property
+    def replicas(self) -> int:
+        return len(self._replicas)
+
+    @property
+    def dispatch(self) -> str:
+        return self._dispatch
+
+    def _create_handle(self) -> InstanceHandle:
+        _warm_up(self.instance)
+        return InstanceHandle.from_instance(
+            self.instance, os.path.join(self._snapshot_dir.name, "snapshot"))
+
+    def _select(self) -> int:
+        with self._lock:
+            if self._dispatch == DISPATCH_LEAST_LOADED:
+                index = min(range(len(self._replicas)), key=lambda i: self._load[i])
+            else:
+                index = self._next
+                self._next = (self._next + 1) % len(self._replicas)
+            self._load[index] += 1
+        return index
+
+    def _release(self, index: int):
+        with self._lock:
+            self._load[index] -= 1
+
+    def _acquire_all(self):
+        for lock in self._replica_locks:
+            lock.acquire()
+
+    def _release_all(self):
+        for lock in self._replica_locks:
+            lock.release()
+
+    def train(self, batch_iterable=None, progress=None, upload_async=False):
+        # the replicas are restarted from the uploaded state right away, so the
+        # uploads always finish before train returns (upload_async is ignored)
+        # lock all replicas so no inference runs while the instance changes
+        self._acquire_all()
+        try:
+            self._replicas[0].train(batch_iterable, progress)
+
+            # the replicas still hold the old state. Drop the stale data in this
+            # process, fetch it once and restart the replicas from the fresh state.
+            invalidateCache(self.instance, "training_data")
+            invalidateCache(self.instance, "inference_data")
+            for replica in self._replicas:
+                replica.terminate()
+            handle = self._create_handle()
+            for i in range(len(self._replicas)):
+                self._replicas[i] = RunableInstance(self.instance, handle)
+        finally:
+            self._release_all()
+
+    def infer(self, batch_iterable):
+        index = self._select()
+        try:
+            with self._replica_locks[index]:
+                return self._replicas[index].infer(batch_iterable)
+        finally:
+            self._release(index)
+
+    def terminate(self):
+        # wait for running calls, they would receive the exit response otherwise
+        self._acquire_all()
+        try:
+            for replica in self._replicas:
+                replica.terminate()
+            self._snapshot_dir.cleanup()
+        finally:
+            self._release_all()
+
+    def is_alive(self):
+        return all(replica.is_alive() for replica in self._replicas)
@@ -13,19 +13,56 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
+import atexit
 import multiprocessing
+from multiprocessing.connection import Connection
+from importlib import import_module
 from tempfile import TemporaryDirectory
+from threading import Lock
+from typing import Iterable, List, Tuple, Union
 from koi_core.resources.instance import Instance
+from koi_core.resources.handle import InstanceHandle
 from koi_core.control import actions
+from koi_core.control.uploader import CheckpointUploader
+
+
+class _ProcessSettings():
+    # the module itself acts as the default context without fixing the start method
+    context = multiprocessing
+    preload: List[str] = []
+    idle_processes: int = 0
+
+
+_settings = _ProcessSettings()
+_idle_processes: List[Tuple[multiprocessing.Process, Connection]] = []
+_idle_lock = Lock()
+# terminated processes that still upload their checkpoints
+_retiring_processes: List[Tuple[multiprocessing.Process, Connection]] = []
+# the uploader of an instance process, created on the first asynchronous upload
+_uploader: CheckpointUploader = None
+
+
+class _LoadCommand():
+    def __init__(self, instance):
+        self.instance = instance
 
 
 class _TrainCommand():
-    def __init__(self, batch_iterable):
+    def __init__(self, batch_iterable, report_progress=False, upload_async=False):
         self.batch_iterable = batch_iterable
+        self.report_progress = report_progress
+        self.upload_async = upload_async
 
 
 class _TrainResponse():
-    pass
+    def __init__(self, uploads=0):
+        # the number of uploads that are still running
+        self.uploads = uploads
+
+
+class _ProgressResponse():
+    def __init__(self, progress):
+        self.progress = progress
 
 
 class _InferCommand():
@@ -51,9 +88,23 @@ class _ExitResponse():
     pass
 
 
+def _get_uploader() -> CheckpointUploader:
+    global _uploader
+    if _uploader is None:
+        _uploader = CheckpointUploader()
+    return _uploader
+
+
 def _train(pipe, model, instance, command: _TrainCommand):
-    actions.train(model, instance, command.batch_iterable)
-    pipe.send(_TrainResponse())
+    progress = None
+    if command.report_progress:
+        # stream the progress to the parent while training
+        def progress(p):
+            pipe.send(_ProgressResponse(p))
+
+    uploader = _get_uploader() if command.upload_async else None
+    futures = actions.train(model, instance, command.batch_iterable, progress, uploader)
+    pipe.send(_TrainResponse(len(futures)))
 
 
 def _infer(pipe, model, instance, command: _InferCommand):
@@ -61,7 +112,28 @@ def _infer(pipe, model, instance, command: _InferCommand):
     pipe.send(_InferResponse(result))
 
 
-def _process_run(pipe, instance: Instance):
+def _process_run(pipe, instance: Union[Instance, InstanceHandle] = None, preload: Iterable[str] = ()):
+    # import the heavy modules before anything else. In fork server mode they are already
+    # imported by the server and this is a no-op.
+    for module in preload:
+        import_module(module)
+
+    if instance is None:
+        # this is an idle process, wait for the instance it should serve
+        try:
+            command = pipe.recv()
+        except EOFError:
+            # the parent is gone
+            return 0
+        if type(command) == _ExitCommand:
+            pipe.send(_ExitResponse())
+            return 0
+        instance = command.instance
+
+    if isinstance(instance, InstanceHandle):
+        # open our own pool and connections
+        instance = instance.open()
+
     # generate temporary directory for the model to use
     temp_dir = TemporaryDirectory()
 
@@ -79,10 +151,16 @@ def _process_run(pipe, instance: Instance):
             break
         else:
             try:
+                if _uploader is not None:
+                    # the next command may need the uploaded data, a failed upload is
+                    # reported to it
+                    _uploader.flush()
                 commandLookup.get(type(command), default)(pipe, model, instance, command)
             except Exception as e:
                 pipe.send(_ExceptionResponse(e))
 
+    if _uploader is not None:
+        _uploader.close()
     pipe.send(_ExitResponse())
 
     # release the temp directory
@@ -95,41 +173,179 @@ def _check_for_exceptions(response):
         raise response.exception
 
 
+def configure(start_method: str = None, preload: Iterable[str] = None, idle_processes: int = 0):
+    """
+    Configure how the processes of RunableInstances are created.
+
+    start_method selects the multiprocessing start method. With "forkserver" a server
+    process imports the modules listed in preload once and forks all later processes from
+    it, so heavy libraries are not imported again for every instance. With idle_processes > 0
+    that many processes are started ahead of time (with preload imported) and wait to be
+    handed the next instance.
+    """
+    shutdown_idle_processes()
+
+    _settings.context = multiprocessing.get_context(start_method) if start_method else multiprocessing
+    _settings.preload = list(preload) if preload else []
+    _settings.idle_processes = idle_processes
+
+    if (start_method or multiprocessing.get_start_method(allow_none=True)) == "forkserver":
+        _settings.context.set_forkserver_preload(["koi_core"] + _settings.preload)
+
+    _fill_idle_processes()
+
+
+def _start_process(name: str, instance: Union[Instance, InstanceHandle] = None):
+    a, b = _settings.context.Pipe()
+    process = _settings.context.Process(
+        target=_process_run, args=(b, instance, _settings.preload), name=name)
+    process.start()
+    return process, a
+
+
+def _fill_idle_processes():
+    with _idle_lock:
+        while len(_idle_processes) < _settings.idle_processes:
+            _idle_processes.append(_start_process("koi_runable_idle"))
+
+
+def _take_idle_process():
+    with _idle_lock:
+        while len(_idle_processes) > 0:
+            process, pipe = _idle_processes.pop(0)
+            if process.is_alive():
+                return process, pipe
+            # reap the dead process
+            _stop_process(process, pipe)
+    return None
+
+
+def _stop_process(process, pipe):
+    if process.is_alive():
+        try:
+            pipe.send(_ExitCommand())
+        except OSError:
+            # the process is about to die or the pipe is broken
+            pass
+        process.join(3.0)
+        if process.exitcode is None:
+            process.terminate()
+    process.join()
+    pipe.close()
+    process.close()
+
+
+def _reap_retiring_processes(wait: bool = False):
+    with _idle_lock:
+        for process, pipe in list(_retiring_processes):
+            if wait or process.exitcode is not None:
+                process.join()
+                pipe.close()
+                process.close()
+                _retiring_processes.remove((process, pipe))
+
+
+def shutdown_idle_processes():
+    """
+    Stop all idle processes and wait for terminated processes that still upload their
+    checkpoints. This is done by control.terminate() (and so by koi_core.deinit()).
+    The idle processes are no daemons, as the user code they will run may start processes
+    itself. To not block the interpreter exit when deinit was not called, they are stopped
+    at exit as well.
+    """
+    with _idle_lock:
+        for process, pipe in _idle_processes:
+            _stop_process(process, pipe)
+        _idle_processes.clear()
+    _reap_retiring_processes(wait=True)
+
+
+atexit.register(shutdown_idle_processes)
+
+
 class RunableInstance():
-    def __init__(self, instance: Instance):
+    replicas = 1
+    dispatch = None
+
+    def __init__(self, instance: Instance, handle: InstanceHandle = None):
         self._process_name = f"koi_runable_{instance.name}"
         self.instance = instance
-
-        a, b = multiprocessing.Pipe()
-        self._pipe = a
-        self._process = multiprocessing.Process(
-            target=_process_run, args=(b, instance), name=self._process_name)
-        self._process.start()
-
-    def train(self, batch_iterable=None):
-        self._pipe.send(_TrainCommand(batch_iterable))
-        response = self._pipe.recv()
+        # one command at a time can use the pipe
+        self._lock = Lock()
+        # the process still uploads the checkpoints of the last training
+        self._uploading = False
+
+        # hand a small handle to the process instead of the instance with its pool and caches.
+        # Only instances that can not be reopened (e.g. of a local pool) are sent as they are.
+        if handle is None:
+            handle = InstanceHandle.from_instance(instance)
+        target = handle if handle is not None else instance
+
+        _reap_retiring_processes()
+        idle = _take_idle_process()
+        if idle is not None:
+            try:
+                idle[1].send(_LoadCommand(target))
+            except Exception:
+                # do not leak the process we took from the idle pool
+                _stop_process(*idle)
+                raise
+            self._process, self._pipe = idle
+            self._process.name = self._process_name
+        else:
+            self._process, self._pipe = _start_process(self._process_name, target)
+
+        # replace the idle process we have just used
+        _fill_idle_processes()
+
+    def train(self, batch_iterable=None, progress=None, upload_async=False):
+        """
+        Train the instance. With upload_async the training and inference data are uploaded
+        in the background, train returns once the training is done. The process finishes the
+        uploads before its next command and before it exits.
+        """
+        with self._lock:
+            self._pipe.send(_TrainCommand(batch_iterable, progress is not None, upload_async))
+            response = self._pipe.recv()
+            while type(response) == _ProgressResponse:
+                progress(response.progress)
+                response = self._pipe.recv()
+        self._uploading = False
         _check_for_exceptions(response)
         if not type(response) == _TrainResponse:
             raise Exception("Communication Error")
+        self._uploading = response.uploads > 0
 
     def infer(self, batch_iterable):
-        self._pipe.send(_InferCommand(batch_iterable))
-        response = self._pipe.recv()
+        with self._lock:
+            self._pipe.send(_InferCommand(batch_iterable))
+            response = self._pipe.recv()
+            self._uploading = False
         _check_for_exceptions(response)
         if not type(response) == _InferResponse:
             raise Exception("Communication Error")
         return response.batch_iterable
 
     def terminate(self):
-        # send the exit command to the process
-        self._pipe.send(_ExitCommand())
+        # send the exit command to the process once a running command is finished
+        with self._lock:
+            try:
+                self._pipe.send(_ExitCommand())
+            except OSError:
+                # the process has already died
+                pass
+
+        if self._uploading:
+            # let the process finish its uploads, it exits afterwards
+            with _idle_lock:
+                _retiring_processes.append((self._process, self._pipe))
+            return
 
         # wait for the process to finish
         self._process.join(3.0)
 
         # check the processes exit code
-        if self._process.exitcode is not None:
+        if self._process.exitcode is None:
             # kill if necessary
             self._process.terminate()
 
@@ -0,0 +1,83 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import logging
+from concurrent.futures import Future
+from queue import Queue
+from threading import Thread
+from time import sleep
+from typing import Any, Callable, List
+
+
+class CheckpointUploader():
+    """
+    Runs uploads on a background thread. At most max_pending uploads are queued, submit
+    blocks while the queue is full, so only a few checkpoints are held in memory. A failed
+    upload is retried up to retries times, waiting backoff, 2 * backoff, ... seconds.
+    """
+
+    def __init__(self, max_pending: int = 2, retries: int = 3, backoff: float = 1.0):
+        self._retries = retries
+        self._backoff = backoff
+        self._queue: Queue = Queue(max_pending)
+        self._futures: List[Future] = []
+        self._thread = Thread(target=self._run, name="koi_checkpoint_uploader", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable[..., Any], *args) -> Future:
+        """Queue the call func(*args), the future completes once it has succeeded or finally failed"""
+        future = Future()
+        self._futures.append(future)
+        self._queue.put((future, func, args))
+        return future
+
+    @property
+    def pending(self) -> int:
+        return len([f for f in self._futures if not f.done()])
+
+    def flush(self):
+        """Wait for all submitted uploads, the first failed one raises its exception"""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Upload everything that is queued and stop the thread, failures are only logged"""
+        try:
+            self.flush()
+        except Exception:
+            logging.exception("checkpoint upload failed")
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, func, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            for attempt in range(self._retries + 1):
+                try:
+                    future.set_result(func(*args))
+                    break
+                except Exception as e:
+                    if attempt == self._retries:
+                        future.set_exception(e)
+                    else:
+                        logging.warning("checkpoint upload failed, retrying: %s", e)
+                        sleep(self._backoff * 2 ** attempt)
@@ -12,3 +12,13 @@
 # Lesser General Public License for more details. A copy of the
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+
+def snapshot(instance, path, keys=None, samples=None, workers=4):
+    """
+    Write the data, labels and tags of the samples of an instance to a local snapshot, see
+    koi_core.data.local_snapshot. Existing snapshots are refreshed incrementally.
+    """
+    # numpy is only required by the data tools, it is imported when they are used
+    from koi_core.data.local_snapshot import snapshot as _snapshot
+    return _snapshot(instance, path, keys, samples, workers)
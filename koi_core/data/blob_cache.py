@@ -0,0 +1,90 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import hashlib
+import os
+import pickle
+from koi_core.api.common import KoiApiOfflineException
+from koi_core.code_cache import atomic_write, get_cache_dir
+from koi_core.resources.sample import SampleDatum, SampleLabel
+from typing import Optional, Union
+
+
+def _fetch_raw(obj: Union[SampleDatum, SampleLabel]):
+    """The undecorated getter of raw, i.e. fetch(obj, meta) -> (bytes or None if unchanged, meta)"""
+    prop = getattr(type(obj), "raw", None)
+    if isinstance(prop, property):
+        return getattr(prop.fget, "__wrapped__", None)
+    return None
+
+
+class BlobCache:
+    """
+    Keeps the raw bytes of sample data and labels in files on the local disk, so they can be
+    memory mapped. An entry is checked against the server like the cached raw property:
+    while the caching strategy considers it valid it is used as it is, afterwards it is
+    compared to the server (which only downloads changed data).
+    """
+
+    def __init__(self, path: str = None):
+        self._path = path if path is not None else os.path.join(get_cache_dir(), "blobs")
+
+    def _paths(self, obj: Union[SampleDatum, SampleLabel]):
+        id = getattr(obj, "id", None)
+        key = hashlib.sha256(repr(id).encode() if id is not None else obj.raw).hexdigest()
+        path = os.path.join(self._path, key[:2], key)
+        return path + ".bin", path + ".meta"
+
+    def get(self, obj: Union[SampleDatum, SampleLabel]) -> Optional[str]:
+        """The path of the file with the current raw bytes of obj, None if it is not cached"""
+        path, meta_path = self._paths(obj)
+        try:
+            with open(meta_path, "rb") as f:
+                meta = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if not os.path.exists(path):
+            return None
+
+        fetch = _fetch_raw(obj)
+        if fetch is None or obj.cachingStrategy.isValid(type(obj), "raw", meta):
+            return path
+
+        try:
+            raw, new_meta = fetch(obj, meta)
+        except KoiApiOfflineException:
+            # use what we have
+            return path
+        if raw is None:
+            # unchanged
+            atomic_write(meta_path, pickle.dumps(new_meta))
+            return path
+        return self.put(obj, raw, new_meta)
+
+    def put(self, obj: Union[SampleDatum, SampleLabel], raw: bytes, meta=None) -> str:
+        path, meta_path = self._paths(obj)
+        atomic_write(path, raw)
+        atomic_write(meta_path, pickle.dumps(meta))
+        return path
+
+
+_default_blob_cache: BlobCache = None
+
+
+def get_blob_cache() -> BlobCache:
+    global _default_blob_cache
+    if _default_blob_cache is None or _default_blob_cache._path != os.path.join(get_cache_dir(), "blobs"):
+        _default_blob_cache = BlobCache()
+    return _default_blob_cache
@@ -0,0 +1,101 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+from koi_core.data.prefetching_batch_generator import PrefetchingBatchGenerator
+from koi_core.data.simple_accessor import _np_view
+from koi_core.resources.instance import Instance
+from koi_core.resources.sample import Sample
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+Spec = Dict[str, Tuple[np.dtype, Tuple[int, ...]]]
+
+
+def _decode(raw: bytes, dtype: np.dtype) -> np.ndarray:
+    if raw[:6] == b"\x93NUMPY":
+        return _np_view(raw)
+    # plain bytes of the values
+    return np.frombuffer(raw, dtype=dtype)
+
+
+class CollatingBatchGenerator():
+    """
+    Yields the batches as a dict of arrays instead of lists of samples. data and labels map
+    the keys of sample data and labels to (dtype, shape) of one item; the batch contains an
+    array of shape (batch size, *shape) for every key. The raw bytes (.npy or plain values)
+    are decoded straight into these arrays.
+
+    With reuse_buffers the arrays are allocated once and overwritten by the next batch, so a
+    model must copy what it keeps. The samples are taken from batches, by default from a
+    PrefetchingBatchGenerator of the instance.
+    """
+
+    batchSize: int = None
+
+    def __init__(
+        self,
+        instance: Instance,
+        data: Spec = None,
+        labels: Spec = None,
+        batches: Iterable[List[Sample]] = None,
+        reuse_buffers: bool = True,
+    ):
+        data = data or {}
+        labels = labels or {}
+        both = set(data) & set(labels)
+        if both:
+            raise ValueError(f"keys used for data and labels: {both}")
+
+        self._instance = instance
+        self._fields = [(key, np.dtype(t), tuple(s), False) for key, (t, s) in data.items()]
+        self._fields += [(key, np.dtype(t), tuple(s), True) for key, (t, s) in labels.items()]
+        self._batches = batches
+        self._iter = None
+        self._reuse_buffers = reuse_buffers
+        self._buffers: Dict[str, np.ndarray] = {}
+
+    def __iter__(self):
+        if self.batchSize is None:
+            raise Exception("Batch Size must be set before iterating")
+        if self._iter is None:
+            if self._batches is None:
+                self._batches = PrefetchingBatchGenerator(self._instance)
+                self._batches.batchSize = self.batchSize
+            self._iter = iter(self._batches)
+        return self
+
+    def _buffer(self, key, dtype, shape, size) -> np.ndarray:
+        buffer = self._buffers.get(key)
+        if buffer is None or len(buffer) < size or not self._reuse_buffers:
+            buffer = np.empty((max(size, self.batchSize),) + shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer[:size]
+
+    def __next__(self) -> Dict[str, np.ndarray]:
+        if self._iter is None:
+            iter(self)
+        samples = next(self._iter)
+
+        batch = {}
+        for key, dtype, shape, is_label in self._fields:
+            out = self._buffer(key, dtype, shape, len(samples))
+            for i, sample in enumerate(samples):
+                accessor = sample.labels[key] if is_label else sample.data[key]
+                value = _decode(accessor.raw, dtype)
+                if value.size != out[i].size:
+                    raise ValueError(f"{key} has {value.size} values, {out[i].size} are expected")
+                out[i] = value.reshape(shape)
+            batch[key] = out
+        return batch
@@ -0,0 +1,210 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import itertools
+import multiprocessing
+import queue
+from multiprocessing import resource_tracker, shared_memory
+from koi_core.data.simple_accessor import get_np_mmap
+from koi_core.resources.handle import InstanceHandle
+from koi_core.resources.instance import Instance
+from koi_core.resources.sample import Sample
+from typing import Callable, Dict, Iterable, List
+import numpy as np
+
+Decoded = Dict[str, np.ndarray]
+
+
+def decode_np(sample: Sample) -> Decoded:
+    """The .npy data and labels of the sample, memory mapped from the shared blob cache"""
+    result = {}
+    for datum in itertools.chain(sample._get_data(), sample._get_labels()):
+        result[datum.key] = get_np_mmap(datum)
+    return result
+
+
+class _Error():
+    def __init__(self, index, exception):
+        self.index = index
+        self.exception = exception
+
+
+def _to_shared_memory(decoded: Decoded):
+    arrays = {key: np.require(value, requirements="C") for key, value in decoded.items()}
+    size = sum(a.nbytes for a in arrays.values())
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    layout = []
+    offset = 0
+    for key, a in arrays.items():
+        np.ndarray(a.shape, a.dtype, buffer=shm.buf, offset=offset)[...] = a
+        layout.append((key, a.dtype.str, a.shape, offset))
+        offset += a.nbytes
+    name = shm.name
+    shm.close()
+    # the receiving process unlinks the block, it must not be removed when this worker exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return name, layout
+
+
+def _from_shared_memory(name, layout) -> Decoded:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return {
+            key: np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset).copy()
+            for key, dtype, shape, offset in layout
+        }
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _worker_run(handle: InstanceHandle, decode: Callable[[Sample], Decoded], tasks, results):
+    # every worker has its own pool and session
+    pool = handle.open().pool
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, sample_id = task
+        try:
+            results.put((index,) + _to_shared_memory(decode(pool.sample(sample_id))))
+        except Exception as e:
+            results.put(_Error(index, e))
+
+
+class DataLoader():
+    """
+    Fetches and decodes the samples of an instance in worker processes. Every worker opens
+    the instance with its own pool and session; decode(sample) returns a dict of arrays (by
+    default the .npy data and labels, see decode_np, which share the on-disk BlobCache).
+    The arrays are handed back through shared memory. The batches are lists of these dicts,
+    in the order of the samples or, with ordered=False, in the order they are finished.
+    """
+
+    batchSize: int = None
+
+    def __init__(
+        self,
+        instance: Instance,
+        workers: int = 4,
+        decode: Callable[[Sample], Decoded] = decode_np,
+        ordered: bool = True,
+        prefetch: int = 2,
+        samples: Iterable[Sample] = None,
+        start_method: str = None,
+    ):
+        self._handle = InstanceHandle.from_instance(instance)
+        if self._handle is None:
+            raise ValueError("the instance can not be opened by another process")
+        self._samples = samples if samples is not None else instance.samples_unconsumed
+        self._workers = workers
+        self._decode = decode
+        self._ordered = ordered
+        self._prefetch = prefetch
+        self._context = multiprocessing.get_context(start_method)
+        self._processes: List[multiprocessing.Process] = []
+        self._generator = None
+
+    def __iter__(self):
+        if self.batchSize is None:
+            raise Exception("Batch Size must be set before iterating")
+        if self._generator is None:
+            self._generator = self._generate()
+        return self
+
+    def __next__(self) -> List[Decoded]:
+        if self._generator is None:
+            iter(self)
+        return next(self._generator)
+
+    def _start(self):
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        for i in range(self._workers):
+            process = self._context.Process(
+                target=_worker_run,
+                args=(self._handle, self._decode, self._tasks, self._results),
+                name=f"koi_data_loader_{i}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def _items(self):
+        samples = enumerate(self._samples)
+        in_flight = 0
+        pending = {}
+        next_index = 0
+        exhausted = False
+        limit = max(self._workers, 1) * self._prefetch
+
+        while True:
+            while not exhausted and in_flight < limit:
+                try:
+                    index, sample = next(samples)
+                except StopIteration:
+                    exhausted = True
+                    break
+                self._tasks.put((index, sample.id))
+                in_flight += 1
+
+            if in_flight == 0:
+                return
+
+            result = self._results.get()
+            in_flight -= 1
+            if isinstance(result, _Error):
+                raise result.exception
+            index, name, layout = result
+            decoded = _from_shared_memory(name, layout)
+
+            if not self._ordered:
+                yield decoded
+                continue
+            pending[index] = decoded
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+
+    def _generate(self):
+        self._start()
+        try:
+            items = self._items()
+            while True:
+                batch = list(itertools.islice(items, self.batchSize))
+                if len(batch) == 0:
+                    return
+                yield batch
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the worker processes"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(3.0)
+            if process.exitcode is None:
+                process.terminate()
+        if self._processes:
+            # free the results nobody consumed
+            while True:
+                try:
+                    result = self._results.get(timeout=0.1)
+                except queue.Empty:
+                    break
+                if not isinstance(result, _Error):
+                    _from_shared_memory(*result[1:])
+        self._processes = []
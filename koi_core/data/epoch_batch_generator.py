@@ -0,0 +1,141 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import os
+import pickle
+import random
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from koi_core.code_cache import get_cache_dir
+from koi_core.data.prefetching_batch_generator import fetch_sample
+from koi_core.resources.instance import Instance
+from koi_core.resources.sample import LocalSample, Sample
+from typing import List
+
+
+def _record(sample: Sample):
+    return (
+        sample.id,
+        [(datum.key, datum.raw) for datum in sample._get_data()],
+        [(label.key, label.raw) for label in sample._get_labels()],
+        list(getattr(sample, "_tags", [])),
+    )
+
+
+def _from_record(record) -> LocalSample:
+    id, data, labels, tags = record
+    sample = LocalSample(None, id)
+    for key, raw in data:
+        sample._new_datum(key, raw)
+    for key, raw in labels:
+        sample._new_label(key, raw)
+    sample._tags = tags
+    return sample
+
+
+class EpochBatchGenerator():
+    """
+    Yields the samples of the instance for several epochs, shuffled with the given seed.
+    During the first epoch the samples are fetched from the server (on workers threads) and
+    their data and labels are written to a file in cache_dir (default: a directory below
+    KOI_CORE_CACHE_DIR). The later epochs read the samples from this file, they are local
+    samples with the same data and labels. The file is removed after the last epoch or by
+    close().
+    """
+
+    batchSize: int = None
+
+    def __init__(
+        self,
+        instance: Instance,
+        epochs: int = 1,
+        seed: int = None,
+        shuffle: bool = True,
+        cache_dir: str = None,
+        workers: int = 4,
+    ):
+        self._instance = instance
+        self._epochs = epochs
+        self._seed = seed if seed is not None else random.randrange(2**32)
+        self._shuffle = shuffle
+        self._cache_dir = cache_dir
+        self._workers = workers
+        self._generator = None
+        self._temp_dir: str = None
+        self.epoch = 0
+
+    def __iter__(self):
+        if self.batchSize is None:
+            raise Exception("Batch Size must be set before iterating")
+        if self._generator is None:
+            self._generator = self._generate()
+        return self
+
+    def __next__(self) -> List[Sample]:
+        if self._generator is None:
+            iter(self)
+        return next(self._generator)
+
+    def _order(self, count: int, epoch: int) -> List[int]:
+        order = list(range(count))
+        if self._shuffle:
+            random.Random(self._seed + epoch).shuffle(order)
+        return order
+
+    def _batches(self, order: List[int]):
+        for i in range(0, len(order), self.batchSize):
+            yield order[i:i + self.batchSize]
+
+    def _generate(self):
+        samples = list(self._instance.samples_unconsumed)
+        if len(samples) == 0 or self._epochs < 1:
+            return
+
+        base = self._cache_dir if self._cache_dir is not None else os.path.join(get_cache_dir(), "epochs")
+        os.makedirs(base, exist_ok=True)
+        self._temp_dir = tempfile.mkdtemp(dir=base)
+        try:
+            # the first epoch fetches the samples and writes them to the file
+            offsets = [0] * len(samples)
+            self.epoch = 1
+            with open(os.path.join(self._temp_dir, "samples"), "wb") as f, \
+                    ThreadPoolExecutor(self._workers, thread_name_prefix="koi_fetch") as pool:
+                for indices in self._batches(self._order(len(samples), 0)):
+                    batch = list(pool.map(fetch_sample, [samples[i] for i in indices]))
+                    for i, sample in zip(indices, batch):
+                        offsets[i] = f.tell()
+                        pickle.dump(_record(sample), f, pickle.HIGHEST_PROTOCOL)
+                    yield batch
+            del samples
+
+            # the later epochs read them from the file
+            with open(os.path.join(self._temp_dir, "samples"), "rb") as f:
+                for epoch in range(1, self._epochs):
+                    self.epoch = epoch + 1
+                    for indices in self._batches(self._order(len(offsets), epoch)):
+                        batch = []
+                        for i in indices:
+                            f.seek(offsets[i])
+                            batch.append(_from_record(pickle.load(f)))
+                        yield batch
+        finally:
+            self.close()
+
+    def close(self):
+        """Remove the cached samples"""
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
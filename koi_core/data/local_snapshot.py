@@ -0,0 +1,402 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import io
+import itertools
+import os
+import pickle
+import random
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from koi_core.data.blob_cache import _fetch_raw
+from koi_core.data.simple_accessor import _np_view
+from koi_core.caching import invalidateCache
+from koi_core.resources.instance import Instance
+from koi_core.resources.sample import LocalSample, Sample
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+_INDEX = "index.pkl"
+
+
+def _npy_header(raw: bytes):
+    """(dtype, shape) of .npy bytes, None for other payloads and pickled objects"""
+    if raw[:6] != b"\x93NUMPY":
+        return None
+    try:
+        f = io.BytesIO(raw)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+    except ValueError:
+        return None
+    if dtype.hasobject:
+        return None
+    return dtype.str, tuple(shape)
+
+
+def _npy(array: np.ndarray) -> bytes:
+    f = io.BytesIO()
+    np.save(f, array)
+    return f.getvalue()
+
+
+class Blobs():
+    """The variable size payloads of one key, blobs[i] is the raw bytes of sample i or None"""
+
+    def __init__(self, offsets: np.ndarray, path: str):
+        self._offsets = offsets
+        self._path = path
+        self._data = None
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Optional[bytes]:
+        offset, length = self._offsets[index]
+        if length < 0:
+            return None
+        if self._data is None:
+            # a file of size 0 can not be mapped
+            if os.path.getsize(self._path) == 0:
+                return b""
+            self._data = np.memmap(self._path, dtype=np.uint8, mode="r")
+        return self._data[offset:offset + length].tobytes()
+
+
+class Snapshot():
+    """
+    Reads a snapshot written by snapshot(). snapshot[key] is a read only memory mapped
+    array of shape (samples, *shape) for keys whose payloads are .npy arrays of the same
+    dtype and shape in every sample, and Blobs for all other keys. After a refresh fetched
+    and reused count the payloads that were downloaded or taken from the old snapshot.
+    """
+
+    fetched: int = 0
+    reused: int = 0
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, _INDEX), "rb") as f:
+            index = pickle.load(f)
+        if index.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version: {index.get('version')}")
+        self.path = path
+        self.ids = index["ids"]
+        self.tags = index["tags"]
+        self._metas = index["metas"]
+        self._fields = index["fields"]
+        self._columns: Dict[str, Union[np.ndarray, Blobs]] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys(self) -> List[str]:
+        return list(self._fields)
+
+    def is_label(self, key: str) -> bool:
+        return self._fields[key][0]
+
+    def is_fixed(self, key: str) -> bool:
+        return self._fields[key][1]
+
+    def __getitem__(self, key: str) -> Union[np.ndarray, Blobs]:
+        column = self._columns.get(key)
+        if column is None:
+            _, fixed, name = self._fields[key]
+            if fixed:
+                column = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+            else:
+                offsets = np.load(os.path.join(self.path, name + ".offsets.npy"))
+                column = Blobs(offsets, os.path.join(self.path, name + ".bin"))
+            self._columns[key] = column
+        return column
+
+    def raw(self, key: str, index: int) -> Optional[bytes]:
+        """The raw bytes of the key of a sample, None if the sample has no such key"""
+        if self.is_fixed(key):
+            return _npy(self[key][index])
+        return self[key][index]
+
+    def sample(self, index: int) -> LocalSample:
+        """A local sample with the data, labels and tags of the sample"""
+        sample = LocalSample(None, self.ids[index])
+        for key, (is_label, _, _) in self._fields.items():
+            raw = self.raw(key, index)
+            if raw is None:
+                continue
+            if is_label:
+                sample._new_label(key, raw)
+            else:
+                sample._new_datum(key, raw)
+        sample._tags = list(self.tags[index])
+        return sample
+
+    def close(self):
+        """Drop the memory maps"""
+        self._columns = {}
+
+
+class _Field():
+    def __init__(self, is_label: bool, name: str):
+        self.is_label = is_label
+        self.name = name
+        self.entries = []
+        self.header = None
+        self.fixed = True
+
+
+class _Writer():
+    def __init__(self, path: str, previous: Optional[Snapshot], keys):
+        self.path = path
+        self.previous = previous
+        self.keys = keys
+        self.ids = []
+        self.tags = []
+        self.metas = []
+        self.fields: Dict[str, _Field] = {}
+        self._files = {}
+        self._previous_index = {}
+        if previous is not None:
+            self._previous_index = {id.sample_uuid: i for i, id in enumerate(previous.ids)}
+        self.fetched = 0
+        self.reused = 0
+
+    def _raw(self, obj, key: str, old: Optional[int]):
+        if old is not None and key in self.previous._fields:
+            meta = self.previous._metas[old].get(key)
+            fetch = _fetch_raw(obj)
+            if meta is not None and fetch is not None:
+                if obj.cachingStrategy.isValid(type(obj), "raw", meta):
+                    raw, new_meta = None, meta
+                else:
+                    raw, new_meta = fetch(obj, meta)
+                if raw is None:
+                    # unchanged, the etag matches
+                    self.reused += 1
+                    return self.previous.raw(key, old), new_meta
+                self.fetched += 1
+                return raw, new_meta
+
+        self.fetched += 1
+        raw = obj.raw
+        cached = getattr(obj, "_cache", {}).get("raw", {}).get(0)
+        # the data is on the disk now
+        invalidateCache(obj, "raw")
+        return raw, cached[1] if cached is not None else None
+
+    def fetch(self, sample: Sample):
+        old = self._previous_index.get(sample.id.sample_uuid)
+        entries = []
+        for is_label, items in ((False, sample._get_data()), (True, sample._get_labels())):
+            for obj in items:
+                if self.keys is not None and obj.key not in self.keys:
+                    continue
+                raw, meta = self._raw(obj, obj.key, old)
+                entries.append((obj.key, is_label, raw, meta))
+        return sample.id, list(getattr(sample, "_tags", [])), entries
+
+    def add(self, record):
+        id, tags, entries = record
+        index = len(self.ids)
+        metas = {}
+        for key, is_label, raw, meta in entries:
+            field = self.fields.get(key)
+            if field is None:
+                field = _Field(is_label, f"field_{len(self.fields)}")
+                field.header = _npy_header(raw)
+                self.fields[key] = field
+                self._files[key] = open(os.path.join(self.path, field.name + ".bin"), "wb")
+            elif field.is_label != is_label:
+                raise ValueError(f"{key} is used for data and labels")
+            if field.fixed and _npy_header(raw) != field.header:
+                field.fixed = False
+
+            f = self._files[key]
+            field.entries.append((index, f.tell(), len(raw)))
+            f.write(raw)
+            metas[key] = meta
+
+        self.ids.append(id)
+        self.tags.append(tags)
+        self.metas.append(metas)
+
+    def finish(self):
+        count = len(self.ids)
+        for key, field in self.fields.items():
+            self._files.pop(key).close()
+            blob_path = os.path.join(self.path, field.name + ".bin")
+            if field.header is not None and field.fixed and len(field.entries) == count:
+                # every sample has an array of the same shape, store the values
+                dtype, shape = field.header
+                array = np.lib.format.open_memmap(
+                    os.path.join(self.path, field.name + ".npy"), mode="w+",
+                    dtype=np.dtype(dtype), shape=(count,) + shape)
+                with open(blob_path, "rb") as f:
+                    for index, offset, length in field.entries:
+                        f.seek(offset)
+                        array[index] = _np_view(f.read(length))
+                array.flush()
+                del array
+                os.remove(blob_path)
+            else:
+                field.fixed = False
+                offsets = np.full((count, 2), -1, dtype=np.int64)
+                for index, offset, length in field.entries:
+                    offsets[index] = (offset, length)
+                np.save(os.path.join(self.path, field.name + ".offsets.npy"), offsets)
+
+        index = {
+            "version": SNAPSHOT_VERSION,
+            "ids": self.ids,
+            "tags": self.tags,
+            "metas": self.metas,
+            "fields": {key: (f.is_label, f.fixed, f.name) for key, f in self.fields.items()},
+        }
+        with open(os.path.join(self.path, _INDEX), "wb") as f:
+            pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def _open_previous(path: str) -> Optional[Snapshot]:
+    try:
+        return Snapshot(path)
+    except (OSError, EOFError, ValueError, KeyError, pickle.UnpicklingError):
+        return None
+
+
+def snapshot(
+    instance: Instance,
+    path: str,
+    keys: Iterable[str] = None,
+    samples: Iterable[Sample] = None,
+    workers: int = 4,
+) -> Snapshot:
+    """
+    Write the data, labels and tags of the samples (default: all samples of the instance)
+    to the directory path. keys restricts the snapshot to these data and label keys.
+
+    If path already holds a snapshot it is refreshed: payloads whose cached meta is still
+    valid or whose etag did not change on the server are copied from the old snapshot,
+    only new and changed payloads are downloaded. The new snapshot replaces the old one
+    when it is complete.
+    """
+    path = os.path.abspath(path)
+    previous = _open_previous(path)
+    if previous is not None:
+        # open the columns before the workers read them: reading the .npy headers parses
+        # them with ast, which is not safe to run in several threads at once
+        for key in previous.keys():
+            previous[key]
+    if samples is None:
+        samples = instance.get_samples()
+    samples = iter(samples)
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    temp = tempfile.mkdtemp(dir=parent, prefix=".snapshot-")
+    writer = _Writer(temp, previous, set(keys) if keys is not None else None)
+    try:
+        with ThreadPoolExecutor(workers, thread_name_prefix="koi_snapshot") as pool:
+            while True:
+                chunk = list(itertools.islice(samples, max(workers, 1) * 4))
+                if len(chunk) == 0:
+                    break
+                for record in pool.map(writer.fetch, chunk):
+                    writer.add(record)
+        writer.finish()
+    except BaseException:
+        writer.close()
+        shutil.rmtree(temp, ignore_errors=True)
+        raise
+
+    if previous is not None:
+        previous.close()
+    if os.path.exists(path):
+        old = tempfile.mkdtemp(dir=parent, prefix=".snapshot-old-")
+        os.rename(path, os.path.join(old, "snapshot"))
+        os.rename(temp, path)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.rename(temp, path)
+
+    result = Snapshot(path)
+    result.fetched = writer.fetched
+    result.reused = writer.reused
+    return result
+
+
+class SnapshotBatchGenerator():
+    """
+    Yields the batches of a snapshot as a dict with the values of every key (or of the
+    given keys): a slice of the memory mapped array for fixed shape keys, a list of raw
+    bytes (None for missing payloads) otherwise. The indices of the samples in the current
+    batch are kept in .indices, the ids and tags are in the snapshot.
+    """
+
+    batchSize: int = None
+
+    def __init__(
+        self,
+        snapshot: Union[Snapshot, str],
+        keys: Iterable[str] = None,
+        shuffle: bool = False,
+        seed: int = None,
+    ):
+        self.snapshot = snapshot if isinstance(snapshot, Snapshot) else Snapshot(snapshot)
+        self._keys = list(keys) if keys is not None else self.snapshot.keys()
+        self._shuffle = shuffle
+        self._seed = seed
+        self._generator = None
+        self.indices: List[int] = []
+
+    def __iter__(self):
+        if self.batchSize is None:
+            raise Exception("Batch Size must be set before iterating")
+        if self._generator is None:
+            self._generator = self._generate()
+        return self
+
+    def __next__(self) -> Dict[str, Union[np.ndarray, List[Optional[bytes]]]]:
+        if self._generator is None:
+            iter(self)
+        return next(self._generator)
+
+    def _generate(self):
+        order = list(range(len(self.snapshot)))
+        if self._shuffle:
+            random.Random(self._seed).shuffle(order)
+
+        for start in range(0, len(order), self.batchSize):
+            self.indices = order[start:start + self.batchSize]
+            batch = {}
+            for key in self._keys:
+                column = self.snapshot[key]
+                if isinstance(column, np.ndarray):
+                    if self._shuffle:
+                        batch[key] = column[self.indices]
+                    else:
+                        # a view of the mapped file
+                        batch[key] = column[start:start + len(self.indices)]
+                else:
+                    batch[key] = [column[i] for i in self.indices]
+            yield batch
@@ -0,0 +1,123 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from koi_core.resources.instance import Instance
+from koi_core.resources.sample import Sample
+from typing import Any, Callable, List
+import itertools
+
+
+def fetch_sample(sample: Sample) -> Sample:
+    """Load the raw bytes of all data and labels of the sample into its caches"""
+    for datum in itertools.chain(sample._get_data(), sample._get_labels()):
+        datum.raw
+    return sample
+
+
+class _Error():
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_END = object()
+
+
+class PrefetchingBatchGenerator():
+    """
+    A drop-in replacement for SimpleBatchGenerator that prepares the next batches in the
+    background while the model trains on the current one. Up to prefetch batches are held
+    in memory. The samples of a batch are fetched by worker threads: fetch(sample) loads
+    the raw bytes of the data and labels, it can be replaced to decode them as well (e.g.
+    with get_np). The batches contain what fetch returns.
+    """
+
+    batchSize: int = None
+
+    def __init__(
+        self,
+        instance: Instance,
+        prefetch: int = 2,
+        workers: int = 4,
+        fetch: Callable[[Sample], Any] = fetch_sample,
+    ):
+        self._samples = instance.samples_unconsumed
+        self._prefetch = prefetch
+        self._workers = workers
+        self._fetch = fetch
+        self._queue: Queue = None
+        self._stop = Event()
+        self._thread: Thread = None
+
+    def __iter__(self):
+        if self.batchSize is None:
+            raise Exception("Batch Size must be set before iterating")
+        if self._thread is None:
+            self._queue = Queue(self._prefetch)
+            self._thread = Thread(target=self._run, name="koi_prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def __next__(self):
+        if self._thread is None:
+            iter(self)
+        item = self._queue.get()
+        if item is _END:
+            # let further calls end as well
+            self._queue.put(_END)
+            raise StopIteration
+        if isinstance(item, _Error):
+            self.close()
+            raise item.exception
+        return item
+
+    def close(self):
+        """Stop prefetching, e.g. when the training ends before all batches are used"""
+        self._stop.set()
+        if self._queue is not None:
+            # unblock the producer
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except Empty:
+                pass
+            self._queue.put(_END)
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _run(self):
+        with ThreadPoolExecutor(self._workers, thread_name_prefix="koi_fetch") as pool:
+            try:
+                while not self._stop.is_set():
+                    samples: List[Sample] = list(itertools.islice(self._samples, self.batchSize))
+                    if len(samples) == 0:
+                        break
+                    batch = list(pool.map(self._fetch, samples))
+                    if not self._put(batch):
+                        return
+            except Exception as e:
+                self._put(_Error(e))
+                return
+        self._put(_END)
+
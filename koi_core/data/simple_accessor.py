@@ -13,8 +13,9 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from io import BytesIO
-from koi_core.caching import cache, setCache
+import io
+from koi_core.caching import cache, invalidateCache
+from koi_core.data.blob_cache import BlobCache, get_blob_cache
 from koi_core.resources.sample import SampleDatum, SampleLabel
 from typing import Union
 import numpy as np
@@ -22,15 +23,61 @@ import numpy as np
 
 @cache
 def get_np(self: Union[SampleDatum, SampleLabel], meta) -> np.ndarray:
-    f = BytesIO(self.raw)
+    f = io.BytesIO(self.raw)
     return np.load(f), meta
 
 
+def _np_view(raw: bytes) -> np.ndarray:
+    f = io.BytesIO(raw)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if dtype.hasobject:
+        # pickled objects can not be viewed
+        return np.load(f)
+
+    count = 1
+    for n in shape:
+        count *= n
+    array = np.frombuffer(raw, dtype=dtype, count=count, offset=f.tell())
+    if fortran_order:
+        return array.reshape(shape[::-1]).transpose()
+    return array.reshape(shape)
+
+
+@cache
+def get_np_view(self: Union[SampleDatum, SampleLabel], meta) -> np.ndarray:
+    """A read only array that shares the memory of the cached raw bytes (no copy is made)"""
+    return _np_view(self.raw), meta
+
+
+def get_np_mmap(self: Union[SampleDatum, SampleLabel], blob_cache: BlobCache = None) -> np.ndarray:
+    """
+    A read only array that is memory mapped from a file of the blob cache. The raw bytes are
+    written to the cache once and dropped from memory, so the array costs no resident memory
+    but the pages in use.
+    """
+    if blob_cache is None:
+        blob_cache = get_blob_cache()
+    path = blob_cache.get(self)
+    if path is None:
+        raw = self.raw
+        cached = getattr(self, "_cache", {}).get("raw", {}).get(0)
+        path = blob_cache.put(self, raw, cached[1] if cached is not None else None)
+        # the data is on the disk now
+        invalidateCache(self, "raw")
+    return np.load(path, mmap_mode="r")
+
+
 def set_np(self: Union[SampleDatum, SampleLabel], value: np.ndarray) -> None:
-    f = BytesIO()
+    f = io.BytesIO()
     np.save(f, value)
     self.raw = f.getvalue()
-    setCache(self, 'np', None)
+    # the cached raw bytes and arrays are outdated now
+    for key in ['raw', 'get_np', 'get_np_view']:
+        invalidateCache(self, key)
 
 
 @cache
@@ -40,4 +87,5 @@ def get_txt(self: Union[SampleDatum, SampleLabel], meta) -> str:
 
 def set_txt(self: Union[SampleDatum, SampleLabel], value: str) -> None:
     self.raw = str.encode(value)
-    setCache(self, 'txt', None)
+    for key in ['raw', 'get_txt']:
+        invalidateCache(self, key)
@@ -0,0 +1,336 @@
+#!/usr/bin/python
+
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import base64
+import fnmatch
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import configargparse
+from collections.abc import Mapping
+import koi_core as koi
+from time import sleep
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from koi_core.resources.sample_ingest import IngestFailure, IngestStats
+
+# (key, pattern) pairs of the key mapping
+KeyMapping = List[Tuple[str, str]]
+
+
+def _parse_mapping(values: List[str]) -> KeyMapping:
+    mapping = []
+    for value in values:
+        key, sep, pattern = value.partition("=")
+        if not sep or not key:
+            raise ValueError(f"a mapping has the form KEY=PATTERN: {value}")
+        mapping.append((key, pattern))
+    return mapping
+
+
+def _select(sources: Dict[str, object], mapping: KeyMapping) -> Dict[str, object]:
+    """The sources whose names match the pattern of a key, by key"""
+    selected = {}
+    for key, pattern in mapping:
+        matches = sorted(name for name in sources if fnmatch.fnmatchcase(name, pattern))
+        if len(matches) > 1:
+            raise ValueError(f"{pattern} matches several files: {matches}")
+        if matches:
+            selected[key] = matches[0]
+    return selected
+
+
+def _item(id: str, sources: Dict[str, object], data: KeyMapping, labels: KeyMapping, tags: List[str]) -> "_Item":
+    """Map the named sources of a sample to keys. Without a data mapping all sources but the labels are data."""
+    label_names = _select(sources, labels)
+    if data:
+        data_names = _select(sources, data)
+    else:
+        used = set(label_names.values())
+        data_names = {os.path.splitext(name)[0]: name for name in sources if name not in used}
+    return _Item(
+        id,
+        {key: sources[name] for key, name in data_names.items()},
+        {key: sources[name] for key, name in label_names.items()},
+        tags,
+    )
+
+
+class _Item(Mapping):
+    """
+    One sample of the input. It is passed to Instance.ingest as a dict of data, labels and
+    tags; the payloads are read when it is uploaded, i.e. on the upload threads.
+    """
+
+    def __init__(self, id: str, data: Dict[str, object], labels: Dict[str, object], tags: List[str]):
+        self.id = id
+        self.data = data
+        self.labels = labels
+        self.tags = tags
+
+    def __getitem__(self, name: str):
+        if name == "data":
+            return {key: _read(source) for key, source in self.data.items()}
+        if name == "labels":
+            return {key: _read(source) for key, source in self.labels.items()}
+        if name == "tags":
+            return self.tags
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(["data", "labels", "tags"])
+
+    def __len__(self):
+        return 3
+
+
+def _read(source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    if callable(source):
+        return source()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _npz_arrays(path: str) -> Dict[str, object]:
+    # numpy is only needed for .npz input
+    import numpy as np
+
+    def load(name):
+        def read():
+            with np.load(path) as npz:
+                f = io.BytesIO()
+                np.save(f, npz[name])
+                return f.getvalue()
+        return read
+
+    with np.load(path) as npz:
+        return {name: load(name) for name in npz.files}
+
+
+def _file_items(paths: List[str], data: KeyMapping, labels: KeyMapping, tags: List[str], per_file: bool):
+    """The samples of directory trees: the files of a directory or every single file are a sample, .npz files are one each"""
+    for root_path in paths:
+        if os.path.isfile(root_path):
+            walk = [(os.path.dirname(root_path), [], [os.path.basename(root_path)])]
+            base = os.path.dirname(root_path)
+        else:
+            walk = os.walk(root_path)
+            base = root_path
+        for directory, dirs, files in walk:
+            dirs.sort()
+            group = {}
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                id = os.path.relpath(path, base)
+                if name.endswith(".npz"):
+                    yield _item(id, _npz_arrays(path), data, labels, tags)
+                elif per_file:
+                    yield _item(id, {name: path}, data, labels, tags)
+                else:
+                    group[name] = path
+            if group:
+                yield _item(os.path.relpath(directory, base), group, data, labels, tags)
+
+
+def _json_value(value) -> object:
+    if isinstance(value, str):
+        # a path
+        return value
+    if isinstance(value, dict) and "base64" in value:
+        return base64.b64decode(value["base64"])
+    raise ValueError(f"a value is a path or {{\"base64\": ...}}: {value}")
+
+
+def _json_items(lines, data: KeyMapping, labels: KeyMapping, tags: List[str]):
+    """
+    The samples of newline delimited json, every line is one object
+    {"id": ..., "data": {name: value}, "labels": {name: value}, "tags": [...]}. A value is
+    the path of a file or {"base64": "..."}. Without an id the line is identified by its hash.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        obj = json.loads(line)
+        id = obj.get("id") or hashlib.sha256(line.encode()).hexdigest()
+        data_sources = {name: _json_value(v) for name, v in obj.get("data", {}).items()}
+        label_sources = {name: _json_value(v) for name, v in obj.get("labels", {}).items()}
+        if data:
+            data_sources = {key: data_sources[name] for key, name in _select(data_sources, data).items()}
+        if labels:
+            label_sources = {key: label_sources[name] for key, name in _select(label_sources, labels).items()}
+        yield _Item(str(id), data_sources, label_sources, tags + list(obj.get("tags", [])))
+
+
+class Journal():
+    """A local file with the ids of the finished items, so an interrupted ingestion can be resumed"""
+
+    def __init__(self, path: Optional[str]):
+        self._done: Set[str] = set()
+        self._file = None
+        if path is None:
+            return
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    id, _, _ = line.rstrip("\n").rpartition("\t")
+                    self._done.add(id)
+        self._file = open(path, "a")
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._done
+
+    def add(self, id: str, sample_id):
+        self._done.add(id)
+        if self._file is not None:
+            self._file.write(f"{id}\t{sample_id.sample_uuid.hex}\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _find_instance(pool, model_name: str, instance_name: str):
+    for model in pool.get_all_models():
+        if model.name != model_name:
+            continue
+        for instance in model.instances:
+            if instance.name == instance_name:
+                return instance
+    raise LookupError(f"there is no instance {model_name}/{instance_name}")
+
+
+def _ingest(instance, items: Iterator[_Item], journal: Journal, opt, stats: IngestStats) -> List[IngestFailure]:
+    pending: Dict[int, _Item] = {}
+    next_log = [opt.log_every]
+
+    def inputs():
+        for index, item in enumerate(items):
+            pending[index] = item
+            yield item
+
+    def done(index, value):
+        item = pending.pop(index)
+        if isinstance(value, IngestFailure):
+            logging.warning("%s failed: %s", item.id, value.exception)
+        else:
+            journal.add(item.id, value)
+        if stats.samples >= next_log[0]:
+            next_log[0] += opt.log_every
+            logging.info("%s", stats)
+
+    return instance.ingest(inputs(), opt.concurrency, opt.finalize, stats, done).failures
+
+
+def main(args=None):
+    p = configargparse.ArgParser(description="upload samples to an instance of the koi-system")
+    p.add("-c", "--config", is_config_file=True)
+
+    # logging options
+    p.add("-l", "--loglevel", help="logging level", type=str, default="WARNING")
+    p.add("--logfile", type=str)
+    p.add("--log-every", type=int, default=1000, help="log the throughput every n samples")
+
+    # connection options
+    p.add("-s", "--server", env_var="KOI_SERVER_URI", required=True, help="the server uri to connect to")
+    p.add("-u", "--user", env_var="KOI_SERVER_USER", required=True, help="the user name for authentication")
+    p.add("-p", "--password", env_var="KOI_SERVER_PASSWORD", required=True, help="the password for authentication")
+
+    # target
+    p.add("-m", "--model", required=True, help="the name of the model")
+    p.add("-i", "--instance", required=True, help="the name of the instance")
+
+    # input
+    p.add(
+        "inputs",
+        nargs="*",
+        default=["-"],
+        help="directories or files to upload, - reads newline delimited json from stdin",
+    )
+    p.add(
+        "--data",
+        action="append",
+        default=[],
+        help="KEY=PATTERN, the file (or array of an .npz file) matching PATTERN is the datum KEY (can be repeated)",
+    )
+    p.add("--label", action="append", default=[], help="KEY=PATTERN, like --data for labels (can be repeated)")
+    p.add("--tag", action="append", default=[], help="tag added to every sample (can be repeated)")
+    p.add(
+        "--per-file",
+        action="store_true",
+        help="every file is a sample of its own instead of every directory",
+    )
+
+    # upload behaviour
+    p.add("-j", "--concurrency", type=int, default=8, help="number of samples uploaded at the same time")
+    p.add("--finalize", action="store_true", help="finalize the uploaded samples")
+    p.add("--journal", type=str, help="file with the finished items, an interrupted run continues where it stopped")
+    p.add("-r", "--retries", type=int, default=3, help="number of retries of failed samples")
+    p.add("-t", "--sleep-retry", type=float, default=10, help="seconds to wait before a retry")
+
+    opt = p.parse_args(args)
+
+    logging.basicConfig(
+        filename=opt.logfile,
+        level=opt.loglevel.upper(),
+        format="%(asctime)s %(levelname)s:%(message)s",
+        datefmt="%d.%m.%Y %H:%M:%S",
+    )
+
+    data = _parse_mapping(opt.data)
+    labels = _parse_mapping(opt.label)
+
+    koi.init()
+    journal = Journal(opt.journal)
+    stats = IngestStats()
+    try:
+        logging.info("connecting to %s", opt.server)
+        pool = koi.create_api_object_pool(opt.server, opt.user, opt.password)
+        instance = _find_instance(pool, opt.model, opt.instance)
+
+        def items():
+            for input in opt.inputs:
+                if input == "-":
+                    yield from _json_items(sys.stdin, data, labels, opt.tag)
+                else:
+                    yield from _file_items([input], data, labels, opt.tag, opt.per_file)
+
+        todo = (item for item in items() if item.id not in journal)
+        failures = _ingest(instance, todo, journal, opt, stats)
+        for _ in range(opt.retries):
+            if not failures:
+                break
+            logging.info("retrying %d failed samples in %s seconds", len(failures), opt.sleep_retry)
+            sleep(opt.sleep_retry)
+            failures = _ingest(instance, (f.sample for f in failures), journal, opt, stats)
+    finally:
+        journal.close()
+        koi.deinit()
+
+    logging.info("%s", stats)
+    for failure in failures:
+        logging.error("%s could not be uploaded: %s", failure.sample.id, failure.exception)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
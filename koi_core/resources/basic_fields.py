@@ -0,0 +1,57 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+
+from time import monotonic
+from typing import Any
+
+
+class BasicField:
+    """
+    A basic field of a proxy, e.g. instance.name. While the cached basic fields are known
+    to be valid (see koi_core.caching.cachedUntilDeadline) reading it is a few dict lookups,
+    otherwise the basic fields are read through the cache as usual. Writing it is
+    BatchUpdateMixin._set_field.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj, cls=None) -> Any:
+        if obj is None:
+            return self
+        d = obj.__dict__
+        try:
+            if monotonic() < d["_deadlines"]["_basic_fields"]:
+                return getattr(d["_cache"]["_basic_fields"][0][0], self.name)
+        except KeyError:
+            pass
+        return getattr(obj._basic_fields, self.name)
+
+    def __set__(self, obj, value: Any) -> None:
+        obj._set_field(self.name, value)
+
+
+def basicFields(fields_cls):
+    """Class decorator, adds a BasicField to the proxy for every field of fields_cls"""
+
+    def decorate(cls):
+        for name in fields_cls.__annotations__:
+            if name in cls.__dict__:
+                raise TypeError(f"{cls.__name__}.{name} is defined already")
+            setattr(cls, name, BasicField(name))
+        return cls
+
+    return decorate
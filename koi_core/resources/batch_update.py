@@ -0,0 +1,60 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+from contextlib import contextmanager
+from koi_core.caching import invalidateCache
+from typing import Any
+
+
+class BatchUpdateMixin:
+    """
+    Writes the basic fields of a proxy. Every assignment is sent to the server right away,
+    within batch_update() the assignments are collected and sent with one request at the end:
+
+        with instance.batch_update():
+            instance.name = "name"
+            instance.description = "description"
+
+    The cached basic fields are changed in place, reading them afterwards needs no request.
+    """
+
+    _batch_depth: int = 0
+    _batch_dirty: bool = False
+
+    def _set_field(self, name: str, value: Any) -> None:
+        fields = self._basic_fields
+        setattr(fields, name, value)
+        if self._batch_depth > 0:
+            self._batch_dirty = True
+        else:
+            self._basic_fields = fields
+
+    @contextmanager
+    def batch_update(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._batch_depth == 1 and self._batch_dirty:
+                # the cached fields contain assignments that were not sent
+                invalidateCache(self, "_basic_fields")
+                self._batch_dirty = False
+            raise
+        else:
+            if self._batch_depth == 1 and self._batch_dirty:
+                self._batch_dirty = False
+                self._basic_fields = self._basic_fields
+        finally:
+            self._batch_depth -= 1
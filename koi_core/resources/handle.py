@@ -0,0 +1,141 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import pickle
+from typing import Optional, TYPE_CHECKING
+from uuid import UUID
+from koi_core.api import API, OfflineAPI
+from koi_core.api.common import RequestsAPI
+from koi_core.caching import CachingObject
+from koi_core.caching_persistence import getCachingPersistence
+from koi_core.caching_strategy import LocalOnlyCachingStrategy
+from koi_core.resources.ids import InstanceId
+
+if TYPE_CHECKING:
+    from koi_core.resources.instance import Instance
+
+
+# the cache entries that are needed to load and run an instance
+_MODEL_SNAPSHOT_KEYS = ["_basic_fields", "_code", "parameters"]
+_INSTANCE_SNAPSHOT_KEYS = [
+    "_basic_fields",
+    "training_data",
+    "inference_data",
+    "_get_parameter_values",
+    "_get_available_parameters",
+]
+
+
+def _copy_entries(proxy: CachingObject, keys):
+    cache = getattr(proxy, "_cache", {})
+    return {key: cache[key] for key in keys if key in cache}
+
+
+def _restore_entries(proxy: CachingObject, entries):
+    if not hasattr(proxy, "_cache"):
+        proxy._cache = getCachingPersistence().getCache(proxy)
+    for key, value in entries.items():
+        if key not in proxy._cache:
+            proxy._cache[key] = value
+
+
+class InstanceHandle:
+    """
+    A small picklable reference to an instance of an api object pool. It is used to hand
+    an instance to another process: the receiving process opens its own pool and
+    connections instead of unpickling the pool, the api and all caches of the sender.
+
+    The optional snapshot is the path of a file with the cache entries of the instance
+    and its model (see write_snapshot). Opening the handle seeds the new caches from it,
+    so code and data fetched once by the sender are not downloaded again.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model_uuid: UUID,
+        instance_uuid: UUID,
+        username: str = None,
+        password: str = None,
+        token: str = None,
+        offline: bool = False,
+        snapshot: str = None,
+    ) -> None:
+        self.base_url = base_url
+        self.model_uuid = model_uuid
+        self.instance_uuid = instance_uuid
+        self.username = username
+        self.password = password
+        self.token = token
+        self.offline = offline
+        self.snapshot = snapshot
+
+    @staticmethod
+    def from_instance(instance: "Instance", snapshot: str = None) -> Optional["InstanceHandle"]:
+        """
+        Create a handle for the instance. None is returned for instances that can not be
+        reopened in another process, e.g. the ones of a local object pool.
+        """
+        api = getattr(instance.pool, "api", None)
+        if api is None:
+            return None
+
+        handle = InstanceHandle(api._base_url, instance.id.model_uuid, instance.id.instance_uuid)
+        if isinstance(api, RequestsAPI):
+            handle.username = api._user
+            handle.password = api._password
+            handle.token = getattr(api, "_token", None)
+        else:
+            handle.offline = True
+
+        if snapshot is not None:
+            write_snapshot(instance, snapshot)
+            handle.snapshot = snapshot
+        return handle
+
+    def open(self) -> "Instance":
+        # import here as the pool depends on almost every resource
+        from koi_core.resources.pool import APIObjectPool
+
+        if self.offline:
+            pool = APIObjectPool(OfflineAPI(self.base_url), LocalOnlyCachingStrategy())
+        else:
+            api = API(self.base_url, self.username, self.password)
+            if self.token is not None:
+                # reuse the token, there is no need to login again
+                api._token = self.token
+            pool = APIObjectPool(api)
+
+        instance = pool.instance(InstanceId(self.model_uuid, self.instance_uuid))
+
+        if self.snapshot is not None:
+            with open(self.snapshot, "rb") as f:
+                model_entries, instance_entries = pickle.load(f)
+            _restore_entries(instance.model, model_entries)
+            _restore_entries(instance, instance_entries)
+
+        return instance
+
+
+def write_snapshot(instance: "Instance", path: str) -> None:
+    """Write the cache entries needed to run the instance to a file."""
+    with open(path, "wb") as f:
+        pickle.dump(
+            (
+                _copy_entries(instance.model, _MODEL_SNAPSHOT_KEYS),
+                _copy_entries(instance, _INSTANCE_SNAPSHOT_KEYS),
+            ),
+            f,
+        )
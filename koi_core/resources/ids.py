@@ -13,239 +13,211 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from uuid import UUID
-
-
-class GeneralAccessId:
-    access_uuid: UUID
 
-    def __init__(self, access_uuid: UUID = None, id=None) -> None:
-        self.access_uuid = access_uuid if access_uuid else id.access_uuid
+from typing import Optional, Tuple
+from uuid import UUID
+from weakref import WeakValueDictionary
+
+
+class _Id:
+    """
+    The base of all ids. An id is immutable and interned: creating an id that exists
+    already returns the existing object. The hash and the api path are computed once.
+
+    _fields are the uuids in the order of the constructor, the last one identifies the id.
+    _segments are the path segments of the fields (None if a field has none).
+    """
+
+    __slots__ = ("_hash", "_path", "__weakref__")
+    _fields: Tuple[str, ...] = ()
+    _segments: Tuple[Optional[str], ...] = ()
+    _interned: "WeakValueDictionary"
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._interned = WeakValueDictionary()
+
+    def __new__(cls, *args, id=None, **kwargs):
+        if not args and not kwargs and id is None:
+            # unpickling an id of an older version, __setstate__ fills it
+            return object.__new__(cls)
+        if len(args) > len(cls._fields):
+            raise TypeError(f"{cls.__name__} takes at most {len(cls._fields)} uuids")
+        for name in kwargs:
+            if name not in cls._fields:
+                raise TypeError(f"{cls.__name__} got an unexpected keyword argument '{name}'")
+
+        values = []
+        for i, name in enumerate(cls._fields):
+            value = args[i] if i < len(args) else kwargs.get(name)
+            if not value and id is not None:
+                value = getattr(id, name)
+            values.append(value)
+        values = tuple(values)
+
+        self = cls._interned.get(values)
+        if self is None:
+            self = object.__new__(cls)
+            self._set(values)
+            self = cls._interned.setdefault(values, self)
+        return self
+
+    def _set(self, values) -> None:
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_hash", hash(values[-1]))
+        object.__setattr__(self, "_path", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), tuple(getattr(self, name) for name in self._fields))
+
+    def __setstate__(self, state):
+        # ids pickled before they had slots carry their attributes in a dict
+        self._set(tuple(state.get(name) for name in self._fields))
 
     def __hash__(self):
-        return hash(self.access_uuid)
+        return self._hash
 
     def __eq__(self, other):
-        return self.access_uuid == other.access_uuid
-
-
-class BaseRoleId:
-    role_uuid: UUID
+        if self is other:
+            return True
+        if not isinstance(other, _Id):
+            return NotImplemented
+        name = self._fields[-1]
+        return getattr(self, name) == getattr(other, name)
 
-    def __init__(self, role_uuid: UUID = None, id=None) -> None:
-        self.role_uuid = role_uuid if role_uuid else id.role_uuid
+    @property
+    def path(self) -> str:
+        """The path of the resource in the api"""
+        path = self._path
+        if path is None:
+            path = "/api" + "".join(
+                f"/{segment}/{getattr(self, name).hex}"
+                for name, segment in zip(self._fields, self._segments)
+                if segment is not None
+            )
+            object.__setattr__(self, "_path", path)
+        return path
+
+
+class GeneralAccessId(_Id):
+    __slots__ = ("access_uuid",)
+    _fields = ("access_uuid",)
+    _segments = ("access",)
+    access_uuid: UUID
 
-    def __hash__(self):
-        return hash(self.role_uuid)
 
-    def __eq__(self, other):
-        return self.role_uuid == other.role_uuid
+class BaseRoleId(_Id):
+    __slots__ = ("role_uuid",)
+    _fields = ("role_uuid",)
+    _segments = (None,)
+    role_uuid: UUID
 
 
 class GeneralRoleId(BaseRoleId):
-    ...
+    __slots__ = ()
+    _segments = ("userroles/general",)
 
 
 class ModelRoleId(BaseRoleId):
-    ...
+    __slots__ = ()
+    _segments = ("userroles/model",)
 
 
 class InstanceRoleId(BaseRoleId):
-    ...
+    __slots__ = ()
+    _segments = ("userroles/instance",)
 
 
-class UserId:
+class UserId(_Id):
+    __slots__ = ("user_uuid",)
+    _fields = ("user_uuid",)
+    _segments = ("user",)
     user_uuid: UUID
 
-    def __init__(self, user_uuid: UUID = None, id=None) -> None:
-        self.user_uuid = user_uuid if user_uuid else id.user_uuid
-
-    def __hash__(self):
-        return hash(self.user_uuid)
 
-    def __eq__(self, other):
-        return self.user_uuid == other.user_uuid
-
-
-class ModelId:
+class ModelId(_Id):
+    __slots__ = ("model_uuid",)
+    _fields = ("model_uuid",)
+    _segments = ("model",)
     model_uuid: UUID
 
-    def __init__(self, model_uuid: UUID = None, id=None) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-
-    def __hash__(self):
-        return hash(self.model_uuid)
-
-    def __eq__(self, other):
-        return self.model_uuid == other.model_uuid
-
 
 class ModelAccessId(ModelId):
+    __slots__ = ("access_uuid",)
+    _fields = ("model_uuid", "access_uuid")
+    _segments = ("model", "access")
     access_uuid: UUID
 
-    def __init__(self, model_uuid: UUID = None, access_uuid: UUID = None, id=None) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.access_uuid = access_uuid if access_uuid else id.access_uuid
-
-    def __hash__(self):
-        return hash(self.access_uuid)
-
-    def __eq__(self, other):
-        return self.access_uuid == other.access_uuid
-
     @property
     def ModelId(self):
         return ModelId(id=self)
 
 
 class InstanceId(ModelId):
+    __slots__ = ("instance_uuid",)
+    _fields = ("model_uuid", "instance_uuid")
+    _segments = ("model", "instance")
     instance_uuid: UUID
 
-    def __init__(
-        self, model_uuid: UUID = None, instance_uuid: UUID = None, id=None
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-
-    def __hash__(self):
-        return hash(self.instance_uuid)
-
-    def __eq__(self, other):
-        return self.instance_uuid == other.instance_uuid
-
     @property
     def ModelId(self) -> ModelId:
         return ModelId(id=self)
 
 
 class InstanceAccessId(InstanceId):
+    __slots__ = ("access_uuid",)
+    _fields = ("model_uuid", "instance_uuid", "access_uuid")
+    _segments = ("model", "instance", "access")
     access_uuid: UUID
 
-    def __init__(
-        self,
-        model_uuid: UUID = None,
-        instance_uuid: UUID = None,
-        access_uuid: UUID = None,
-        id=None,
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-        self.access_uuid = access_uuid if access_uuid else id.access_uuid
-
-    def __hash__(self):
-        return hash(self.access_uuid)
-
-    def __eq__(self, other):
-        return self.access_uuid == other.access_uuid
-
     @property
     def InstanceId(self) -> InstanceId:
         return InstanceId(id=self)
 
 
 class DescriptorId(InstanceId):
+    __slots__ = ("descriptor_uuid",)
+    _fields = ("model_uuid", "instance_uuid", "descriptor_uuid")
+    _segments = ("model", "instance", "descriptor")
     descriptor_uuid: UUID
 
-    def __init__(
-        self,
-        model_uuid: UUID = None,
-        instance_uuid: UUID = None,
-        descriptor_uuid: UUID = None,
-        id=None,
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-        self.descriptor_uuid = descriptor_uuid if descriptor_uuid else id.descriptor_uuid
-
-    def __hash__(self):
-        return hash(self.descriptor_uuid)
-
-    def __eq__(self, other):
-        return self.descriptor_uuid == other.descriptor_uuid
-
     @property
     def InstanceId(self) -> InstanceId:
         return InstanceId(id=self)
 
 
 class SampleId(InstanceId):
+    __slots__ = ("sample_uuid",)
+    _fields = ("model_uuid", "instance_uuid", "sample_uuid")
+    _segments = ("model", "instance", "sample")
     sample_uuid: UUID
 
-    def __init__(
-        self,
-        model_uuid: UUID = None,
-        instance_uuid: UUID = None,
-        sample_uuid: UUID = None,
-        id=None,
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-        self.sample_uuid = sample_uuid if sample_uuid else id.sample_uuid
-
-    def __hash__(self):
-        return hash(self.sample_uuid)
-
-    def __eq__(self, other):
-        return self.sample_uuid == other.sample_uuid
-
     @property
     def InstanceId(self) -> InstanceId:
         return InstanceId(id=self)
 
 
 class SampleDatumId(SampleId):
+    __slots__ = ("sample_datum_uuid",)
+    _fields = ("model_uuid", "instance_uuid", "sample_uuid", "sample_datum_uuid")
+    _segments = ("model", "instance", "sample", "data")
     sample_datum_uuid: UUID
 
-    def __init__(
-        self,
-        model_uuid: UUID = None,
-        instance_uuid: UUID = None,
-        sample_uuid: UUID = None,
-        sample_datum_uuid: UUID = None,
-        id=None,
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-        self.sample_uuid = sample_uuid if sample_uuid else id.sample_uuid
-        self.sample_datum_uuid = (
-            sample_datum_uuid if sample_datum_uuid else id.sample_datum_uuid
-        )
-
-    def __hash__(self):
-        return hash(self.sample_datum_uuid)
-
-    def __eq__(self, other):
-        return self.sample_datum_uuid == other.sample_datum_uuid
-
     @property
     def SampleId(self) -> SampleId:
         return SampleId(id=self)
 
 
 class SampleLableId(SampleId):
+    __slots__ = ("sample_label_uuid",)
+    _fields = ("model_uuid", "instance_uuid", "sample_uuid", "sample_label_uuid")
+    _segments = ("model", "instance", "sample", "label")
     sample_label_uuid: UUID
 
-    def __init__(
-        self,
-        model_uuid: UUID = None,
-        instance_uuid: UUID = None,
-        sample_uuid: UUID = None,
-        sample_label_uuid: UUID = None,
-        id=None,
-    ) -> None:
-        self.model_uuid = model_uuid if model_uuid else id.model_uuid
-        self.instance_uuid = instance_uuid if instance_uuid else id.instance_uuid
-        self.sample_uuid = sample_uuid if sample_uuid else id.sample_uuid
-        self.sample_label_uuid = (
-            sample_label_uuid if sample_label_uuid else id.sample_label_uuid
-        )
-
-    def __hash__(self):
-        return hash(self.sample_label_uuid)
-
-    def __eq__(self, other):
-        return self.sample_label_uuid == other.sample_label_uuid
-
     @property
     def SampleId(self) -> SampleId:
         return SampleId(id=self)
@@ -14,13 +14,23 @@
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
 from datetime import datetime
-from koi_core.caching import cache, offlineFeature
+from koi_core.caching import cache, offlineFeature, writeThrough
 from koi_core.resources.model import Model
 from koi_core.resources.ids import InstanceId, ModelId, SampleId, DescriptorId
-from koi_core.resources.sample_instance_util import InstanceDescriptorAccessor, InstanceParameterAccessor
+from koi_core.resources.sample_instance_util import (
+    InstanceDescriptorAccessor,
+    InstanceParameterAccessor,
+    KeyIndex,
+    addToKeyIndex,
+    keyIndex,
+)
 from typing import Any, Dict, Iterable, List, TYPE_CHECKING, Union
 from uuid import uuid4
 from koi_core.resources.sample import Sample
+from koi_core.resources.sample_bulk import BulkResult, tag_samples, update_samples
+from koi_core.resources.sample_ingest import IngestResult, IngestStats, ingest
+from koi_core.resources.basic_fields import basicFields
+from koi_core.resources.batch_update import BatchUpdateMixin
 
 if TYPE_CHECKING:
     from koi_core.resources.pool import LocalOnlyObjectPool, APIObjectPool
@@ -48,7 +58,8 @@ class LocalDescriptor:
         self.raw = b""
 
 
-class DescriptorProxy(Descriptor):
+@basicFields(DescriptorBasicFields)
+class DescriptorProxy(Descriptor, BatchUpdateMixin):
     def __init__(
         self, pool: "APIObjectPool", id: Union[DescriptorId, InstanceId, ModelId]
     ) -> None:
@@ -68,19 +79,10 @@ class DescriptorProxy(Descriptor):
         return self.pool.api.instances.update_descriptor(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in DescriptorBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in DescriptorBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     @property
     @cache
     @offlineFeature
@@ -89,7 +91,9 @@ class DescriptorProxy(Descriptor):
 
     @raw.setter
     def raw(self, value):
-        self.pool.api.instances.set_descriptor_data(self.id, value)
+        instances = self.pool.api.instances
+        meta = instances.set_descriptor_data(self.id, value)
+        writeThrough(self, "raw", value, meta, lambda: instances.get_descriptor_data_meta(self.id))
 
 
 class Instance:
@@ -108,6 +112,37 @@ class Instance:
     def new_sample(self) -> Sample:
         ...
 
+    def ingest(
+        self,
+        samples: Iterable,
+        concurrency: int = 8,
+        finalize: bool = False,
+        stats: IngestStats = None,
+        on_result=None,
+    ) -> IngestResult:
+        """Upload many new samples concurrently, see koi_core.resources.sample_ingest.ingest"""
+        return ingest(self, samples, concurrency, finalize, stats, on_result)
+
+    def update_samples(self, samples: Iterable, concurrency: int = 8, progress=None, **fields) -> BulkResult:
+        """Set basic fields of many samples concurrently, see koi_core.resources.sample_bulk.update_samples"""
+        return update_samples(self, samples, fields, concurrency, progress)
+
+    def mark_consumed(self, samples: Iterable, concurrency: int = 8, progress=None) -> BulkResult:
+        return self.update_samples(samples, concurrency, progress, consumed=True)
+
+    def mark_obsolete(self, samples: Iterable, concurrency: int = 8, progress=None) -> BulkResult:
+        return self.update_samples(samples, concurrency, progress, obsolete=True)
+
+    def finalize(self, samples: Iterable, concurrency: int = 8, progress=None) -> BulkResult:
+        return self.update_samples(samples, concurrency, progress, finalized=True)
+
+    def tag(
+        self, samples: Iterable, add: Iterable[str] = None, remove: Iterable[str] = None, concurrency: int = 8,
+        progress=None,
+    ) -> BulkResult:
+        """Add and remove tags of many samples concurrently, see koi_core.resources.sample_bulk.tag_samples"""
+        return tag_samples(self, samples, add, remove, concurrency, progress)
+
     @property
     def model(self) -> "Model":
         return self.pool.model(ModelId(self.id.model_uuid))
@@ -186,7 +221,8 @@ class InstanceBasicFields:
     last_modified: datetime
 
 
-class InstanceProxy(Instance):
+@basicFields(InstanceBasicFields)
+class InstanceProxy(Instance, BatchUpdateMixin):
     @property
     @cache
     @offlineFeature
@@ -198,19 +234,10 @@ class InstanceProxy(Instance):
         return self.pool.api.instances.update_instance(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in InstanceBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in InstanceBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     @property
     @cache
     def training_data(self, meta) -> bytes:
@@ -225,7 +252,9 @@ class InstanceProxy(Instance):
 
     @training_data.setter
     def training_data(self, value):
-        self.pool.api.instances.set_instance_training_data(self.id, value)
+        instances = self.pool.api.instances
+        meta = instances.set_instance_training_data(self.id, value)
+        writeThrough(self, "training_data", value, meta, lambda: instances.get_instance_training_data_meta(self.id))
 
     @property
     @cache
@@ -242,7 +271,9 @@ class InstanceProxy(Instance):
 
     @inference_data.setter
     def inference_data(self, value):
-        self.pool.api.instances.set_instance_inference_data(self.id, value)
+        instances = self.pool.api.instances
+        meta = instances.set_instance_inference_data(self.id, value)
+        writeThrough(self, "inference_data", value, meta, lambda: instances.get_instance_inference_data_meta(self.id))
 
     def get_samples(self, filter_include: list = None, filter_exclude: list = None):
         data, _ = self.pool.api.samples.get_samples(self.id, filter_include, filter_exclude)
@@ -254,14 +285,21 @@ class InstanceProxy(Instance):
     def __get_descriptors(self, meta) -> List[DescriptorId]:
         return self.pool.api.instances.get_descriptors(self.id)
 
+    def _descriptors_index(self) -> KeyIndex:
+        return keyIndex(self, "_descriptors_index", self.__get_descriptors, self.pool.descriptor)
+
     def _get_descriptors(self) -> Iterable[Descriptor]:
-        return [DescriptorProxy(self.pool, d) for d in self.__get_descriptors]
+        return self._descriptors_index().items()
+
+    def _get_descriptors_with_key(self, key: str) -> Iterable[Descriptor]:
+        return self._descriptors_index().with_key(key)
 
     def _new_descriptor(self, key: str, raw: Any) -> None:
         descriptorId, _ = self.pool.api.instances.new_descriptor(self.id)
-        descriptor = DescriptorProxy(self.pool, descriptorId)
+        descriptor = self.pool.descriptor(descriptorId)
         descriptor.key = key
         descriptor.raw = raw
+        addToKeyIndex(self, "__get_descriptors", "_descriptors_index", descriptorId, descriptor)
 
     @cache
     @offlineFeature
@@ -14,13 +14,16 @@
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
 from datetime import datetime
+import hashlib
 import io
-from koi_core.caching import cache, offlineFeature
+from koi_core.caching import CachingMeta, cache, invalidateCache, offlineFeature, writeThrough
+from koi_core.code_cache import build_bundle, load_upload_etag, store_upload_etag
 from koi_core.resources.ids import InstanceId, ModelId
 import os
-import sys
-from koi_core.code_import import KoiCodeLoader
-from typing import Any, Iterable, List, TYPE_CHECKING
+from koi_core.code_import import load_user_code, module_prefix
+from koi_core.resources.basic_fields import basicFields
+from koi_core.resources.batch_update import BatchUpdateMixin
+from typing import IO, Any, Dict, Iterable, List, Tuple, TYPE_CHECKING
 from uuid import uuid4
 import zipfile
 
@@ -36,17 +39,28 @@ class Code:
     def read(self, sub_path) -> bytes:
         ...
 
+    def open(self, sub_path) -> IO[bytes]:
+        ...
+
     def namelist(self):
         ...
 
-    def load(self, instance, temp_dir):
-        loader = KoiCodeLoader(self, instance.parameter, temp_dir)
-        sys.meta_path.insert(0, loader)
-        import user_code as model  # type: ignore
+    def digest(self):
+        """A hash of the code, None if the code may change (e.g. local files)"""
+        return None
 
-        if hasattr(model, "set_asset_dir"):
-            model.set_asset_dir(temp_dir)
-        return model
+    def _source_digest(self):
+        h = hashlib.sha256()
+        for name in sorted(self.gen_namelist()):
+            h.update(name.encode())
+            h.update(self.read(name))
+        return h.hexdigest()
+
+    def load(self, instance, temp_dir):
+        # every code and parameter set is loaded as a package of its own, so several
+        # models can be used in one process
+        prefix = module_prefix(self.digest() or self._source_digest(), instance.parameter)
+        return load_user_code(self, instance.parameter, prefix, temp_dir)
 
     def toBytes(self):
         ...
@@ -55,6 +69,8 @@ class Code:
 class LocalCode(Code):
     def __init__(self, path):
         self._path = path
+        # the sha256 of every file by its name, with the size and mtime it was computed for
+        self._file_hashes: Dict[str, Tuple[Tuple[int, int], str]] = dict()
 
     def gen_namelist(self):
         for root, _, files in os.walk(self._path):
@@ -73,18 +89,42 @@ class LocalCode(Code):
         return os.path.join(self._path, sub_path)
 
     def read(self, sub_path):
-        f = open(os.path.join(self._path, sub_path), "rb")
-        return f.read()
+        with self.open(sub_path) as f:
+            return f.read()
+
+    def open(self, sub_path):
+        return open(os.path.join(self._path, sub_path), "rb")
+
+    def _file_hash(self, sub_path):
+        path = self.build_path(sub_path)
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._file_hashes.get(sub_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                h.update(chunk)
+        self._file_hashes[sub_path] = (key, h.hexdigest())
+        return h.hexdigest()
+
+    def bundle_digest(self):
+        """The hash of the bundle, only files that changed since the last call are read"""
+        h = hashlib.sha256()
+        for name in sorted(self.gen_namelist()):
+            h.update(name.encode() + b"\0" + self._file_hash(name).encode() + b"\0")
+        return h.hexdigest()
+
+    def bundle(self):
+        """The path of a deterministic zip file of the code, it is cached by its digest"""
+        return build_bundle(
+            self.bundle_digest(), [(name, self.build_path(name)) for name in self.gen_namelist()])
 
     def toBytes(self):
-        file_like_object = io.BytesIO()
-        zipf = zipfile.ZipFile(file_like_object, "w", zipfile.ZIP_DEFLATED)
-        for root, dirs, files in os.walk(self._path):
-            for file in files:
-                filename = os.path.join(root, file)
-                zipf.write(filename, arcname=os.path.relpath(filename, self._path))
-        zipf.close()
-        return file_like_object.getvalue()
+        with open(self.bundle(), "rb") as f:
+            return f.read()
 
 
 class RemoteCode(Code):
@@ -93,10 +133,25 @@ class RemoteCode(Code):
         self._archive = zipfile.ZipFile(file, mode="r")
         self._namelist = self._archive.namelist()
         self._data = data
+        self._digest = None
+
+    def __getstate__(self):
+        # the open archive can not be pickled, it is reopened from the data
+        return self._data
+
+    def __setstate__(self, data: bytes):
+        self.__init__(data)
+
+    def digest(self):
+        if self._digest is None:
+            self._digest = hashlib.sha256(self._data).hexdigest()
+        return self._digest
 
     def gen_namelist(self):
         for name in self._namelist:
-            yield os.path.normpath(name)
+            if not name.endswith("/"):
+                # skip the directory entries
+                yield os.path.normpath(name)
 
     def contains(self, sub_path):
         return sub_path in self.namelist()
@@ -105,6 +160,12 @@ class RemoteCode(Code):
         return sub_path
 
     def read(self, path):
+        return self._archive.read(self._zip_path(path))
+
+    def open(self, path):
+        return self._archive.open(self._zip_path(path))
+
+    def _zip_path(self, path):
         path_comps = []
         head, tail = os.path.split(path)
         path_comps.append(tail)
@@ -119,7 +180,7 @@ class RemoteCode(Code):
             zipPath = zipPath + comp + "/"
         zipPath = zipPath[:-1]
 
-        return self._archive.read(zipPath)
+        return zipPath
 
     def toBytes(self):
         return self._data
@@ -171,7 +232,8 @@ class ModelBasicFields:
     last_modified: datetime
 
 
-class ModelProxy(Model):
+@basicFields(ModelBasicFields)
+class ModelProxy(Model, BatchUpdateMixin):
     @property
     @cache
     @offlineFeature
@@ -183,19 +245,10 @@ class ModelProxy(Model):
         return self.pool.api.models.update_model(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in ModelBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in ModelBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     @property
     @cache
     @offlineFeature
@@ -209,7 +262,39 @@ class ModelProxy(Model):
 
     @code.setter
     def code(self, value: Code) -> None:
-        self.pool.api.models.set_model_code(self.id, value.toBytes())
+        models = self.pool.api.models
+        if isinstance(value, LocalCode):
+            meta = self._upload_bundle(value)
+            data = value.toBytes()
+        else:
+            data = value.toBytes()
+            meta = models.set_model_code(self.id, data)
+        # keep the uploaded bytes, the code object is recreated from them
+        writeThrough(self, "_code", data, meta, lambda: models.get_model_code_meta(self.id))
+        invalidateCache(self, "code")
+
+    def _upload_bundle(self, code: LocalCode) -> CachingMeta:
+        digest = code.bundle_digest()
+        path = code.bundle()
+        target = self.id.model_uuid.hex
+
+        # skip the upload if the server still has the bundle we uploaded last time
+        try:
+            meta = self.pool.api.models.get_model_code_meta(self.id)
+        except LookupError:
+            meta = None
+        if meta is not None and meta.etag is not None:
+            if meta.etag.strip('"') == digest or meta.etag == load_upload_etag(digest, target):
+                return meta
+
+        # stream the bundle from the disk
+        with open(path, "rb") as f:
+            meta = self.pool.api.models.set_model_code(self.id, f)
+        if meta is None or meta.etag is None:
+            meta = self.pool.api.models.get_model_code_meta(self.id)
+        if meta is not None and meta.etag is not None:
+            store_upload_etag(digest, target, meta.etag)
+        return meta
 
     @property
     @cache
@@ -219,7 +304,9 @@ class ModelProxy(Model):
 
     @request_plugin.setter
     def request_plugin(self, value: Any) -> None:
-        self.pool.api.models.set_model_request_plugin(self.id, value)
+        models = self.pool.api.models
+        meta = models.set_model_request_plugin(self.id, value)
+        writeThrough(self, "request_plugin", value, meta, lambda: models.get_model_request_plugin_meta(self.id))
 
     @property
     @cache
@@ -229,7 +316,9 @@ class ModelProxy(Model):
 
     @visual_plugin.setter
     def visual_plugin(self, value: Any) -> None:
-        self.pool.api.models.set_model_visual_plugin(self.id, value)
+        models = self.pool.api.models
+        meta = models.set_model_visual_plugin(self.id, value)
+        writeThrough(self, "visual_plugin", value, meta, lambda: models.get_model_visual_plugin_meta(self.id))
 
     @property
     @cache
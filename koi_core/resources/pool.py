@@ -13,20 +13,53 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from koi_core.resources.ids import GeneralRoleId, ModelRoleId, InstanceRoleId, InstanceId, ModelId, SampleId, UserId
-from koi_core.caching import cache, indexedCache, offlineFeature, setIndexedCache
+from koi_core.resources.ids import (
+    DescriptorId,
+    GeneralRoleId,
+    ModelRoleId,
+    InstanceRoleId,
+    InstanceId,
+    ModelId,
+    SampleDatumId,
+    SampleId,
+    SampleLableId,
+    UserId,
+)
+from koi_core.caching import cache, indexedCache, invalidateCache, offlineFeature, setIndexedCache
 from koi_core.caching_strategy import ExpireCachingStrategy, LocalOnlyCachingStrategy
 from uuid import uuid3, NAMESPACE_URL
 from typing import Iterable
 
-from koi_core.resources.instance import Instance, InstanceProxy, LocalInstance
+from koi_core.resources.instance import Descriptor, DescriptorProxy, Instance, InstanceProxy, LocalInstance
 from koi_core.resources.model import LocalModel, Model, ModelProxy
-from koi_core.resources.sample import LocalSample, Sample, SampleProxy
+from koi_core.resources.sample import (
+    LocalSample,
+    Sample,
+    SampleDatum,
+    SampleDatumProxy,
+    SampleLabel,
+    SampleLabelProxy,
+    SampleProxy,
+)
 from koi_core.resources.user import User, UserProxy
 from koi_core.resources.role import GeneralRole, ModelRole, InstanceRole, GeneralRoleProxy, ModelRoleProxy, InstanceRoleProxy
 from koi_core.api import API
 
 
+_PROXY_CLASSES = [
+    ModelProxy,
+    InstanceProxy,
+    DescriptorProxy,
+    SampleProxy,
+    SampleDatumProxy,
+    SampleLabelProxy,
+    UserProxy,
+    GeneralRoleProxy,
+    ModelRoleProxy,
+    InstanceRoleProxy,
+]
+
+
 class LocalOnlyObjectPool:
     cachingStrategy = LocalOnlyCachingStrategy()
 
@@ -74,6 +107,30 @@ class APIObjectPool:
         if cachingStrategy is not None:
             self.cachingStrategy = cachingStrategy
         self.api = api
+        if hasattr(self.cachingStrategy, "compile"):
+            self.cachingStrategy.compile(_PROXY_CLASSES + [type(self)])
+
+    def evict(self) -> int:
+        """
+        Drop the cached entries of all proxies of the pool that the caching strategy marks
+        as evictable, e.g. to release memory after a pass over many samples. The proxies
+        stay valid and fetch the entries again when they are needed. Returns the number of
+        dropped entries.
+        """
+        isEvictable = getattr(self.cachingStrategy, "isEvictable", None)
+        if isEvictable is None:
+            return 0
+        dropped = 0
+        for proxies in list(getattr(self, "_cache", {}).values()):
+            for proxy, _ in list(proxies.values()):
+                cache = getattr(proxy, "_cache", None)
+                if not cache:
+                    continue
+                for key in list(cache):
+                    if isEvictable(type(proxy), key):
+                        invalidateCache(proxy, key)
+                        dropped += 1
+        return dropped
 
     @cache
     @offlineFeature
@@ -158,3 +215,17 @@ class APIObjectPool:
         sample = SampleProxy(self, id)
         setIndexedCache(self, "sample", sample.id, sample)
         return sample
+
+    # the proxies of the data, labels and descriptors are kept here, so every access to
+    # the same item shares one proxy and its cache
+    @indexedCache
+    def sample_datum(self, id: SampleDatumId, meta) -> SampleDatum:
+        return SampleDatumProxy(self, id), meta
+
+    @indexedCache
+    def sample_label(self, id: SampleLableId, meta) -> SampleLabel:
+        return SampleLabelProxy(self, id), meta
+
+    @indexedCache
+    def descriptor(self, id: DescriptorId, meta) -> Descriptor:
+        return DescriptorProxy(self, id), meta
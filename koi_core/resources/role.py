@@ -16,6 +16,8 @@
 from typing import Any, TYPE_CHECKING
 from koi_core.resources.ids import GeneralRoleId, ModelRoleId, InstanceRoleId
 from koi_core.caching import cache
+from koi_core.resources.basic_fields import basicFields
+from koi_core.resources.batch_update import BatchUpdateMixin
 
 
 if TYPE_CHECKING:
@@ -40,7 +42,8 @@ class GeneralRoleBasicFields:
     edit_roles: bool
 
 
-class GeneralRoleProxy(GeneralRole):
+@basicFields(GeneralRoleBasicFields)
+class GeneralRoleProxy(GeneralRole, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> GeneralRoleBasicFields:
@@ -51,19 +54,10 @@ class GeneralRoleProxy(GeneralRole):
         self.pool.api.roles.update_general_role(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in GeneralRoleBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in GeneralRoleBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     def __init__(self, pool: "APIObjectPool", id: GeneralRoleId) -> None:
         self.pool = pool
         if not isinstance(id, GeneralRoleId):
@@ -91,7 +85,8 @@ class ModelRoleBasicFields:
     grant_access: bool
 
 
-class ModelRoleProxy(ModelRole):
+@basicFields(ModelRoleBasicFields)
+class ModelRoleProxy(ModelRole, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> ModelRoleBasicFields:
@@ -102,19 +97,10 @@ class ModelRoleProxy(ModelRole):
         self.pool.api.roles.update_model_role(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in ModelRoleBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in ModelRoleBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     def __init__(self, pool: "APIObjectPool", id: ModelRoleId) -> None:
         self.pool = pool
         if not isinstance(id, ModelRoleId):
@@ -148,7 +134,8 @@ class InstanceRoleBasicFields:
     response_label: bool
 
 
-class InstanceRoleProxy(InstanceRole):
+@basicFields(InstanceRoleBasicFields)
+class InstanceRoleProxy(InstanceRole, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> InstanceRoleBasicFields:
@@ -159,19 +146,10 @@ class InstanceRoleProxy(InstanceRole):
         self.pool.api.roles.update_instance_role(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in InstanceRoleBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in InstanceRoleBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     def __init__(self, pool: "APIObjectPool", id: InstanceRoleId) -> None:
         self.pool = pool
         if not isinstance(id, InstanceRoleId):
@@ -13,12 +13,17 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from koi_core.caching import cache
+from koi_core.caching import cache, invalidateCache, writeThrough
 from koi_core.resources.ids import InstanceId, SampleDatumId, SampleId
+from koi_core.resources.basic_fields import basicFields
+from koi_core.resources.batch_update import BatchUpdateMixin
 from koi_core.resources.sample_instance_util import (
+    KeyIndex,
     SampleDataAccessor,
     SampleLabelsAccessor,
     SampleTagAccessor,
+    addToKeyIndex,
+    keyIndex,
 )
 
 from uuid import UUID, uuid4
@@ -104,7 +109,22 @@ class LocalSample(Sample):
         self._tags.append(tag)
 
     def _remove_tag(self, tag) -> None:
-        self._tags.pop(tag)
+        self._tags.remove(tag)
+
+    def _update_fields(self, fields) -> bool:
+        changes = {k: v for k, v in fields.items() if getattr(self, k, None) != v}
+        for name, value in changes.items():
+            setattr(self, name, value)
+        return len(changes) > 0
+
+    def _change_tags(self, add, remove) -> bool:
+        add = [tag for tag in add if tag not in self._tags and tag not in remove]
+        remove = [tag for tag in remove if tag in self._tags]
+        for tag in add:
+            self._add_tag(tag)
+        for tag in remove:
+            self._remove_tag(tag)
+        return len(add) + len(remove) > 0
 
     def request_label(self) -> None:
         print("Label Request")
@@ -112,9 +132,12 @@ class LocalSample(Sample):
 
 class SampleBasicFields:
     finalized: bool
+    consumed: bool
+    obsolete: bool
 
 
-class SampleDatumProxy(SampleDatum):
+@basicFields(SampleDatumBasicFields)
+class SampleDatumProxy(SampleDatum, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> SampleDatumBasicFields:
@@ -125,19 +148,10 @@ class SampleDatumProxy(SampleDatum):
         return self.pool.api.samples.update_sample_datum(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in SampleDatumBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in SampleDatumBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     @property
     @cache
     def raw(self, meta) -> bytes:
@@ -145,14 +159,17 @@ class SampleDatumProxy(SampleDatum):
 
     @raw.setter
     def raw(self, value: bytes):
-        self.pool.api.samples.set_sample_datum_file(self.id, value)
+        samples = self.pool.api.samples
+        meta = samples.set_sample_datum_file(self.id, value)
+        writeThrough(self, "raw", value, meta, lambda: samples.get_sample_datum_file_meta(self.id))
 
     def __init__(self, pool: "APIObjectPool", id: SampleDatumId) -> None:
         self.pool = pool
         self.id = id
 
 
-class SampleLabelProxy(SampleLabel):
+@basicFields(SampleDatumBasicFields)
+class SampleLabelProxy(SampleLabel, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> SampleDatumBasicFields:
@@ -163,19 +180,10 @@ class SampleLabelProxy(SampleLabel):
         return self.pool.api.samples.update_sample_label(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in SampleDatumBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in SampleDatumBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     @property
     @cache
     def raw(self, meta) -> bytes:
@@ -183,14 +191,17 @@ class SampleLabelProxy(SampleLabel):
 
     @raw.setter
     def raw(self, value: bytes):
-        self.pool.api.samples.set_sample_label_file(self.id, value)
+        samples = self.pool.api.samples
+        meta = samples.set_sample_label_file(self.id, value)
+        writeThrough(self, "raw", value, meta, lambda: samples.get_sample_label_file_meta(self.id))
 
     def __init__(self, pool: "APIObjectPool", id: SampleDatumId) -> None:
         self.pool = pool
         self.id = id
 
 
-class SampleProxy(Sample):
+@basicFields(SampleBasicFields)
+class SampleProxy(Sample, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> SampleBasicFields:
@@ -206,19 +217,10 @@ class SampleProxy(Sample):
         return self.pool.api.samples.get_tags(self.id, meta)
 
     def __getattr__(self, name: str) -> Any:
-        if name in SampleBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in SampleBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     def __init__(self, pool: "APIObjectPool", id: Union[SampleId, InstanceId]) -> None:
         self.pool = pool
         if not isinstance(id, SampleId):
@@ -233,28 +235,42 @@ class SampleProxy(Sample):
     def __get_data(self, meta) -> List[SampleDatumId]:
         return self.pool.api.samples.get_sample_data(self.id)
 
+    def _data_index(self) -> KeyIndex:
+        return keyIndex(self, "_data_index", self.__get_data, self.pool.sample_datum)
+
     def _get_data(self) -> Iterable[SampleDatum]:
-        return [SampleDatumProxy(self.pool, d) for d in self.__get_data]
+        return self._data_index().items()
+
+    def _get_data_with_key(self, key: str) -> Iterable[SampleDatum]:
+        return self._data_index().with_key(key)
 
     def _new_datum(self, key: str, raw: Any) -> None:
         datumId, _ = self.pool.api.samples.new_sample_datum(self.id)
-        datum = SampleDatumProxy(self.pool, datumId)
+        datum = self.pool.sample_datum(datumId)
         datum.key = key
         datum.raw = raw
+        addToKeyIndex(self, "__get_data", "_data_index", datumId, datum)
 
     @property
     @cache
     def __get_labels(self, meta) -> List[SampleLabel]:
         return self.pool.api.samples.get_sample_labels(self.id)
 
+    def _labels_index(self) -> KeyIndex:
+        return keyIndex(self, "_labels_index", self.__get_labels, self.pool.sample_label)
+
     def _get_labels(self) -> Iterable[SampleLabel]:
-        return [SampleLabelProxy(self.pool, d) for d in self.__get_labels]
+        return self._labels_index().items()
+
+    def _get_labels_with_key(self, key: str) -> Iterable[SampleLabel]:
+        return self._labels_index().with_key(key)
 
     def _new_label(self, key: str, raw: Any) -> None:
         labelId, _ = self.pool.api.samples.new_sample_label(self.id)
-        label = SampleLabelProxy(self.pool, labelId)
+        label = self.pool.sample_label(labelId)
         label.key = key
         label.raw = raw
+        addToKeyIndex(self, "__get_labels", "_labels_index", labelId, label)
 
     def _add_tag(self, tag) -> None:
         self.pool.api.samples.add_tag(self.id, tag)
@@ -262,5 +278,18 @@ class SampleProxy(Sample):
     def _remove_tag(self, tag) -> None:
         self.pool.api.samples.remove_tag(self.id, tag)
 
+    def _update_fields(self, fields) -> bool:
+        # reads the fields if they are not cached, the write is a single request
+        with self.batch_update():
+            changes = {k: v for k, v in fields.items() if getattr(self, k) != v}
+            for name, value in changes.items():
+                setattr(self, name, value)
+        return len(changes) > 0
+
+    def _change_tags(self, add, remove) -> bool:
+        requests = self.pool.api.samples.change_tags(self.id, add, remove)
+        invalidateCache(self, "_tags")
+        return requests > 0
+
     def request_label(self) -> None:
         self.pool.api.samples.request_label(self.id)
@@ -0,0 +1,147 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import monotonic
+from koi_core.resources.ids import SampleId
+from typing import Any, Callable, Dict, Iterable, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from koi_core.resources.instance import Instance
+
+
+class BulkFailure():
+    def __init__(self, index: int, sample: Any, exception: Exception):
+        self.index = index
+        self.sample = sample
+        self.exception = exception
+
+
+class BulkResult():
+    """The summary of a bulk operation, it is updated while the operation runs"""
+
+    def __init__(self):
+        self._start = monotonic()
+        self._end = None
+        # samples that were changed and samples that needed no change
+        self.changed = 0
+        self.unchanged = 0
+        self.failures: List[BulkFailure] = []
+
+    @property
+    def done(self) -> int:
+        return self.changed + self.unchanged + len(self.failures)
+
+    @property
+    def elapsed(self) -> float:
+        return (self._end if self._end is not None else monotonic()) - self._start
+
+    def raise_for_failures(self) -> None:
+        """Raise the exception of the first failed sample, if any"""
+        if self.failures:
+            raise self.failures[0].exception
+
+    def __str__(self):
+        return (
+            f"{self.done} samples ({self.changed} changed, {self.unchanged} unchanged, "
+            f"{len(self.failures)} failed) in {self.elapsed:.1f}s"
+        )
+
+
+def run_bulk(
+    items: Iterable,
+    func: Callable[[Any], bool],
+    concurrency: int = 8,
+    progress: Callable[[BulkResult], None] = None,
+) -> BulkResult:
+    """
+    Call func for every item with up to concurrency calls at the same time. func returns
+    whether it changed anything. A failing item does not stop the others, it is recorded
+    in the result. progress(result) is called on the calling thread after every item.
+    """
+    result = BulkResult()
+    concurrency = max(concurrency, 1)
+
+    def run(index: int, item: Any):
+        try:
+            return index, item, func(item)
+        except Exception as e:
+            return index, item, e
+
+    inputs = enumerate(items)
+    running = set()
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="koi_bulk") as pool:
+        while True:
+            for index, item in itertools.islice(inputs, concurrency * 2 - len(running)):
+                running.add(pool.submit(run, index, item))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item, value = future.result()
+                if isinstance(value, Exception):
+                    result.failures.append(BulkFailure(index, item, value))
+                elif value:
+                    result.changed += 1
+                else:
+                    result.unchanged += 1
+                if progress is not None:
+                    progress(result)
+
+    result.failures.sort(key=lambda f: f.index)
+    result._end = monotonic()
+    return result
+
+
+def _samples(instance: "Instance", samples: Iterable, concurrency: int):
+    api = getattr(instance.pool, "api", None)
+    if api is not None:
+        api.set_connection_pool_size(concurrency)
+    for sample in samples:
+        yield instance.pool.sample(sample) if isinstance(sample, SampleId) else sample
+
+
+def update_samples(
+    instance: "Instance",
+    samples: Iterable,
+    fields: Dict[str, Any],
+    concurrency: int = 8,
+    progress: Callable[[BulkResult], None] = None,
+) -> BulkResult:
+    """
+    Set the basic fields of many samples (Sample objects or SampleIds) of the instance.
+    Every sample is written with one request, samples that already have the values
+    are skipped.
+    """
+    return run_bulk(_samples(instance, samples, concurrency), lambda s: s._update_fields(fields), concurrency, progress)
+
+
+def tag_samples(
+    instance: "Instance",
+    samples: Iterable,
+    add: Optional[Iterable[str]] = None,
+    remove: Optional[Iterable[str]] = None,
+    concurrency: int = 8,
+    progress: Callable[[BulkResult], None] = None,
+) -> BulkResult:
+    """
+    Add and remove tags of many samples (Sample objects or SampleIds) of the instance. The
+    added tags of a sample are sent with one request, every removed tag needs one.
+    """
+    add = list(add) if add is not None else []
+    remove = list(remove) if remove is not None else []
+    return run_bulk(_samples(instance, samples, concurrency), lambda s: s._change_tags(add, remove), concurrency, progress)
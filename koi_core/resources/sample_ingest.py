@@ -0,0 +1,255 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import itertools
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from time import monotonic
+from koi_core.resources.ids import InstanceId, SampleId
+from koi_core.resources.sample import Sample, SampleBasicFields, SampleDatumBasicFields
+from typing import Any, Callable, Iterable, List, Optional, Tuple, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from koi_core.resources.instance import Instance
+
+IngestInput = Union[Sample, Mapping]
+
+
+class IngestStats():
+    """Throughput counters of an ingestion, they are updated while it runs"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._start = monotonic()
+        self._end = None
+        self.samples = 0
+        self.failed = 0
+        self.payloads = 0
+        self.bytes = 0
+        self.requests = 0
+
+    def _add(self, samples=0, failed=0, payloads=0, bytes=0, requests=0):
+        with self._lock:
+            self.samples += samples
+            self.failed += failed
+            self.payloads += payloads
+            self.bytes += bytes
+            self.requests += requests
+
+    def _finish(self):
+        self._end = monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return (self._end if self._end is not None else monotonic()) - self._start
+
+    @property
+    def samples_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.samples} samples ({self.failed} failed), {self.payloads} payloads, "
+            f"{self.bytes / 2**20:.1f}MiB, {self.requests} requests in {self.elapsed:.1f}s, "
+            f"{self.samples_per_second:.1f} samples/s, {self.bytes_per_second / 2**20:.1f}MiB/s"
+        )
+
+
+class IngestFailure():
+    def __init__(self, index: int, sample: IngestInput, exception: Exception, id: Optional[SampleId]):
+        self.index = index
+        self.sample = sample
+        self.exception = exception
+        # the id of the partially uploaded sample (it is marked obsolete), None if it was not created
+        self.id = id
+
+
+class IngestResult():
+    def __init__(self, stats: IngestStats):
+        # the ids in the order of the input, None for failed samples
+        self.ids: List[Optional[SampleId]] = []
+        self.failures: List[IngestFailure] = []
+        self.stats = stats
+
+
+def _parts(sample: IngestInput):
+    """(data, labels, tags) of a sample object or a dict with data, labels and tags"""
+    if isinstance(sample, Mapping):
+        data = list(sample.get("data", {}).items())
+        labels = list(sample.get("labels", {}).items())
+        tags = list(sample.get("tags", []))
+    else:
+        data = [(datum.key, datum.raw) for datum in sample._get_data()]
+        labels = [(label.key, label.raw) for label in sample._get_labels()]
+        tags = list(getattr(sample, "_tags", []))
+
+    for key, raw in data + labels:
+        if not isinstance(raw, (bytes, bytearray, memoryview)):
+            raise TypeError(f"the payload of {key} is {type(raw).__name__}, bytes are expected")
+    return data, labels, tags
+
+
+def _sample_fields(finalized=False, obsolete=False) -> SampleBasicFields:
+    fields = SampleBasicFields()
+    fields.finalized = finalized
+    fields.consumed = False
+    fields.obsolete = obsolete
+    return fields
+
+
+class _APIIngester():
+    """Uploads a sample with the least number of requests, the fields are written without reading them"""
+
+    def __init__(self, instance: "Instance", finalize: bool, stats: IngestStats):
+        self._samples = instance.pool.api.samples
+        self._instance_id = InstanceId(instance.id.model_uuid, instance.id.instance_uuid)
+        self._finalize = finalize
+        self._stats = stats
+
+    def _payload(self, sample_id: SampleId, key: str, raw: bytes, is_label: bool):
+        if is_label:
+            id, _ = self._samples.new_sample_label(sample_id)
+        else:
+            id, _ = self._samples.new_sample_datum(sample_id)
+        fields = SampleDatumBasicFields()
+        fields.key = key
+        if is_label:
+            self._samples.update_sample_label(id, fields)
+            self._samples.set_sample_label_file(id, raw)
+        else:
+            self._samples.update_sample_datum(id, fields)
+            self._samples.set_sample_datum_file(id, raw)
+        self._stats._add(payloads=1, bytes=len(raw), requests=3)
+
+    def __call__(self, sample: IngestInput, created: List[SampleId]) -> SampleId:
+        data, labels, tags = _parts(sample)
+        sample_id, _ = self._samples.new_sample(self._instance_id)
+        created.append(sample_id)
+        self._stats._add(requests=1)
+
+        for key, raw in data:
+            self._payload(sample_id, key, raw, False)
+        for key, raw in labels:
+            self._payload(sample_id, key, raw, True)
+        if tags:
+            self._samples.add_tags(sample_id, tags)
+            self._stats._add(requests=1)
+        if self._finalize:
+            self._samples.update_sample(sample_id, _sample_fields(finalized=True))
+            self._stats._add(requests=1)
+        return sample_id
+
+    def discard(self, sample_id: SampleId):
+        try:
+            self._samples.update_sample(sample_id, _sample_fields(obsolete=True))
+        except Exception:
+            pass
+
+
+class _LocalIngester():
+    def __init__(self, instance: "Instance", finalize: bool, stats: IngestStats):
+        self._instance = instance
+        self._finalize = finalize
+        self._stats = stats
+
+    def __call__(self, sample: IngestInput, created: List[SampleId]) -> SampleId:
+        data, labels, tags = _parts(sample)
+        new = self._instance.new_sample()
+        created.append(new.id)
+        for key, raw in data:
+            new._new_datum(key, raw)
+            self._stats._add(payloads=1, bytes=len(raw))
+        for key, raw in labels:
+            new._new_label(key, raw)
+            self._stats._add(payloads=1, bytes=len(raw))
+        for tag in tags:
+            new._add_tag(tag)
+        if self._finalize:
+            new.finalized = True
+        return new.id
+
+    def discard(self, sample_id: SampleId):
+        pass
+
+
+def ingest(
+    instance: "Instance",
+    samples: Iterable[IngestInput],
+    concurrency: int = 8,
+    finalize: bool = False,
+    stats: IngestStats = None,
+    on_result: Callable[[int, Union[SampleId, IngestFailure]], None] = None,
+) -> IngestResult:
+    """
+    Upload new samples to the instance. A sample is a Sample (e.g. a LocalSample) or a dict
+    {"data": {key: bytes}, "labels": {key: bytes}, "tags": [...]}. Up to concurrency
+    samples are uploaded at the same time over pooled connections; every sample needs
+    one request to create it, three per datum or label and one for all tags.
+
+    A failed sample does not stop the ingestion, it is reported in the result and the part
+    that was already uploaded is marked obsolete. stats can be passed to watch the counters
+    while the ingestion runs, on_result(index, id or failure) is called (on the calling
+    thread) as soon as a sample is done.
+    """
+    stats = stats if stats is not None else IngestStats()
+    result = IngestResult(stats)
+    api = getattr(instance.pool, "api", None)
+    if api is not None:
+        api.set_connection_pool_size(concurrency)
+        ingester = _APIIngester(instance, finalize, stats)
+    else:
+        ingester = _LocalIngester(instance, finalize, stats)
+
+    def run(index: int, sample: IngestInput) -> Tuple[int, Any]:
+        created = []
+        try:
+            return index, ingester(sample, created)
+        except Exception as e:
+            if created:
+                ingester.discard(created[0])
+            return index, IngestFailure(index, sample, e, created[0] if created else None)
+
+    inputs = enumerate(samples)
+    running = set()
+    with ThreadPoolExecutor(max(concurrency, 1), thread_name_prefix="koi_ingest") as pool:
+        while True:
+            # keep a bounded number of samples in flight, the input may be a stream
+            for index, sample in itertools.islice(inputs, max(concurrency, 1) * 2 - len(running)):
+                running.add(pool.submit(run, index, sample))
+                result.ids.append(None)
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, value = future.result()
+                if isinstance(value, IngestFailure):
+                    result.failures.append(value)
+                    stats._add(failed=1)
+                else:
+                    result.ids[index] = value
+                    stats._add(samples=1)
+                if on_result is not None:
+                    on_result(index, value)
+
+    result.failures.sort(key=lambda f: f.index)
+    stats._finish()
+    return result
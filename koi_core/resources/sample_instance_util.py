@@ -13,13 +13,71 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
-from typing import Any, Iterable, Union, TYPE_CHECKING
+from koi_core.caching import setCache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Union, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from koi_core.resources.sample import SampleDatum, SampleLabel, Sample
     from koi_core.resources.instance import Instance, Descriptor
 
 
+class KeyIndex:
+    """
+    The proxies of a listing (data, labels or descriptors) and an index of them by key.
+    The proxies come from the object pool, so the key of every item is read only once and
+    looking up a key needs no request.
+    """
+
+    def __init__(self, ids: Iterable[Hashable], factory: Callable[[Hashable], Any]):
+        self.ids = list(ids)
+        self._proxies = {id: factory(id) for id in self.ids}
+        self._by_key: Dict[str, List[Any]] = None
+
+    def items(self) -> List[Any]:
+        return [self._proxies[id] for id in self.ids]
+
+    def with_key(self, key: str) -> List[Any]:
+        if self._by_key is None:
+            by_key = dict()
+            for item in self.items():
+                by_key.setdefault(item.key, []).append(item)
+            self._by_key = by_key
+        return self._by_key.get(key, [])
+
+    def add(self, id: Hashable, item: Any) -> None:
+        self.ids.append(id)
+        self._proxies[id] = item
+        if self._by_key is not None:
+            self._by_key.setdefault(item.key, []).append(item)
+
+
+def keyIndex(owner, name: str, ids: List[Hashable], factory: Callable[[Hashable], Any]) -> KeyIndex:
+    """The KeyIndex of a listing, it is kept in the cache of owner and rebuilt if the listing changed"""
+    entry = getattr(owner, "_cache", {}).get(name, {}).get(0)
+    if entry is not None and entry[0].ids == ids:
+        return entry[0]
+    index = KeyIndex(ids, factory)
+    setCache(owner, name, {0: (index, None)})
+    return index
+
+
+def addToKeyIndex(owner, listing: str, name: str, id: Hashable, item: Any) -> None:
+    """Add a new item to the cached listing and index of owner, if they are cached"""
+    cache = getattr(owner, "_cache", {})
+    if 0 in cache.get(listing, {}):
+        cache[listing][0][0].append(id)
+    if 0 in cache.get(name, {}):
+        cache[name][0][0].add(id, item)
+
+
+def _lookup(owner, listing: str, key: str) -> Callable[[], Iterable]:
+    """The items of owner that may have the key, from its key index if it has one"""
+    with_key = getattr(owner, listing + "_with_key", None)
+    if with_key is None:
+        return getattr(owner, listing)
+    return lambda: with_key(key)
+
+
 class NamedDataLabelAccessor:
     def __init__(self, key: str) -> None:
         self.key = key
@@ -77,7 +135,7 @@ class SampleDataAccessor:
 
     def __getitem__(self, key: str):
         accessor = NamedDataLabelAccessor(key)
-        accessor._get_data = self.sample._get_data
+        accessor._get_data = _lookup(self.sample, "_get_data", key)
         accessor._new_datum = self.sample._new_datum
         return accessor
 
@@ -88,7 +146,7 @@ class SampleLabelsAccessor:
 
     def __getitem__(self, key: str):
         accessor = NamedDataLabelAccessor(key)
-        accessor._get_data = self.sample._get_labels
+        accessor._get_data = _lookup(self.sample, "_get_labels", key)
         accessor._new_datum = self.sample._new_label
         return accessor
 
@@ -96,13 +154,17 @@ class SampleLabelsAccessor:
 class InstanceParameterAccessor:
     def __init__(self, instance: 'Instance') -> None:
         self.instance = instance
-        self._allowed_keys = []
-        self._model_params = {}
-        self._update_allowed_keys()
+        # the parameters are fetched on first use, creating a proxy does not need the api
+        self._model_params = None
+
+    @property
+    def _allowed_keys(self):
+        if self._model_params is None:
+            self._update_allowed_keys()
+        return [x["name"] for x in self._model_params]
 
     def _update_allowed_keys(self):
         self._model_params = self.instance._get_parameter_values()
-        self._allowed_keys = [x["name"] for x in self._model_params]
 
     def _update_param(self, value):
         parameter = {"param_uuid": value["param_uuid"], "value": value["value"]}
@@ -146,7 +208,7 @@ class InstanceDescriptorAccessor:
 
     def __getitem__(self, key: str):
         accessor = NamedDataLabelAccessor(key)
-        accessor._get_data = self.instance._get_descriptors
+        accessor._get_data = _lookup(self.instance, "_get_descriptors", key)
         accessor._new_datum = self.instance._new_descriptor
         return accessor
 
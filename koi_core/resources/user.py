@@ -21,6 +21,8 @@ from koi_core.resources.instance import Instance
 from koi_core.resources.role import GeneralRole, ModelRole, InstanceRole
 from koi_core.resources.ids import UserId, BaseRoleId
 from koi_core.caching import cache
+from koi_core.resources.basic_fields import basicFields
+from koi_core.resources.batch_update import BatchUpdateMixin
 
 
 if TYPE_CHECKING:
@@ -45,7 +47,8 @@ class LocalUser(User):
     pass
 
 
-class UserProxy(User):
+@basicFields(UserBasicFields)
+class UserProxy(User, BatchUpdateMixin):
     @property
     @cache
     def _basic_fields(self, meta) -> UserBasicFields:
@@ -56,19 +59,10 @@ class UserProxy(User):
         return self.pool.api.users.update_user(self.id, value)
 
     def __getattr__(self, name: str) -> Any:
-        if name in UserBasicFields.__annotations__:
-            return self._basic_fields.__getattribute__(name)
         if name == "cachingStrategy":
             return self.pool.cachingStrategy
         return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name in UserBasicFields.__annotations__:
-            fields = self._basic_fields
-            setattr(fields, name, value)
-            self._basic_fields = fields
-        super.__setattr__(self, name, value)
-
     def __init__(self, pool: "APIObjectPool", id: UserId) -> None:
         self.pool = pool
         if not isinstance(id, UserId):
@@ -48,6 +48,13 @@ def sigint_handling(signum, frame):
         )
 
 
+def _log_progress(model_name, instance_name):
+    def log(progress):
+        logging.info("training %s/%s %s", model_name, instance_name, progress)
+
+    return log
+
+
 def main():
     # define the options
     p = configargparse.ArgParser(description="worker process for the koi-system")
@@ -98,7 +105,24 @@ def main():
         "--start-method",
         type=str,
         default="NONE",
-        help="The startmethod used for multiprocessing. [spawn, fork, NONE]",
+        help="The startmethod used for multiprocessing. [spawn, fork, forkserver, NONE]",
+    )
+    p.add(
+        "--preload",
+        action="append",
+        default=[],
+        help="module to import once before the instance processes are created (can be repeated)",
+    )
+    p.add(
+        "--idle-processes",
+        type=int,
+        default=0,
+        help="number of processes to start ahead of time for the next instance",
+    )
+    p.add(
+        "--sync-upload",
+        action="store_true",
+        help="upload the trained checkpoints before moving on to the next instance",
     )
     p.add(
         "-r",
@@ -133,6 +157,7 @@ def main():
 
     # initialize the koi_core
     koi.init()
+    koi.control.configure(preload=opt.preload, idle_processes=opt.idle_processes)
 
     # intialize retry counter
     retries = opt.retries
@@ -200,7 +225,13 @@ def main():
                             logging.info(
                                 "start to train instance %s/%s", model.name, instance.name
                             )
-                            koi.control.train(instance, None, False)
+                            koi.control.train(
+                                instance,
+                                None,
+                                False,
+                                progress=_log_progress(model.name, instance.name),
+                                upload_async=not opt.sync_upload,
+                            )
                         except KoiApiOfflineException as ex:
                             raise ex
                         except Exception:
@@ -13,10 +13,22 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
+import hashlib
+import re
+import marshal
+import os
+import stat
+import sys
+import pytest
 from io import BytesIO
+from importlib import import_module
+from importlib.util import MAGIC_NUMBER
 from zipfile import ZipFile, is_zipfile
 from tempfile import TemporaryDirectory
 import koi_core as koi
+from koi_core.code_cache import bytecode_key, load_bytecode
+from koi_core.code_import import KoiCodeLoader, unload_user_code
+from koi_core.resources.model import RemoteCode
 
 
 def test_code_namelist(api_mock):
@@ -49,3 +61,187 @@ def test_code_namelist(api_mock):
     assert list(local_code.gen_namelist()) == list(remote_code.gen_namelist())
 
     temp_dir.cleanup()
+
+
+def _load_module(code, params):
+    # load the model module with a loader of its own, like Code.load does
+    loader = KoiCodeLoader(code, params)
+    sys.meta_path.insert(0, loader)
+    try:
+        return import_module("user_code")
+    finally:
+        sys.meta_path.remove(loader)
+        for name in [n for n in sys.modules if n == "user_code" or n.startswith("user_code.")]:
+            del sys.modules[name]
+
+
+def test_bytecode_cache(testing_model, cache_dir):
+    key = bytecode_key(hashlib.sha256(testing_model).hexdigest(), "ZipFile:__model__.py")
+    assert load_bytecode(key) is None
+
+    model = _load_module(testing_model, {})
+    assert hasattr(model, "train")
+
+    # the compiled module was stored and is used for the next load
+    cached = load_bytecode(key)
+    assert cached is not None
+    assert cached.co_filename == "ZipFile:__model__.py"
+
+    model = _load_module(testing_model, {})
+    assert hasattr(model, "train")
+
+
+def test_load_pyc():
+    code = compile("def answer():\n    return 42\n", "__model__.py", "exec")
+    header = MAGIC_NUMBER + b"\0" * 12
+
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as zipf:
+        zipf.writestr("__param__.py", "")
+        zipf.writestr("__model__.pyc", header + marshal.dumps(code))
+    model = _load_module(buffer.getvalue(), {})
+    assert model.answer() == 42
+
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as zipf:
+        zipf.writestr("__param__.py", "")
+        zipf.writestr("__model__.pyc", b"\0\0\0\0" + b"\0" * 12 + marshal.dumps(code))
+    with pytest.raises(ImportError):
+        _load_module(buffer.getvalue(), {})
+
+
+def test_isolated_user_code():
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as zipf:
+        zipf.writestr("__param__.py", "")
+        zipf.writestr("__model__.py", "from user_code import helper\nVALUE = helper.VALUE\n")
+        zipf.writestr("helper.py", "VALUE = __param__.value\n")
+    code = RemoteCode(buffer.getvalue())
+
+    class FakeInstance:
+        def __init__(self, value):
+            self.parameter = {"value": value}
+
+    loaders = len(sys.meta_path)
+    first = code.load(FakeInstance(1), None)
+    second = code.load(FakeInstance(2), None)
+
+    # two modules, each with its own parameters and submodules
+    assert first is not second
+    assert first.__name__ != second.__name__
+    assert first.VALUE == 1 and first.helper.VALUE == 1
+    assert second.VALUE == 2 and second.helper.VALUE == 2
+
+    # "user_code" is the last loaded code, loading it again does not add a loader
+    assert sys.modules["user_code"] is second
+    assert code.load(FakeInstance(1), None) is first
+    assert sys.modules["user_code"] is first
+    assert len(sys.meta_path) == loaders + 2
+
+    unload_user_code(first.__name__)
+    unload_user_code(second.__name__)
+    assert len(sys.meta_path) == loaders
+    assert "user_code" not in sys.modules
+    assert first.__name__ not in sys.modules
+
+
+def test_asset_cache(api_mock, cache_dir):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    temp_dir = TemporaryDirectory()
+    instance.load_code(temp_dir.name)
+
+    # the assets are extracted once into the shared cache and not into the temp dir
+    asset_dir = os.path.join(cache_dir, "assets", model.code.digest())
+    sample = os.path.join(asset_dir, "additional_files", "sample.txt")
+    assert os.listdir(temp_dir.name) == []
+    with open(sample, "r") as f:
+        assert f.read().strip() == "10"
+    assert not os.stat(sample).st_mode & stat.S_IWUSR
+    assert os.listdir(os.path.join(cache_dir, "assets")) == [model.code.digest()]
+
+    mtime = os.stat(sample).st_mtime_ns
+    other_dir = TemporaryDirectory()
+    unload_user_code(sys.modules["user_code"].__name__)
+    instance.load_code(other_dir.name)
+    assert os.stat(sample).st_mtime_ns == mtime
+
+    temp_dir.cleanup()
+    other_dir.cleanup()
+    koi.deinit()
+
+
+def test_extract_assets_skips_unsafe_names(cache_dir):
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as zipf:
+        zipf.writestr("__param__.py", "")
+        zipf.writestr("__model__.py", "")
+        zipf.writestr("../outside.txt", "no")
+        zipf.writestr("data/inside.txt", "yes")
+    data = buffer.getvalue()
+
+    temp_dir = TemporaryDirectory()
+    loader = KoiCodeLoader(data, {}, temp_dir.name)
+    assert os.listdir(loader.asset_dir) == ["data"]
+    assert not os.path.exists(os.path.join(cache_dir, "assets", "outside.txt"))
+    temp_dir.cleanup()
+
+
+def test_local_code_upload(api_mock, testing_model):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+
+    uploads = []
+
+    def headers(context):
+        context.headers["Expires"] = "Fri, 10 Dec 2050 00:00:00 GMT"
+        context.headers["Last-Modified"] = "Thu, 10 Dec 2020 00:00:00 GMT"
+        # an etag that is not the digest of the bundle
+        context.headers["Etag"] = '"' + hashlib.md5(uploads[-1]).hexdigest() + '"'
+
+    def post_code(request, context):
+        body = request.body.read() if hasattr(request.body, "read") else request.body
+        uploads.append(body)
+        headers(context)
+        return {}
+
+    def head_code(request, context):
+        if not uploads:
+            context.status_code = 404
+            return b""
+        headers(context)
+        return b""
+
+    path = re.compile(r"http://base/api/model/([0-9,a-f,-]*)/code")
+    api_mock.requests_mock.register_uri("POST", path, json=post_code)
+    api_mock.requests_mock.register_uri("HEAD", path, content=head_code)
+
+    temp_dir = TemporaryDirectory()
+    ZipFile(BytesIO(testing_model)).extractall(temp_dir.name)
+    local_code = koi.resources.model.LocalCode(temp_dir.name)
+
+    model.code = local_code
+    assert len(uploads) == 1
+    assert uploads[0] == local_code.toBytes()
+
+    # nothing changed, the server has the same bundle
+    model.code = local_code
+    assert len(uploads) == 1
+
+    # the bundle is deterministic
+    assert koi.resources.model.LocalCode(temp_dir.name).toBytes() == uploads[0]
+
+    with open(os.path.join(temp_dir.name, "__param__.py"), "a") as f:
+        f.write("\n# changed\n")
+    model.code = local_code
+    assert len(uploads) == 2
+    assert uploads[1] != uploads[0]
+
+    temp_dir.cleanup()
+    koi.deinit()
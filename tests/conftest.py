@@ -1,3 +1,4 @@
 from .fixtures.api_mock import api_mock  # noqa: F401
 from .fixtures.testing_model import testing_model  # noqa: F401
 from .fixtures.cleanup import cleanup  # noqa: F401
+from .fixtures.cache_dir import cache_dir  # noqa: F401
@@ -0,0 +1,217 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import multiprocessing
+import pytest
+import koi_core as koi
+from tempfile import TemporaryDirectory
+from koi_core.control import actions, runable_instance
+from koi_core.control.uploader import CheckpointUploader
+from koi_core.control.replicated_instance import ReplicatedRunableInstance
+
+
+@pytest.fixture
+def fork_only():
+    # the request mock is only inherited by forked processes
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("requires the fork start method")
+
+
+def test_replicated_infer(api_mock, fork_only):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    result = koi.control.infer(instance, ["batch0", "batch1"], replicas=2)
+    assert result == [{}, {}]
+
+    runable = koi.control.control._active_instances[instance][0]
+    assert isinstance(runable, ReplicatedRunableInstance)
+    assert runable.replicas == 2
+    assert runable.is_alive()
+
+    # the code was downloaded once for all replicas
+    code_requests = [r for r in api_mock.requests_mock.request_history if r.path.endswith("/code")]
+    assert len(code_requests) == 1
+
+    # the calls are dispatched round robin and reuse the running processes
+    assert runable._next == 1
+    assert koi.control.infer(instance, ["batch0"], replicas=2) == [{}]
+    assert koi.control.control._active_instances[instance][0] is runable
+    assert runable._next == 0
+    assert runable._load == [0, 0]
+
+    # a different dispatch mode replaces the replicated instance
+    koi.control.infer(instance, ["batch0"], replicas=2, dispatch="least_loaded")
+    assert koi.control.control._active_instances[instance][0] is not runable
+    assert koi.control.control._active_instances[instance][0].dispatch == "least_loaded"
+
+    with pytest.raises(ValueError):
+        koi.control.infer(instance, ["batch0"], replicas=0)
+    with pytest.raises(ValueError):
+        koi.control.infer(instance, ["batch0"], dispatch="random")
+
+    koi.deinit()
+
+
+def test_least_loaded_dispatch(api_mock, fork_only):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    runable = ReplicatedRunableInstance(instance, 3, "least_loaded")
+    runable._load = [2, 0, 1]
+    assert runable._select() == 1
+    assert runable._select() == 1
+    assert runable._select() == 2
+    assert runable._load == [2, 2, 2]
+    for i in range(3):
+        runable._release(i)
+        runable._release(i)
+
+    assert runable.infer(["batch0"]) == [{}]
+    assert runable._load == [0, 0, 0]
+
+    runable.terminate()
+    koi.deinit()
+
+
+def test_replicated_train(api_mock, fork_only):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    def inference_requests():
+        return len([r for r in api_mock.requests_mock.request_history if r.path.endswith("/inference")])
+
+    runable = ReplicatedRunableInstance(instance, 2)
+    assert inference_requests() == 1
+    processes = [replica._process for replica in runable._replicas]
+
+    runable.train()
+
+    # all replicas were restarted with the inference data fetched once more
+    assert inference_requests() == 2
+    assert runable.is_alive()
+    for replica, process in zip(runable._replicas, processes):
+        assert replica._process is not process
+        assert not process.is_alive()
+
+    assert runable.infer(["batch0"]) == [{}]
+
+    runable.terminate()
+    koi.deinit()
+
+
+def test_replicated_infer_spawn(api_mock):
+    # spawned replicas have no access to the request mock, i.e. they have to work
+    # with the data that was fetched by the parent and sent along with the instance
+    koi.init()
+    koi.control.configure(start_method="spawn")
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    assert koi.control.infer(instance, ["batch0", "batch1"], replicas=2) == [{}, {}]
+
+    koi.deinit()
+    koi.control.configure()
+
+
+def test_idle_process(api_mock, fork_only):
+    koi.init()
+    koi.control.configure(preload=["json"], idle_processes=1)
+
+    idle = list(runable_instance._idle_processes)
+    assert len(idle) == 1
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    assert koi.control.infer(instance, ["batch0"]) == [{}]
+
+    # the instance took over the idle process and a new one was started
+    runable = koi.control.control._active_instances[instance][0]
+    assert runable._process is idle[0][0]
+    assert len(runable_instance._idle_processes) == 1
+    assert runable_instance._idle_processes[0][0] is not idle[0][0]
+
+    koi.deinit()
+    assert len(runable_instance._idle_processes) == 0
+    koi.control.configure()
+
+
+def test_train_progress(api_mock, fork_only):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    for dev in [True, False]:
+        events = []
+        koi.control.train(instance, dev=dev, progress=events.append)
+
+        assert [e.phase for e in events][0] == "load"
+        assert events[-1].phase == "done"
+        assert events[-1].batches == 2
+        assert events[-1].samples == len("batch0") + len("batch1")
+        assert events[-1].elapsed >= events[-1].fetch_time + events[-1].compute_time
+        assert "2 batches" in str(events[-1])
+
+    koi.deinit()
+
+
+def test_train_upload_async(api_mock, fork_only):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    koi.control.train(instance, upload_async=True)
+    runable = koi.control.control._active_instances[instance][0]
+    assert runable._uploading
+
+    # the uploads are finished before the next command
+    assert koi.control.infer(instance, ["batch0"]) == [{}]
+    assert not runable._uploading
+
+    koi.control.train(instance, upload_async=True)
+    process = runable._process
+
+    # the terminated process finishes its uploads, deinit waits for it
+    koi.control.control.terminate()
+    assert len(runable_instance._retiring_processes) == 0
+    assert process._closed
+
+    # dev mode and the actions return the futures of the uploads
+    uploader = CheckpointUploader()
+    temp_dir = TemporaryDirectory()
+    code = instance.load_code(temp_dir.name)
+    futures = actions.train(code, instance, None, uploader=uploader)
+    uploader.close()
+    assert all(f.done() and f.exception() is None for f in futures)
+    temp_dir.cleanup()
+
+    koi.deinit()
@@ -0,0 +1,382 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+import numpy as np
+import pytest
+import koi_core as koi
+import koi_core.data
+from koi_core.caching import CachingMeta, cache
+from koi_core.caching_strategy import ExpireCachingStrategy
+from koi_core.data.blob_cache import BlobCache
+from koi_core.data.collating_batch_generator import CollatingBatchGenerator
+from koi_core.data.data_loader import DataLoader
+from koi_core.data.epoch_batch_generator import EpochBatchGenerator
+from koi_core.data.local_snapshot import Snapshot, SnapshotBatchGenerator
+from koi_core.data.prefetching_batch_generator import PrefetchingBatchGenerator
+from koi_core.data.simple_accessor import get_np, get_np_mmap, get_np_view, set_np
+from koi_core.resources.ids import SampleId
+from koi_core.resources.sample_instance_util import SampleDataAccessor
+from uuid import UUID, uuid4
+
+
+def _npy(array):
+    f = BytesIO()
+    np.save(f, array)
+    return f.getvalue()
+
+
+class FakeDatum:
+    """Behaves like a SampleDatumProxy: raw is cached and revalidated with its meta"""
+
+    cachingStrategy = ExpireCachingStrategy()
+
+    def __init__(self, id, array, expires=timedelta(hours=1)):
+        self.id = id
+        self.data = _npy(array)
+        self.etag = "1"
+        self.expires = expires
+        self.downloads = 0
+        self.checks = 0
+
+    def _meta(self):
+        meta = CachingMeta()
+        meta.expires = datetime.utcnow() + self.expires
+        meta.etag = self.etag
+        return meta
+
+    @property
+    @cache
+    def raw(self, meta):
+        if meta is not None:
+            self.checks += 1
+            if meta.etag == self.etag:
+                return None, self._meta()
+        self.downloads += 1
+        return self.data, self._meta()
+
+    @raw.setter
+    def raw(self, value):
+        self.data = value
+
+
+@pytest.mark.parametrize("order", ["C", "F"])
+def test_np_view(order):
+    array = np.asfortranarray(np.arange(12.0).reshape(3, 4)) if order == "F" else np.arange(12.0).reshape(3, 4)
+    datum = FakeDatum("view", array)
+
+    view = get_np_view(datum)
+    assert np.array_equal(view, array)
+    assert not view.flags.writeable
+    # the view shares the memory of the cached bytes
+    assert np.shares_memory(view, np.frombuffer(datum.raw, dtype=np.uint8))
+
+    set_np(datum, np.zeros(3))
+    assert np.array_equal(get_np(datum), np.zeros(3))
+
+
+def test_np_mmap(cache_dir):
+    array = np.arange(1000, dtype=np.int32).reshape(10, 100)
+    datum = FakeDatum("mmap", array, expires=timedelta(0))
+    blob_cache = BlobCache()
+
+    mapped = get_np_mmap(datum, blob_cache)
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, array)
+    assert not mapped.flags.writeable
+    assert datum.downloads == 1
+    # only the file keeps the data
+    assert "raw" not in datum._cache
+
+    # the entry is expired, it is checked against the server but not downloaded again
+    assert np.array_equal(get_np_mmap(datum, blob_cache), array)
+    assert datum.downloads == 1 and datum.checks == 1
+
+    # changed data is downloaded
+    datum.data, datum.etag = _npy(array * 2), "2"
+    assert np.array_equal(get_np_mmap(datum, blob_cache), array * 2)
+    assert datum.downloads == 2
+
+
+class FakeSample:
+    def __init__(self, n, log):
+        self.n = n
+        self.id = SampleId(uuid4(), uuid4(), uuid4())
+        self._log = log
+        self.datum = FakeDatum(("sample", n), np.full(2, n))
+        self.datum.key = "x"
+        self.data = SampleDataAccessor(self)
+
+    def _get_data(self):
+        self._log.append(self.n)
+        return [self.datum]
+
+    def _new_datum(self, key, raw):
+        raise NotImplementedError
+
+    def _get_labels(self):
+        return []
+
+
+class FakeInstance:
+    def __init__(self, count, log, fail_at=None):
+        def samples():
+            for n in range(count):
+                if n == fail_at:
+                    raise RuntimeError("fetch failed")
+                yield FakeSample(n, log)
+
+        self.samples_unconsumed = samples()
+
+
+def test_prefetching_batch_generator():
+    log = []
+    generator = PrefetchingBatchGenerator(FakeInstance(10, log), prefetch=2, workers=3)
+    generator.batchSize = 4
+
+    batches = []
+    for batch in generator:
+        batches.append(batch)
+        # the raw bytes were loaded in the background
+        assert all(sample.datum.downloads == 1 for sample in batch)
+
+    assert [[s.n for s in batch] for batch in batches] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert sorted(log) == list(range(10))
+    with pytest.raises(StopIteration):
+        next(generator)
+
+    # decoded batches
+    generator = PrefetchingBatchGenerator(FakeInstance(3, []), fetch=lambda s: get_np(s.datum))
+    generator.batchSize = 2
+    assert [[a.tolist() for a in batch] for batch in generator] == [[[0, 0], [1, 1]], [[2, 2]]]
+
+
+def test_prefetching_bounded_and_errors():
+    log = []
+    generator = PrefetchingBatchGenerator(FakeInstance(100, log), prefetch=1, workers=1)
+    generator.batchSize = 1
+    next(generator)
+    time.sleep(0.2)
+    # one batch was taken, one is queued and one is held by the producer
+    assert len(log) <= 3
+    generator.close()
+
+    generator = PrefetchingBatchGenerator(FakeInstance(10, [], fail_at=5))
+    generator.batchSize = 2
+    with pytest.raises(RuntimeError):
+        list(generator)
+
+
+def test_collating_batch_generator():
+    pool = koi.create_local_object_pool()
+    instance = pool.new_model().new_instance()
+    samples = []
+    for n in range(5):
+        sample = instance.new_sample()
+        sample.data["image"].raw = _npy(np.full((2, 3), n, dtype=np.float32))
+        # plain bytes are decoded with the dtype of the spec
+        sample.labels["class"].raw = np.array([n], dtype=np.int64).tobytes()
+        samples.append(sample)
+
+    generator = CollatingBatchGenerator(
+        instance,
+        data={"image": (np.float32, (2, 3))},
+        labels={"class": (np.int64, ())},
+        batches=[samples[:2], samples[2:4], samples[4:]],
+    )
+    generator.batchSize = 2
+
+    buffers = None
+    for i, batch in enumerate(generator):
+        size = 1 if i == 2 else 2
+        assert batch["image"].shape == (size, 2, 3)
+        assert batch["image"].dtype == np.float32
+        assert batch["image"].flags.c_contiguous
+        assert batch["class"].tolist() == [2 * i + j for j in range(size)]
+        assert np.all(batch["image"][0] == 2 * i)
+
+        # the arrays are reused for every batch
+        if buffers is None:
+            buffers = batch["image"]
+        assert np.shares_memory(buffers, batch["image"])
+
+    generator = CollatingBatchGenerator(instance, data={"image": (np.float32, (3, 3))}, batches=[samples])
+    generator.batchSize = 5
+    with pytest.raises(ValueError):
+        next(generator)
+
+    with pytest.raises(ValueError):
+        CollatingBatchGenerator(instance, data={"x": (np.uint8, ())}, labels={"x": (np.uint8, ())})
+
+
+def test_epoch_batch_generator(tmp_path):
+    def value(sample):
+        return int(np.load(BytesIO(sample.data["x"].raw))[0])
+
+    generator = EpochBatchGenerator(FakeInstance(7, []), epochs=3, seed=42, cache_dir=str(tmp_path))
+    generator.batchSize = 3
+
+    epochs = {}
+    for batch in generator:
+        assert len(batch) <= 3
+        # only the first epoch fetches the samples, the later ones read them from the disk
+        assert all(isinstance(s, FakeSample) == (generator.epoch == 1) for s in batch)
+        epochs.setdefault(generator.epoch, []).extend(value(s) for s in batch)
+        assert len(os.listdir(tmp_path)) == 1
+
+    # every epoch has all samples, shuffled
+    assert sorted(epochs) == [1, 2, 3]
+    for e in epochs:
+        assert sorted(epochs[e]) == list(range(7))
+    assert len({tuple(order) for order in epochs.values()}) > 1
+
+    # the cache is removed
+    assert os.listdir(tmp_path) == []
+
+    # the same seed gives the same order
+    generator = EpochBatchGenerator(FakeInstance(7, []), epochs=3, seed=42, cache_dir=str(tmp_path))
+    generator.batchSize = 3
+    assert [value(s) for batch in generator for s in batch] == epochs[1] + epochs[2] + epochs[3]
+
+    # no shuffling, one epoch
+    generator = EpochBatchGenerator(FakeInstance(7, []), shuffle=False, cache_dir=str(tmp_path))
+    generator.batchSize = 3
+    assert [value(s) for batch in generator for s in batch] == list(range(7))
+
+
+def _decode_slow(sample):
+    # the first samples take longest, so they are finished last
+    index = sample.id.sample_uuid.int
+    time.sleep(0.05 * (4 - index))
+    return {"x": np.full((2, 3), index, dtype=np.int32), "y": np.array(str(index))}
+
+
+def _decode_error(sample):
+    raise ValueError("broken sample")
+
+
+def test_data_loader(api_mock):
+    # the request mock is only inherited by forked processes
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("requires the fork start method")
+
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    instance = next(next(pool.get_all_models()).instances)
+    samples = [FakeSample(i, []) for i in range(5)]
+    for s in samples:
+        s.id = SampleId(instance.id.model_uuid, instance.id.instance_uuid, UUID(int=s.n))
+
+    loader = DataLoader(instance, workers=3, decode=_decode_slow, samples=samples)
+    loader.batchSize = 2
+    batches = list(loader)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    values = [int(item["x"][0, 0]) for batch in batches for item in batch]
+    assert values == [0, 1, 2, 3, 4]
+    assert batches[0][1]["x"].shape == (2, 3) and batches[0][1]["x"].dtype == np.int32
+    assert str(batches[0][1]["y"]) == "1"
+    assert loader._processes == []
+
+    loader = DataLoader(instance, workers=3, decode=_decode_slow, ordered=False, samples=samples)
+    loader.batchSize = 5
+    values = [int(item["x"][0, 0]) for batch in loader for item in batch]
+    assert sorted(values) == [0, 1, 2, 3, 4]
+    assert values != [0, 1, 2, 3, 4]
+
+    loader = DataLoader(instance, workers=1, decode=_decode_error, samples=samples)
+    loader.batchSize = 2
+    with pytest.raises(ValueError):
+        next(loader)
+
+
+class SnapshotSample:
+    def __init__(self, n):
+        self.id = SampleId(uuid4(), uuid4(), uuid4())
+        self.image = FakeDatum(("image", n), np.full((2, 3), n, dtype=np.float32))
+        self.image.key = "image"
+        self.text = FakeDatum(("text", n), None)
+        self.text.key, self.text.data = "text", b"x" * n
+        self.label = FakeDatum(("label", n), np.array(n % 2))
+        self.label.key = "label"
+        self._tags = ["even"] if n % 2 == 0 else []
+
+    def _get_data(self):
+        return [self.image, self.text]
+
+    def _get_labels(self):
+        return [self.label]
+
+
+def test_snapshot(tmp_path):
+    samples = [SnapshotSample(n) for n in range(5)]
+    for s in samples:
+        s.image.expires = s.text.expires = timedelta(0)
+    path = str(tmp_path / "snapshot")
+
+    snapshot = koi_core.data.snapshot(None, path, samples=samples, workers=2)
+    assert len(snapshot) == 5 and snapshot.fetched == 15
+    assert snapshot.is_fixed("image") and snapshot.is_fixed("label") and not snapshot.is_fixed("text")
+    assert snapshot.is_label("label")
+    assert isinstance(snapshot["image"], np.memmap)
+    assert snapshot["image"].shape == (5, 2, 3)
+    assert np.array_equal(snapshot["label"], [0, 1, 0, 1, 0])
+    assert [snapshot["text"][i] for i in range(5)] == [b"x" * n for n in range(5)]
+    assert snapshot.ids == [s.id for s in samples]
+    assert snapshot.tags[0] == ["even"]
+
+    sample = snapshot.sample(3)
+    assert sample.id == samples[3].id
+    assert np.array_equal(get_np(sample.data["image"]), np.full((2, 3), 3))
+    assert sample.data["text"].raw == b"xxx"
+
+    # refresh: only the changed and new payloads are downloaded
+    samples[1].image.data, samples[1].image.etag = _npy(np.zeros((2, 3), dtype=np.float32)), "2"
+    samples.append(SnapshotSample(5))
+    snapshot = koi_core.data.snapshot(None, path, keys=["image", "label"], samples=samples)
+    assert snapshot.keys() == ["image", "label"]
+    assert snapshot.fetched == 1 + 2 and snapshot.reused == 9
+    assert samples[1].image.downloads == 2 and samples[2].image.downloads == 1
+    assert np.array_equal(snapshot["image"][1], np.zeros((2, 3)))
+    assert np.array_equal(snapshot["image"][5], np.full((2, 3), 5))
+    # the old snapshot was replaced
+    assert os.listdir(tmp_path) == ["snapshot"]
+
+    generator = SnapshotBatchGenerator(path)
+    generator.batchSize = 4
+    batches = list(generator)
+    assert [len(b["label"]) for b in batches] == [4, 2]
+    assert np.array_equal(batches[1]["image"][1], np.full((2, 3), 5))
+
+    generator = SnapshotBatchGenerator(Snapshot(path), keys=["label"], shuffle=True, seed=1)
+    generator.batchSize = 6
+    batch = next(generator)
+    assert list(batch) == ["label"]
+    assert np.array_equal(batch["label"], [n % 2 for n in generator.indices])
+
+
+def test_snapshot_variable_shapes(tmp_path):
+    samples = [SnapshotSample(n) for n in range(3)]
+    samples[2].image.data = _npy(np.zeros(4))
+    samples[1]._get_labels = lambda: []
+
+    snapshot = koi_core.data.snapshot(None, str(tmp_path / "s"), samples=samples)
+    assert not snapshot.is_fixed("image") and not snapshot.is_fixed("label")
+    assert snapshot["label"][1] is None
+    assert np.array_equal(np.load(BytesIO(snapshot["image"][2])), np.zeros(4))
+    assert "label" not in [label.key for label in snapshot.sample(1)._get_labels()]
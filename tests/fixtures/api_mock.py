@@ -22,9 +22,11 @@ import requests_mock
 from requests_mock import ANY
 
 from .common_data import data_code
-from .handlers_model import models, model_parameter, model_code
+from .handlers_model import models, model, model_parameter, model_code
 from .handlers_instance import instance_parameter, instance_parameter_set, instances, instance
+from .handlers_instance import data_instance_files, instance_file, instance_file_set
 from .handlers_user import users, user, login
+from .handlers_sample import data_samples, samples, sample_file
 from .handlers_roles import roles, role, access_general, access_model, access_instance
 
 # monkey patch JSONEncoder to encode UUIDs as well.
@@ -43,6 +45,8 @@ JSONEncoder.default = JSONEncoder_newdefault
 @pytest.fixture
 def api_mock(testing_model):
     data_code["testing_model"] = testing_model
+    data_samples.clear()
+    data_instance_files.clear()
 
     class ApiMock:
         requests_mock = None
@@ -58,6 +62,7 @@ def api_mock(testing_model):
 
             self.requests_mock.register_uri("POST", "http://base/api/login", json=login)
             self.requests_mock.register_uri("GET", "http://base/api/model", json=models)
+            self.requests_mock.register_uri("GET", re.compile(r"http://base/api/model/([0-9,a-f,-]*)$"), json=model)
             self.requests_mock.register_uri(
                 "GET", re.compile(r"http://base/api/model/([0-9,a-f,-]*)/parameter"), json=model_parameter,
             )
@@ -82,6 +87,25 @@ def api_mock(testing_model):
                 re.compile(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/parameter"),
                 json=instance_parameter_set,
             )
+            self.requests_mock.register_uri(
+                "POST",
+                re.compile(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/(training|inference)"),
+                json=instance_file_set,
+            )
+            for method in ["GET", "HEAD"]:
+                self.requests_mock.register_uri(
+                    method,
+                    re.compile(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/(training|inference)$"),
+                    content=instance_file,
+                )
+
+            self.requests_mock.register_uri(
+                ANY, re.compile(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/sample"), json=samples,
+            )
+            self.requests_mock.register_uri(
+                "GET", re.compile(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/sample/.*/file$"),
+                content=sample_file,
+            )
 
             self.requests_mock.register_uri(ANY, re.compile(r"http://base/api/user/([0-9,a-f,-]*)"), json=user)
             self.requests_mock.register_uri(ANY, "http://base/api/user", json=users)
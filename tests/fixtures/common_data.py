@@ -50,6 +50,7 @@ data_models = [
                 "has_training": True,
                 "instance_description": "Instance Description 0",
                 "instance_name": "Instance 0",
+                "last_modified": datetime(2020, 12, 10).strftime("%a, %d %b %Y %H:%M:%S GMT"),
                 "instance_uuid": "00000000-0002-1000-8000-000000000000",
                 "parameter": [
                     {
@@ -77,6 +78,7 @@ data_models = [
                 "has_training": True,
                 "instance_description": "Instance Description 1",
                 "instance_name": "Instance 1",
+                "last_modified": datetime(2020, 12, 10).strftime("%a, %d %b %Y %H:%M:%S GMT"),
                 "instance_uuid": "00000000-0002-1000-8000-000000000001",
                 "parameter": [
                     {
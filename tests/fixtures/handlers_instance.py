@@ -13,6 +13,7 @@
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
 
+import hashlib
 import re
 import json
 from uuid import UUID
@@ -77,3 +78,24 @@ def instance_parameter_set(request, context):
 
     context.status_code = 404
     return {}
+
+
+# the training and inference data posted to the instances
+data_instance_files = {}
+
+
+def _instance_file_key(request):
+    match = re.search(r"http://base/api/model/([0-9,a-f,-]*)/instance/([0-9,a-f,-]*)/(training|inference)", str(request))
+    return UUID(match[2]), match[3]
+
+
+def instance_file_set(request, context):
+    data_instance_files[_instance_file_key(request)] = request.body if isinstance(request.body, bytes) else b""
+    return {}
+
+
+@cache_controlled
+def instance_file(request, context):
+    data = data_instance_files.get(_instance_file_key(request), b"")
+    context.headers["Etag"] = hashlib.sha256(data).hexdigest()
+    return data
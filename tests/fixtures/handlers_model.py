@@ -33,6 +33,17 @@ def models(request, context):
     return [{key: model[key] for key in keys} for model in data_models]
 
 
+@cache_controlled
+def model(request, context):
+    match = re.search(r"http://base/api/model/([0-9,a-f,-]*)", str(request))
+    model_id = UUID(match[1])
+
+    model = next((model for model in data_models if UUID(model["model_uuid"]) == model_id), None)
+    fields = {key: value for key, value in model.items() if key not in ["code", "parameter", "instances"]}
+    fields.setdefault("last_modified", None)
+    return fields
+
+
 @cache_controlled
 def model_code(request, context):
     match = re.search(r"http://base/api/model/([0-9,a-f,-]*)/code", str(request))
@@ -0,0 +1,111 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import hashlib
+import json
+import re
+from uuid import uuid4
+from .handlers_common import cache_controlled
+
+
+# an in memory store of the samples: sample uuid -> fields, data, labels and tags
+data_samples = {}
+
+_path = re.compile(
+    r"/sample(?:/(?P<sample>[0-9a-f]{32}))?"
+    r"(?:/(?P<sub>data|label|tags)(?:/(?P<item>[^/?]+))?(?P<file>/file)?)?"
+)
+_uuid_keys = {"data": "data_uuid", "label": "label_uuid"}
+
+
+def _match(request):
+    return _path.search(request.path)
+
+
+def _new_sample():
+    return {
+        "fields": {"finalized": False, "consumed": False, "obsolete": False},
+        "data": {},
+        "label": {},
+        "tags": [],
+    }
+
+
+@cache_controlled
+def samples(request, context):
+    match = _match(request)
+    method = request.method
+    if match["sample"] is None:
+        if method == "POST":
+            uuid = uuid4().hex
+            data_samples[uuid] = _new_sample()
+            return {"sample_uuid": uuid}
+        offset = int(request.qs.get("page_offset", [0])[0])
+        return [{"sample_uuid": uuid} for uuid in list(data_samples)[offset:]]
+
+    sample = data_samples.get(match["sample"])
+    if sample is None:
+        context.status_code = 404
+        return {}
+
+    if match["sub"] is None:
+        if method == "PUT":
+            sample["fields"].update(json.loads(request.text))
+            return {}
+        return dict(sample["fields"], sample_uuid=match["sample"])
+
+    if match["sub"] == "tags":
+        if method == "PUT":
+            sample["tags"].extend(t["name"] for t in json.loads(request.text) if t["name"] not in sample["tags"])
+        elif method == "DELETE" and match["item"] is not None:
+            sample["tags"].remove(match["item"])
+        elif method == "DELETE":
+            sample["tags"].clear()
+        return [{"name": t} for t in sample["tags"]]
+
+    items = sample[match["sub"]]
+    uuid_key = _uuid_keys[match["sub"]]
+    if match["item"] is None:
+        if method == "POST":
+            uuid = uuid4().hex
+            items[uuid] = {"key": None, "file": b""}
+            return {uuid_key: uuid}
+        return [{uuid_key: uuid} for uuid in items]
+
+    item = items.get(match["item"])
+    if item is None:
+        context.status_code = 404
+        return {}
+    if match["file"] is not None:
+        if method == "POST":
+            item["file"] = request.body if isinstance(request.body, bytes) else request.body.read()
+        context.headers["Etag"] = hashlib.sha256(item["file"]).hexdigest()
+        return {}
+    if method == "PUT":
+        item["key"] = json.loads(request.text)["key"]
+        return {}
+    return {"key": item["key"]}
+
+
+@cache_controlled
+def sample_file(request, context):
+    match = _match(request)
+    sample = data_samples.get(match["sample"])
+    item = sample[match["sub"]].get(match["item"]) if sample is not None else None
+    if item is None:
+        context.status_code = 404
+        return b""
+    context.headers["Etag"] = hashlib.sha256(item["file"]).hexdigest()
+    return item["file"]
@@ -26,11 +26,11 @@ def infer(batch: List[Any], result: List[Any]) -> None:
 
 
 def should_create_training_data() -> bool:
-    ...
+    return True
 
 
 def save_training_data() -> bytes:
-    ...
+    return b"training"
 
 
 def load_training_data(data: bytes) -> None:
@@ -38,11 +38,11 @@ def load_training_data(data: bytes) -> None:
 
 
 def should_create_inference_data() -> bool:
-    ...
+    return True
 
 
 def save_inference_data() -> bytes:
-    ...
+    return b"inference"
 
 
 def load_inference_data(data: bytes) -> None:
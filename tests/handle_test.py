@@ -0,0 +1,54 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import os
+import pickle
+from tempfile import TemporaryDirectory
+import koi_core as koi
+from koi_core.resources.handle import InstanceHandle
+
+
+def test_instance_handle(api_mock):
+    koi.init()
+
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    model = next(pool.get_all_models())
+    instance = next(model.instances)
+
+    handle = InstanceHandle.from_instance(instance)
+    size = len(pickle.dumps(handle))
+
+    # the handle does not grow with the caches of the instance
+    model._code
+    instance.inference_data
+    assert len(pickle.dumps(InstanceHandle.from_instance(instance))) == size
+
+    temp_dir = TemporaryDirectory()
+    handle = pickle.loads(pickle.dumps(
+        InstanceHandle.from_instance(instance, os.path.join(temp_dir.name, "snapshot"))))
+
+    api_mock.requests_mock.reset_mock()
+    opened = handle.open()
+    assert opened is not instance
+    assert opened.id == instance.id
+    assert opened.pool.api._token == pool.api._token
+    assert opened.model._code == model._code
+    assert opened.inference_data == instance.inference_data
+
+    # the token and the snapshot were reused, nothing was requested
+    assert api_mock.requests_mock.call_count == 0
+
+    temp_dir.cleanup()
+    koi.deinit()
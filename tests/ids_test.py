@@ -0,0 +1,43 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+
+import pickle
+import pytest
+from uuid import uuid4
+from koi_core.api.common import BaseAPI
+from koi_core.resources.ids import GeneralRoleId, InstanceId, ModelAccessId, SampleDatumId, SampleId
+
+
+def test_ids():
+    model, instance, sample, datum = uuid4(), uuid4(), uuid4(), uuid4()
+    sample_id = SampleId(model, instance, sample)
+
+    # equal ids are the same object
+    assert SampleId(id=InstanceId(model, instance), sample_uuid=sample) is sample_id
+    assert pickle.loads(pickle.dumps(sample_id)) is sample_id
+    assert SampleDatumId(id=sample_id, sample_datum_uuid=datum).SampleId is sample_id
+    assert hash(sample_id) == hash(sample)
+
+    with pytest.raises(AttributeError):
+        sample_id.sample_uuid = uuid4()
+
+    api = BaseAPI("http://base")
+    assert api._build_path(SampleDatumId(model, instance, sample, datum)) == (
+        f"/api/model/{model.hex}/instance/{instance.hex}/sample/{sample.hex}/data/{datum.hex}"
+    )
+    assert api._build_path(ModelAccessId(model, datum)) == f"/api/model/{model.hex}/access/{datum.hex}"
+    assert api._build_path(GeneralRoleId(datum)) == f"/api/userroles/general/{datum.hex}"
+    assert api._build_path() == "/api"
@@ -0,0 +1,86 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import io
+import json
+import numpy as np
+import pytest
+from koi_core import ingest
+from .fixtures.handlers_sample import data_samples
+
+_args = ["-s", "http://base", "-u", "user", "-p", "password", "-m", "Model 0", "-i", "Instance 0"]
+
+
+def _by_key(items):
+    return {item["key"]: item["file"] for item in items.values()}
+
+
+def test_ingest_directories(api_mock, tmp_path):
+    for i in range(3):
+        sample = tmp_path / "data" / f"sample{i}"
+        sample.mkdir(parents=True)
+        (sample / "image.bin").write_bytes(b"image%d" % i)
+        (sample / "class.txt").write_bytes(b"%d" % (i % 2))
+    np.savez(tmp_path / "data" / "arrays.npz", x=np.arange(3), y=np.ones(2))
+    journal = str(tmp_path / "journal")
+
+    args = _args + ["--label", "class=*.txt", "--label", "class=y", "--tag", "imported", "--journal", journal]
+    assert ingest.main(args + ["-j", "2", str(tmp_path / "data")]) == 0
+
+    assert len(data_samples) == 4
+    uploaded = {_by_key(s["data"]).get("image"): s for s in data_samples.values()}
+    assert _by_key(uploaded[b"image1"]["label"]) == {"class": b"1"}
+    assert uploaded[b"image1"]["tags"] == ["imported"]
+    npz = uploaded[None]
+    assert np.array_equal(np.load(io.BytesIO(_by_key(npz["data"])["x"])), np.arange(3))
+    assert np.array_equal(np.load(io.BytesIO(_by_key(npz["label"])["class"])), np.ones(2))
+
+    with open(journal) as f:
+        assert sorted(line.split("\t")[0] for line in f) == ["arrays.npz", "sample0", "sample1", "sample2"]
+
+    # a second run resumes from the journal
+    (tmp_path / "data" / "sample3").mkdir()
+    (tmp_path / "data" / "sample3" / "image.bin").write_bytes(b"image3")
+    assert ingest.main(args + [str(tmp_path / "data")]) == 0
+    assert len(data_samples) == 5
+
+
+def test_ingest_stdin(api_mock, tmp_path, monkeypatch):
+    (tmp_path / "a.bin").write_bytes(b"a")
+    lines = [
+        {"id": "first", "data": {"a": str(tmp_path / "a.bin")}, "labels": {"l": {"base64": "bGFiZWw="}}},
+        {"data": {"a": str(tmp_path / "missing.bin")}},
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(json.dumps(line) for line in lines)))
+
+    assert ingest.main(_args + ["-r", "1", "-t", "0", "--finalize"]) == 1
+
+    # the missing file is reported after the retry, the other sample is uploaded once
+    assert len(data_samples) == 1
+    sample = next(iter(data_samples.values()))
+    assert _by_key(sample["data"]) == {"a": b"a"}
+    assert _by_key(sample["label"]) == {"l": b"label"}
+    assert sample["fields"]["finalized"]
+
+
+def test_ingest_mapping():
+    with pytest.raises(ValueError):
+        ingest._parse_mapping(["image"])
+
+    with pytest.raises(ValueError):
+        ingest._item("x", {"a.png": "a", "b.png": "b"}, [("image", "*.png")], [], [])
+
+    item = ingest._item("x", {"a.png": "a", "c.txt": "c"}, [], [("label", "*.txt")], [])
+    assert item.data == {"a": "a"} and item.labels == {"label": "c"}
@@ -12,8 +12,20 @@
 # Lesser General Public License for more details. A copy of the
 # GNU Lesser General Public License is distributed along with this
 # software and can be found at http://www.gnu.org/licenses/lgpl.html
+import re
+from datetime import datetime
 import koi_core as koi
 import pytest
+from uuid import uuid4
+from koi_core.caching import invalidateCache
+from koi_core.caching_strategy import REVALIDATE_ALWAYS, CachePolicy, ExpireCachingStrategy
+from koi_core.resources.instance import InstanceProxy
+from koi_core.resources.model import ModelProxy
+from koi_core.resources.sample import SampleDatumProxy, SampleProxy
+from koi_core.resources.ids import SampleId
+from koi_core.resources.sample import LocalSample
+from koi_core.resources.sample_ingest import IngestStats
+from .fixtures.handlers_sample import data_samples
 
 
 def test_instance_parameter(api_mock):
@@ -50,3 +62,264 @@ def test_instance_parameter(api_mock):
         inst.parameter["param2"] = "15"
 
     koi.deinit()
+
+
+def test_ingest(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+
+    local = LocalSample(None, inst.id)
+    local.data["x"].raw = b"local"
+    local.tags.add("local")
+
+    inputs = [
+        {"data": {"x": b"x%d" % i}, "labels": {"y": b"y%d" % i}, "tags": ["a"]} for i in range(10)
+    ]
+    inputs[4] = {"data": {"x": None}}
+    inputs.append(local)
+
+    stats = IngestStats()
+    result = inst.ingest(iter(inputs), concurrency=4, finalize=True, stats=stats)
+
+    assert result.stats is stats
+    assert stats.samples == 10 and stats.failed == 1
+    assert stats.payloads == 10 * 2 - 2 + 1
+    assert stats.samples_per_second > 0
+    assert [f.index for f in result.failures] == [4]
+    assert isinstance(result.failures[0].exception, TypeError)
+    assert result.failures[0].id is None
+    assert result.ids[4] is None and all(id is not None for i, id in enumerate(result.ids) if i != 4)
+
+    # no fields were read before they were written
+    history = api_mock.requests_mock.request_history
+    assert not any(r.method == "GET" and "/sample" in r.path for r in history)
+    assert stats.requests == len([r for r in history if "/sample" in r.path])
+
+    sample = pool.sample(result.ids[3])
+    assert sample.data["x"].raw == b"x3"
+    assert sample.labels["y"].raw == b"y3"
+    assert "a" in sample.tags
+    assert sample.finalized
+    sample = pool.sample(result.ids[10])
+    assert sample.data["x"].raw == b"local"
+    assert "local" in sample.tags
+
+    # a partially uploaded sample is marked obsolete
+    api_mock.requests_mock.register_uri("POST", re.compile(r"/label/.*/file$"), status_code=500)
+    result = inst.ingest([inputs[0]])
+    assert result.ids == [None]
+    assert data_samples[result.failures[0].id.sample_uuid.hex]["fields"]["obsolete"]
+
+    koi.deinit()
+
+
+def test_batch_update(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+    sample = inst.new_sample()
+
+    def requests(method):
+        return [r for r in api_mock.requests_mock.request_history if r.method == method and "/sample/" in r.path]
+
+    with sample.batch_update():
+        sample.finalized = True
+        with sample.batch_update():
+            sample.obsolete = True
+        assert requests("PUT") == []
+    # one read and one write
+    assert len(requests("GET")) == 1 and len(requests("PUT")) == 1
+    assert data_samples[sample.id.sample_uuid.hex]["fields"] == {"finalized": True, "consumed": False, "obsolete": True}
+
+    # the cached fields were updated in place
+    assert sample._basic_fields.obsolete
+    assert len(requests("GET")) == 1
+
+    # nothing is sent if the block fails, the cached fields are dropped
+    with pytest.raises(RuntimeError):
+        with sample.batch_update():
+            sample.consumed = True
+            raise RuntimeError()
+    assert len(requests("PUT")) == 1
+    assert not sample._basic_fields.consumed
+
+    # without a batch every assignment is sent
+    sample.consumed = True
+    assert len(requests("PUT")) == 2
+
+    koi.deinit()
+
+
+def test_write_through(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+
+    def requests(method):
+        return [r for r in api_mock.requests_mock.request_history if r.method == method and r.path.endswith("/training")]
+
+    inst.training_data = b"trained"
+    # the response has no etag, the meta of the upload is asked for
+    assert len(requests("POST")) == 1 and len(requests("HEAD")) == 1
+
+    # the written value is served from the cache
+    assert inst.training_data == b"trained"
+    assert requests("GET") == []
+
+    koi.deinit()
+
+
+def test_bulk_update(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+    ids = inst.ingest([{"tags": ["new"]} for _ in range(5)]).ids
+
+    def requests(method):
+        return [r for r in api_mock.requests_mock.request_history if r.method == method and "/sample/" in r.path]
+
+    reports = []
+    result = inst.mark_consumed(ids, concurrency=3, progress=lambda r: reports.append(r.done))
+    assert (result.changed, result.unchanged, result.failures) == (5, 0, [])
+    assert sorted(reports) == [1, 2, 3, 4, 5]
+    assert all(data_samples[id.sample_uuid.hex]["fields"]["consumed"] for id in ids)
+    puts = len(requests("PUT"))
+
+    # the samples are consumed already, nothing is sent
+    result = inst.mark_consumed(ids)
+    assert (result.changed, result.unchanged) == (0, 5)
+    assert len(requests("PUT")) == puts
+
+    result = inst.tag(ids, add=["a", "b"], remove=["new"])
+    assert result.changed == 5
+    assert all(data_samples[id.sample_uuid.hex]["tags"] == ["a", "b"] for id in ids)
+    assert "new" not in pool.sample(ids[0]).tags
+
+    # failures are collected, the other samples are updated
+    missing = SampleId(ids[0].model_uuid, ids[0].instance_uuid, uuid4())
+    result = inst.mark_obsolete([ids[0], missing, ids[1]])
+    assert result.changed == 2
+    assert [f.index for f in result.failures] == [1]
+    with pytest.raises(Exception):
+        result.raise_for_failures()
+
+    koi.deinit()
+
+
+def test_key_index(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+    id = inst.ingest([{"data": {"a": b"1", "b": b"2", "c": b"3"}, "labels": {"y": b"4"}}]).ids[0]
+    sample = pool.sample(id)
+
+    def requests():
+        return [r for r in api_mock.requests_mock.request_history if r.method == "GET" and "/sample/" in r.path]
+
+    assert sample.data["b"].raw == b"2"
+    # one listing and the key of every datum
+    start = len(requests())
+    assert sample.data["c"].raw == b"3"
+    assert sample.labels["y"].raw == b"4"
+    assert sample.data["b"].raw == b"2"
+    # the labels are listed once, the data are found in the index
+    assert len(requests()) == start + 4
+
+    # the proxies are reused
+    assert sample._get_data()[0] is sample._get_data()[0]
+
+    # new data are added to the index
+    sample.data["d"].raw = b"5"
+    assert sample.data["d"].raw == b"5"
+    assert [d.key for d in sample._get_data()] == ["a", "b", "c", "d"]
+
+    koi.deinit()
+
+
+def test_pooled_child_proxies(api_mock):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+    id = inst.ingest([{"data": {"a": b"1"}}]).ids[0]
+    sample = pool.sample(id)
+
+    datum = sample._get_data()[0]
+    assert datum is pool.sample_datum(datum.id)
+    assert (datum.key, datum.raw) == ("a", b"1")
+    requests = len(api_mock.requests_mock.request_history)
+
+    # a rebuilt listing gets the same proxy with its warm cache
+    invalidateCache(sample, "_data_index")
+    assert sample.data["a"].raw == b"1"
+    assert sample._get_data()[0] is datum
+    assert len(api_mock.requests_mock.request_history) == requests
+
+    koi.deinit()
+
+
+def test_basic_field_deadline(api_mock, monkeypatch):
+    koi.init()
+    pool = koi.create_api_object_pool(host="http://base", username="user", password="password")
+    inst = next(next(pool.get_all_models()).instances)
+    name = inst.name
+
+    checks = []
+    is_valid = ExpireCachingStrategy.isValid
+    monkeypatch.setattr(
+        ExpireCachingStrategy, "isValid", lambda *args: checks.append(args[2]) or is_valid(*args)
+    )
+    requests = len(api_mock.requests_mock.request_history)
+    # warm reads skip the caching strategy until the entry expires
+    for _ in range(100):
+        assert inst.name == name
+        inst._basic_fields
+    assert checks == [] and len(api_mock.requests_mock.request_history) == requests
+
+    inst._deadlines["_basic_fields"] = 0
+    assert inst.name == name
+    assert checks == ["_basic_fields"]
+
+    koi.deinit()
+
+
+def test_caching_policies(api_mock):
+    koi.init()
+    policies = {
+        ("InstanceProxy", "_basic_fields"): CachePolicy(revalidate=REVALIDATE_ALWAYS),
+        ("SampleDatumProxy", "raw"): CachePolicy(byte_budget=2),
+        ("SampleDatumProxy", "_basic_fields"): CachePolicy(ttl=600, evictable=False),
+    }
+    pool = koi.create_api_object_pool(
+        host="http://base", username="user", password="password", caching_policies=policies
+    )
+    # the table is compiled for the proxy classes, the default rows are kept
+    assert (SampleDatumProxy, "raw") in pool.cachingStrategy._compiled
+    assert pool.cachingStrategy.shouldPersist(SampleProxy, "_basic_fields", None)
+    assert not pool.cachingStrategy.shouldPersist(SampleDatumProxy, "_basic_fields", None)
+
+    def requests(method, suffix=""):
+        return [r for r in api_mock.requests_mock.request_history if r.method == method and r.path.endswith(suffix)]
+
+    inst = next(next(pool.get_all_models()).instances)
+    inst.name, inst.model.name
+    # checked with the server on every access, although it has not expired
+    assert inst._cache["_basic_fields"][0][1].expires > datetime.now()
+    assert not pool.cachingStrategy.isValid(InstanceProxy, "_basic_fields", inst._cache["_basic_fields"][0][1])
+    assert pool.cachingStrategy.isValid(ModelProxy, "_basic_fields", inst.model._cache["_basic_fields"][0][1])
+
+    id = inst.ingest([{"data": {"small": b"12", "large": b"123"}}]).ids[0]
+    small, large = pool.sample(id)._get_data()
+    for _ in range(2):
+        assert (small.raw, large.raw) == (b"12", b"123")
+    # the large payload is over the budget and not kept
+    assert len(requests("GET", "/file")) == 1 + 2
+
+    assert "raw" in small._cache and "raw" not in large._cache
+
+    # only the evictable entries are dropped
+    small.key
+    assert pool.evict() > 0
+    assert "raw" not in small._cache and "_basic_fields" in small._cache
+
+    koi.deinit()
@@ -0,0 +1,53 @@
+# Copyright (c) individual contributors.
+# All rights reserved.
+#
+# This is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of
+# the License, or any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details. A copy of the
+# GNU Lesser General Public License is distributed along with this
+# software and can be found at http://www.gnu.org/licenses/lgpl.html
+
+import pytest
+from koi_core.control.uploader import CheckpointUploader
+
+
+def test_uploader_retries():
+    uploader = CheckpointUploader(retries=2, backoff=0.0)
+    calls = []
+
+    def flaky(data):
+        calls.append(data)
+        if len(calls) < 3:
+            raise ConnectionError("failed")
+        return len(data)
+
+    future = uploader.submit(flaky, b"checkpoint")
+    assert future.result() == len(b"checkpoint")
+    assert len(calls) == 3
+
+    def broken(data):
+        raise ConnectionError("failed")
+
+    future = uploader.submit(broken, b"checkpoint")
+    with pytest.raises(ConnectionError):
+        uploader.flush()
+    assert future.done()
+    assert uploader.pending == 0
+
+    uploader.close()
+
+
+def test_uploader_bounded_queue():
+    uploader = CheckpointUploader(max_pending=1, backoff=0.0)
+    results = []
+    futures = [uploader.submit(results.append, i) for i in range(5)]
+    uploader.close()
+
+    assert results == list(range(5))
+    assert all(f.done() for f in futures)